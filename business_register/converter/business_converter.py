@@ -58,7 +58,7 @@ class BusinessConverter(Converter):
         """
         status = status_from_record.lower()
         if status not in self.all_statuses_dict:
-            new_status = Status.objects.create(name=status)
+            new_status = Status.objects.get_or_create(name=status)[0]
             self.all_statuses_dict[status] = new_status
             return new_status
         return self.all_statuses_dict[status]
@@ -69,7 +69,7 @@ class BusinessConverter(Converter):
         """
         authority = authority_from_record.lower()
         if authority not in self.all_authorities_dict:
-            new_authority = Authority.objects.create(name=authority)
+            new_authority = Authority.objects.get_or_create(name=authority)[0]
             self.all_authorities_dict[authority] = new_authority
             return new_authority
         return self.all_authorities_dict[authority]
@@ -80,7 +80,7 @@ class BusinessConverter(Converter):
         """
         taxpayer_type = taxpayer_type_from_record.lower()
         if taxpayer_type not in self.all_taxpayer_types_dict:
-            new_taxpayer_type = TaxpayerType.objects.create(name=taxpayer_type)
+            new_taxpayer_type = TaxpayerType.objects.get_or_create(name=taxpayer_type)[0]
             self.all_taxpayer_types_dict[taxpayer_type] = new_taxpayer_type
             return new_taxpayer_type
         return self.all_taxpayer_types_dict[taxpayer_type]
@@ -8,10 +8,12 @@ from lxml import html
 
 from business_register.converter.company_converters.company import CompanyConverter
 from business_register.models.company_models import Company
+from data_ocean.cache import bump_data_versions
 from data_ocean.downloader import Downloader
 from data_ocean.utils import format_date_to_yymmdd, to_lower_string_if_exists
 
 # Standard instance of a logger with __name__
+from stats.report_metrics import ReportMetrics
 from stats.tasks import endpoints_cache_warm_up
 
 logger = logging.getLogger(__name__)
@@ -126,9 +128,12 @@ class UkCompanyDownloader(Downloader):
         self.report.update_status = True
         self.report.save()
 
+        self.update_search_vectors(Company)
         self.vacuum_analyze(table_list=['business_register_company', ])
 
         self.remove_file()
+        ReportMetrics('company').refresh()
+        bump_data_versions('company')
         endpoints_cache_warm_up(endpoints=[
             '/api/company/',
             '/api/company/uk/',
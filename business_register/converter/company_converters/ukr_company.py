@@ -7,16 +7,19 @@ from django.conf import settings
 from django.utils import timezone
 
 from business_register.converter.company_converters.company import CompanyConverter
+from business_register.converter.pep_founder_matcher import PepFounderMatcher
 from business_register.models.company_models import (
     Assignee, BancruptcyReadjustment, Bylaw, Company, CompanyDetail, CompanyToKved,
-    CompanyToPredecessor, ExchangeDataCompany, Founder, Predecessor,
+    CompanyToPredecessor, ExchangeDataCompany, FoundedCompanies, Founder, Predecessor,
     Signer, TerminationStarted
 )
-from data_ocean.converter import BulkCreateManager
+from data_ocean.cache import bump_data_versions
+from data_ocean.converter import BulkCreateManager, RecordChildren
 from data_ocean.downloader import Downloader
 from data_ocean.utils import (cut_first_word, format_date_to_yymmdd, get_first_word,
                               to_lower_string_if_exists)
 from location_register.converter.address import AddressConverter
+from stats.report_metrics import ReportMetrics
 from stats.tasks import endpoints_cache_warm_up
 
 logger = logging.getLogger(__name__)
@@ -48,14 +51,15 @@ class UkrCompanyConverter(CompanyConverter):
         return self.all_bylaw_dict[bylaw_from_record]
 
     def save_or_get_predecessor(self, item):
-        if item.xpath('NAME')[0].text not in self.all_predecessors_dict:
+        item_fields = RecordChildren(item)
+        if item_fields['NAME'][0].text not in self.all_predecessors_dict:
             new_predecessor = Predecessor.objects.create(
-                name=item.xpath('NAME')[0].text.lower(),
-                code=item.xpath('CODE')[0].text
+                name=item_fields['NAME'][0].text.lower(),
+                code=item_fields['CODE'][0].text
             )
-            self.all_predecessors_dict[item.xpath('NAME')[0].text] = new_predecessor
+            self.all_predecessors_dict[item_fields['NAME'][0].text] = new_predecessor
             return new_predecessor
-        return self.all_predecessors_dict[item.xpath('NAME')[0].text]
+        return self.all_predecessors_dict[item_fields['NAME'][0].text]
 
     def extract_detail_founder_data(self, founder_info):
         info_to_list = founder_info.split(',')
@@ -218,15 +222,16 @@ class UkrCompanyConverter(CompanyConverter):
                 outdated_founder.soft_delete()
 
     def branch_create(self, item, code):
+        item_fields = RecordChildren(item)
         branch = Company()
-        branch.name = item.xpath('NAME')[0].text
+        branch.name = item_fields['NAME'][0].text
         branch.short_name = code
-        branch.address = item.xpath('ADDRESS')[0].text
-        if item.xpath('CREATE_DATE')[0].text:
+        branch.address = item_fields['ADDRESS'][0].text
+        if item_fields['CREATE_DATE'][0].text:
             branch.registration_date = format_date_to_yymmdd(
-                item.xpath('CREATE_DATE')[0].text
+                item_fields['CREATE_DATE'][0].text
             ) or None
-        branch.contact_info = item.xpath('CONTACTS')[0].text
+        branch.contact_info = item_fields['CONTACTS'][0].text
         branch.authority = self.authority
         branch.bylaw = self.bylaw
         branch.company_type = self.company_type
@@ -250,23 +255,25 @@ class UkrCompanyConverter(CompanyConverter):
 
     def add_assignees(self, assignees_from_record, code):
         for item in assignees_from_record:
+            item_fields = RecordChildren(item)
             assignee = Assignee()
-            assignee.name = item.xpath('NAME')[0].text.lower()
-            assignee.edrpou = item.xpath('CODE')[0].text
+            assignee.name = item_fields['NAME'][0].text.lower()
+            assignee.edrpou = item_fields['CODE'][0].text
             assignee.hash_code = code
             self.bulk_manager.add(assignee)
 
     def add_bancruptcy_readjustment(self, record, code):
+        record_fields = RecordChildren(record)
         bancruptcy_readjustment = BancruptcyReadjustment()
-        if record.xpath('BANKRUPTCY_READJUSTMENT_INFO/OP_DATE'):
+        if record_fields['BANKRUPTCY_READJUSTMENT_INFO/OP_DATE']:
             bancruptcy_readjustment.op_date = format_date_to_yymmdd(
-                record.xpath('BANKRUPTCY_READJUSTMENT_INFO/OP_DATE')[0].text) or None
-            bancruptcy_readjustment.reason = record.xpath(
-                'BANKRUPTCY_READJUSTMENT_INFO/REASON')[0].text.lower()
-            bancruptcy_readjustment.sbj_state = record.xpath(
-                'BANKRUPTCY_READJUSTMENT_INFO/SBJ_STATE')[0].text.lower()
-            head_name = record.xpath(
-                'BANKRUPTCY_READJUSTMENT_INFO/BANKRUPTCY_READJUSTMENT_HEAD_NAME')[0].text
+                record_fields['BANKRUPTCY_READJUSTMENT_INFO/OP_DATE'][0].text) or None
+            bancruptcy_readjustment.reason = record_fields[
+                'BANKRUPTCY_READJUSTMENT_INFO/REASON'][0].text.lower()
+            bancruptcy_readjustment.sbj_state = record_fields[
+                'BANKRUPTCY_READJUSTMENT_INFO/SBJ_STATE'][0].text.lower()
+            head_name = record_fields[
+                'BANKRUPTCY_READJUSTMENT_INFO/BANKRUPTCY_READJUSTMENT_HEAD_NAME'][0].text
             if head_name:
                 bancruptcy_readjustment.head_name = head_name
             bancruptcy_readjustment.hash_code = code
@@ -274,73 +281,78 @@ class UkrCompanyConverter(CompanyConverter):
 
     def add_company_to_kved(self, kveds_from_record, code):
         for item in kveds_from_record:
-            if not item.xpath('NAME'):
+            item_fields = RecordChildren(item)
+            if not item_fields['NAME']:
                 continue
-            kved_name = item.xpath('NAME')[0].text
+            kved_name = item_fields['NAME'][0].text
             if not kved_name:
                 continue
             company_to_kved = CompanyToKved()
             company_to_kved.kved = self.get_kved_from_DB(kved_name)
-            company_to_kved.primary_kved = item.xpath('PRIMARY')[0].text == "так"
+            company_to_kved.primary_kved = item_fields['PRIMARY'][0].text == "так"
             company_to_kved.hash_code = code
             self.bulk_manager.add(company_to_kved)
 
     def add_company_to_kved_branch(self, kveds_from_record, code):
         for item in kveds_from_record:
-            if not item.xpath('NAME'):
+            item_fields = RecordChildren(item)
+            if not item_fields['NAME']:
                 continue
-            kved_name = item.xpath('NAME')[0].text
+            kved_name = item_fields['NAME'][0].text
             if not kved_name:
                 continue
             company_to_kved = CompanyToKved()
             company_to_kved.kved = self.get_kved_from_DB(kved_name)
-            company_to_kved.primary_kved = item.xpath('PRIMARY')[0].text == "так"
+            company_to_kved.primary_kved = item_fields['PRIMARY'][0].text == "так"
             company_to_kved.hash_code = code
             self.branch_bulk_manager.add(company_to_kved)
 
     def add_exchange_data(self, exchange_data, code):
         for item in exchange_data:
-            if item.xpath('AUTHORITY_NAME'):
+            item_fields = RecordChildren(item)
+            if item_fields['AUTHORITY_NAME']:
                 exchange_answer = ExchangeDataCompany()
-                exchange_answer.authority = self.save_or_get_authority(item.xpath(
-                    'AUTHORITY_NAME')[0].text)
-                taxpayer_type = item.xpath('TAX_PAYER_TYPE')[0].text
+                exchange_answer.authority = self.save_or_get_authority(item_fields[
+                    'AUTHORITY_NAME'][0].text)
+                taxpayer_type = item_fields['TAX_PAYER_TYPE'][0].text
                 if taxpayer_type:
                     exchange_answer.taxpayer_type = self.save_or_get_taxpayer_type(taxpayer_type)
-                if item.xpath('START_DATE')[0].text:
+                if item_fields['START_DATE'][0].text:
                     exchange_answer.start_date = format_date_to_yymmdd(
-                        item.xpath('START_DATE')[0].text) or None
-                exchange_answer.start_number = item.xpath('START_NUM')[0].text
-                if item.xpath('END_DATE')[0].text:
+                        item_fields['START_DATE'][0].text) or None
+                exchange_answer.start_number = item_fields['START_NUM'][0].text
+                if item_fields['END_DATE'][0].text:
                     exchange_answer.end_date = format_date_to_yymmdd(
-                        item.xpath('END_DATE')[0].text) or None
-                exchange_answer.end_number = item.xpath('END_NUM')[0].text
+                        item_fields['END_DATE'][0].text) or None
+                exchange_answer.end_number = item_fields['END_NUM'][0].text
                 exchange_answer.hash_code = code
                 self.bulk_manager.add(exchange_answer)
 
     def add_exchange_data_branch(self, exchange_data, name, code):
         if len(exchange_data) > 0:
             for item in exchange_data:
+                item_fields = RecordChildren(item)
                 exchange_answer = ExchangeDataCompany()
-                if item.xpath('AUTHORITY_NAME'):
+                if item_fields['AUTHORITY_NAME']:
                     exchange_answer.authority = self.save_or_get_authority(
-                        item.xpath('AUTHORITY_NAME')[0].text)
-                    tax_payer_type = item.xpath('TAX_PAYER_TYPE')[0].text or Company.INVALID
+                        item_fields['AUTHORITY_NAME'][0].text)
+                    tax_payer_type = item_fields['TAX_PAYER_TYPE'][0].text or Company.INVALID
                     exchange_answer.taxpayer_type = self.save_or_get_taxpayer_type(tax_payer_type)
-                    if item.xpath('START_DATE')[0].text:
+                    if item_fields['START_DATE'][0].text:
                         exchange_answer.start_date = format_date_to_yymmdd(
-                            item.xpath('START_DATE')[0].text) or None
-                    exchange_answer.start_number = item.xpath('START_NUM')[0].text
-                    if item.xpath('END_DATE')[0].text:
+                            item_fields['START_DATE'][0].text) or None
+                    exchange_answer.start_number = item_fields['START_NUM'][0].text
+                    if item_fields['END_DATE'][0].text:
                         exchange_answer.end_date = format_date_to_yymmdd(
-                            item.xpath('END_DATE')[0].text) or None
-                    exchange_answer.end_number = item.xpath('END_NUM')[0].text
+                            item_fields['END_DATE'][0].text) or None
+                    exchange_answer.end_number = item_fields['END_NUM'][0].text
                     exchange_answer.hash_code = self.create_hash_code(name, code)
                     self.branch_bulk_manager.add(exchange_answer)
 
     def add_company_to_predecessors(self, predecessors_from_record, code):
         for item in predecessors_from_record:
-            if item.xpath('NAME'):
+            item_fields = RecordChildren(item)
+            if item_fields['NAME']:
                 company_to_predecessor = CompanyToPredecessor()
                 company_to_predecessor.predecessor = self.save_or_get_predecessor(item)
                 company_to_predecessor.hash_code = code
@@ -354,27 +366,30 @@ class UkrCompanyConverter(CompanyConverter):
             self.bulk_manager.add(signer)
 
     def add_termination_started(self, record, code):
-        if record.xpath('TERMINATION_STARTED_INFO/OP_DATE'):
+        record_fields = RecordChildren(record)
+        if record_fields['TERMINATION_STARTED_INFO/OP_DATE']:
             termination_started = TerminationStarted()
-            if record.xpath('TERMINATION_STARTED_INFO/OP_DATE')[0].text:
+            if record_fields['TERMINATION_STARTED_INFO/OP_DATE'][0].text:
                 termination_started.op_date = format_date_to_yymmdd(
-                    record.xpath('TERMINATION_STARTED_INFO/OP_DATE')[0].text) or None
-            termination_started.reason = record.xpath('TERMINATION_STARTED_INFO'
-                                                      '/REASON')[0].text.lower()
-            termination_started.sbj_state = record.xpath(
-                'TERMINATION_STARTED_INFO/SBJ_STATE')[0].text.lower()
-            signer_name = record.xpath('TERMINATION_STARTED_INFO/SIGNER_NAME')[0].text
+                    record_fields['TERMINATION_STARTED_INFO/OP_DATE'][0].text) or None
+            termination_started.reason = record_fields['TERMINATION_STARTED_INFO'
+                                                      '/REASON'][0].text.lower()
+            termination_started.sbj_state = record_fields[
+                'TERMINATION_STARTED_INFO/SBJ_STATE'][0].text.lower()
+            signer_name = record_fields['TERMINATION_STARTED_INFO/SIGNER_NAME'][0].text
             if signer_name:
                 termination_started.signer_name = signer_name.lower()
-            if record.xpath('TERMINATION_STARTED_INFO/CREDITOR_REQ_END_DATE')[0].text:
+            if record_fields['TERMINATION_STARTED_INFO/CREDITOR_REQ_END_DATE'][0].text:
                 termination_started.creditor_reg_end_date = format_date_to_yymmdd(
-                    record.xpath('TERMINATION_STARTED_INFO/CREDITOR_REQ_END_DATE')[0].text) or '01.01.1990'
+                    record_fields['TERMINATION_STARTED_INFO/CREDITOR_REQ_END_DATE'][0].text) or '01.01.1990'
             termination_started.hash_code = code
             self.bulk_manager.add(termination_started)
 
     def add_branches(self, record, edrpou):
-        for item in record.xpath('BRANCHES')[0]:
-            code = item.xpath('CODE')[0].text or Company.INVALID
+        record_fields = RecordChildren(record)
+        for item in record_fields['BRANCHES'][0]:
+            item_fields = RecordChildren(item)
+            code = item_fields['CODE'][0].text or Company.INVALID
             self.save_or_get_authority('EMP')
             self.save_or_get_bylaw('EMP')
             self.save_or_get_company_type('EMP', 'uk')
@@ -382,15 +397,15 @@ class UkrCompanyConverter(CompanyConverter):
 
     # try:
     #     branch = Company.objects.filter(
-    #         hash_code=self.create_hash_code(item.xpath('NAME')[0].text, code)).first()
+    #         hash_code=self.create_hash_code(item_fields['NAME'][0].text, code)).first()
     # except:
     #     pass
     # if branch:
-    #     branch.address = item.xpath('ADDRESS')[0].text
-    #     if item.xpath('CREATE_DATE')[0].text:
+    #     branch.address = item_fields['ADDRESS'][0].text
+    #     if item_fields['CREATE_DATE'][0].text:
     #         branch.registration_date = format_date_to_yymmdd(
-    #             item.xpath('CREATE_DATE')[0].text) or None
-    #     branch.contact_info = item.xpath('CONTACTS')[0].text
+    #             item_fields['CREATE_DATE'][0].text) or None
+    #     branch.contact_info = item_fields['CONTACTS'][0].text
     #     self.branch_bulk_manager.add_update(branch)
     #     print('update')
     # else:
@@ -399,86 +414,87 @@ class UkrCompanyConverter(CompanyConverter):
     #     print('create')
     # branch = self.branch_create(item, code)
     # self.branch_bulk_manager.add_create(branch)
-    # branch_kveds = item.xpath('ACTIVITY_KINDS')[0]
+    # branch_kveds = item_fields['ACTIVITY_KINDS'][0]
     # if len(branch_kveds):
-    #     self.add_company_to_kved_branch(branch_kveds, item.xpath('NAME')[0].text, code)
+    #     self.add_company_to_kved_branch(branch_kveds, item_fields['NAME'][0].text, code)
     # self.add_exchange_data_branch(
-    #     item.xpath('EXCHANGE_DATA')[0],
-    #     item.xpath('NAME')[0].text, code
+    #     item_fields['EXCHANGE_DATA'][0],
+    #     item_fields['NAME'][0].text, code
     # )
-    # if item.xpath('SIGNER'):
+    # if item_fields['SIGNER']:
     #     signer = Signer(
-    #         name=item.xpath('SIGNER')[0].text,
-    #         hash_code=self.create_hash_code(item.xpath('NAME')[0].text, code)
+    #         name=item_fields['SIGNER'][0].text,
+    #         hash_code=self.create_hash_code(item_fields['NAME'][0].text, code)
     #     )
     #     self.branch_bulk_manager.add_create(signer)
     # self.branch_to_parent[
-    #     self.create_hash_code(item.xpath('NAME')[0].text, code)
-    # ] = self.create_hash_code(record.xpath('NAME')[0].text, edrpou)
+    #     self.create_hash_code(item_fields['NAME'][0].text, code)
+    # ] = self.create_hash_code(record_fields['NAME'][0].text, edrpou)
 
     def save_detail_company_to_db(self, records):
         for record in records:
-            name = record.xpath('NAME')[0].text.lower()
-            short_name = record.xpath('SHORT_NAME')[0].text
+            record_fields = RecordChildren(record)
+            name = record_fields['NAME'][0].text.lower()
+            short_name = record_fields['SHORT_NAME'][0].text
             if short_name:
                 short_name = short_name.lower()
-            company_type = record.xpath('OPF')[0].text
+            company_type = record_fields['OPF'][0].text
             if company_type:
                 company_type = self.save_or_get_company_type(company_type, 'uk')
-            edrpou = record.xpath('EDRPOU')[0].text
+            edrpou = record_fields['EDRPOU'][0].text
             if not edrpou:
                 self.report.invalid_data += 1
                 continue
             code = name + edrpou
-            address = record.xpath('ADDRESS')[0].text
-            status = self.save_or_get_status(record.xpath('STAN')[0].text)
-            founding_document_number = record.xpath('FOUNDING_DOCUMENT_NUM')[0].text
-            executive_power = record.xpath('EXECUTIVE_POWER')[0].text
+            address = record_fields['ADDRESS'][0].text
+            status = self.save_or_get_status(record_fields['STAN'][0].text)
+            founding_document_number = record_fields['FOUNDING_DOCUMENT_NUM'][0].text
+            executive_power = record_fields['EXECUTIVE_POWER'][0].text
             if executive_power:
                 executive_power = executive_power.lower()
-            # if len(record.xpath('ACTIVITY_KINDS')[0]):
-            #     self.add_company_to_kved(record.xpath('ACTIVITY_KINDS')[0], code)
-            superior_management = record.xpath('SUPERIOR_MANAGEMENT')[0].text
+            # if len(record_fields['ACTIVITY_KINDS'][0]):
+            #     self.add_company_to_kved(record_fields['ACTIVITY_KINDS'][0], code)
+            superior_management = record_fields['SUPERIOR_MANAGEMENT'][0].text
             if superior_management:
                 superior_management = superior_management.lower()
-            # if len(record.xpath('SIGNERS')[0]):
-            #     self.add_signers(record.xpath('SIGNERS')[0], code)
-            authorized_capital = record.xpath('AUTHORIZED_CAPITAL')[0].text
+            # if len(record_fields['SIGNERS'][0]):
+            #     self.add_signers(record_fields['SIGNERS'][0], code)
+            authorized_capital = record_fields['AUTHORIZED_CAPITAL'][0].text
             if authorized_capital:
                 authorized_capital = authorized_capital.replace(',', '.')
                 authorized_capital = float(authorized_capital)
-            bylaw = self.save_or_get_bylaw(record.xpath('STATUTE')[0].text)
+            bylaw = self.save_or_get_bylaw(record_fields['STATUTE'][0].text)
             registration_date = None
             registration_info = None
-            registration = record.xpath('REGISTRATION')[0].text
+            registration = record_fields['REGISTRATION'][0].text
             if registration:
                 registration_date = format_date_to_yymmdd(get_first_word(registration))
                 registration_info = cut_first_word(registration)
-            managing_paper = record.xpath('MANAGING_PAPER')[0].text
+            managing_paper = record_fields['MANAGING_PAPER'][0].text
             if managing_paper:
                 managing_paper = managing_paper.lower()
             # TODO: refactor branches storing
-            # if len(record.xpath('BRANCHES')[0]):
-            #     self.add_branches(record.xpath('BRANCHES')[0], code)
-            # if record.xpath('TERMINATION_STARTED_INFO/OP_DATE'):
+            # if len(record_fields['BRANCHES'][0]):
+            #     self.add_branches(record_fields['BRANCHES'][0], code)
+            # if record_fields['TERMINATION_STARTED_INFO/OP_DATE']:
             #     self.add_termination_started(record, code)
-            # if record.xpath('BANKRUPTCY_READJUSTMENT_INFO/OP_DATE'):
+            # if record_fields['BANKRUPTCY_READJUSTMENT_INFO/OP_DATE']:
             #     self.add_bancruptcy_readjustment(record, code)
-            # if len(record.xpath('PREDECESSORS')[0]):
-            #     self.add_company_to_predecessors(record.xpath('PREDECESSORS')[0], code)
-            # if len(record.xpath('ASSIGNEES')[0]):
-            #     self.add_assignees(record.xpath('ASSIGNEES')[0], code)
-            terminated_info = record.xpath('TERMINATED_INFO')[0].text
+            # if len(record_fields['PREDECESSORS'][0]):
+            #     self.add_company_to_predecessors(record_fields['PREDECESSORS'][0], code)
+            # if len(record_fields['ASSIGNEES'][0]):
+            #     self.add_assignees(record_fields['ASSIGNEES'][0], code)
+            terminated_info = record_fields['TERMINATED_INFO'][0].text
             if terminated_info:
                 terminated_info = terminated_info.lower()
-            termination_cancel_info = record.xpath('TERMINATION_CANCEL_INFO')[0].text
+            termination_cancel_info = record_fields['TERMINATION_CANCEL_INFO'][0].text
             if termination_cancel_info:
                 termination_cancel_info = termination_cancel_info.lower()
-            contact_info = record.xpath('CONTACTS')[0].text
-            # if record.xpath('EXCHANGE_DATA')[0]:
-            #     self.add_exchange_data(record.xpath('EXCHANGE_DATA')[0], code)
-            vp_dates = record.xpath('VP_DATES')[0].text
-            authority = self.save_or_get_authority(record.xpath('CURRENT_AUTHORITY')[0].text)
+            contact_info = record_fields['CONTACTS'][0].text
+            # if record_fields['EXCHANGE_DATA'][0]:
+            #     self.add_exchange_data(record_fields['EXCHANGE_DATA'][0], code)
+            vp_dates = record_fields['VP_DATES'][0].text
+            authority = self.save_or_get_authority(record_fields['CURRENT_AUTHORITY'][0].text)
             # self.add_company_detail(founding_document_number, executive_power, superior_management, managing_paper,
             #                         terminated_info, termination_cancel_info, vp_dates, code)
             # ToDo: resolve the problem of having records with the same company name amd edrpou
@@ -540,8 +556,8 @@ class UkrCompanyConverter(CompanyConverter):
                     update_fields.append('updated_at')
                     company.save(update_fields=update_fields)
                     # self.bulk_manager.add_update(company)
-            if len(record.xpath('FOUNDERS')[0]):
-                self.save_or_update_founders(record.xpath('FOUNDERS')[0], company)
+            if len(record_fields['FOUNDERS'][0]):
+                self.save_or_update_founders(record_fields['FOUNDERS'][0], company)
         # if len(self.bulk_manager.update_queues['business_register.Company']):
         #     self.bulk_manager.commit_update(Company, ['name', 'short_name', 'company_type',
         #                                               'authorized_capital', 'address', 'status',
@@ -681,19 +697,20 @@ class UkrCompanyConverter(CompanyConverter):
     def save_to_db(self, records):
         country = AddressConverter().save_or_get_country('Ukraine')
         for record in records:
+            record_fields = RecordChildren(record)
             # omitting records without company name or edrpou
-            if not record.xpath('NAME')[0].text or not record.xpath('EDRPOU')[0].text:
+            if not record_fields['NAME'][0].text or not record_fields['EDRPOU'][0].text:
                 self.report.invalid_data += 1
                 continue
-            name = record.xpath('NAME')[0].text.lower()
-            short_name = record.xpath('SHORT_NAME')[0].text
+            name = record_fields['NAME'][0].text.lower()
+            short_name = record_fields['SHORT_NAME'][0].text
             if short_name:
                 short_name = short_name.lower()
-            edrpou = record.xpath('EDRPOU')[0].text
+            edrpou = record_fields['EDRPOU'][0].text
             code = name + edrpou
-            address = record.xpath('ADDRESS')[0].text
-            status = self.save_or_get_status(record.xpath('STAN')[0].text)
-            boss = record.xpath('BOSS')[0].text
+            address = record_fields['ADDRESS'][0].text
+            status = self.save_or_get_status(record_fields['STAN'][0].text)
+            boss = record_fields['BOSS'][0].text
             if boss:
                 boss = boss.lower()
             # ToDo: resolve the problem of having records with the same company name amd edrpou
@@ -741,14 +758,14 @@ class UkrCompanyConverter(CompanyConverter):
                 if update_fields:
                     update_fields.append('updated_at')
                     company.save(update_fields=update_fields)
-            kved_data = record.xpath('KVED')[0].text
+            kved_data = record_fields['KVED'][0].text
             if kved_data and ' ' in kved_data:
                 kved = self.extract_kved(kved_data)
                 self.save_or_update_kved(kved, company)
-            if len(record.xpath('FOUNDERS')[0]):
-                self.save_or_update_founders(record.xpath('FOUNDERS')[0], company)
-            if len(record.xpath('BENEFICIARIES')[0]):
-                self.save_or_update_beneficiaries(record.xpath('BENEFICIARIES')[0], company)
+            if len(record_fields['FOUNDERS'][0]):
+                self.save_or_update_founders(record_fields['FOUNDERS'][0], company)
+            if len(record_fields['BENEFICIARIES'][0]):
+                self.save_or_update_beneficiaries(record_fields['BENEFICIARIES'][0], company)
 
 
 class UkrCompanyDownloader(Downloader):
@@ -793,14 +810,24 @@ class UkrCompanyDownloader(Downloader):
         ukr_company.process()
         logger.info(f'{self.reg_name}: process() with {self.file_path} finished successfully.')
 
+        # founders are saved one by one here, so the changed ones are taken from their history
+        changed_founders = Founder.history.filter(history_date__gte=self.report.update_start).values('id')
+        FoundedCompanies.refresh(Founder.history.filter(id__in=changed_founders).values_list('edrpou', flat=True))
+
         self.report.update_finish = timezone.now()
         self.report.update_status = True
         self.report.save()
 
         sleep(5)
+        self.update_search_vectors(Company)
+        PepFounderMatcher().refresh(
+            Founder.include_deleted_objects.filter(updated_at__gte=self.report.update_start)
+        )
         self.vacuum_analyze(table_list=['business_register_company', ])
 
         self.remove_file()
+        ReportMetrics('company').refresh()
+        bump_data_versions('company')
         endpoints_cache_warm_up(endpoints=[
             '/api/company/',
             '/api/company/uk/',
@@ -1,22 +1,29 @@
 import logging
+import os
 import re
 import requests
+from collections import defaultdict
 from time import sleep
 
 from django.conf import settings
+from django.db import transaction
 from django.utils import timezone
 
 from business_register.converter.company_converters.company import CompanyConverter
+from business_register.converter.pep_founder_matcher import PepFounderMatcher
 from business_register.models.company_models import (
     Assignee, BancruptcyReadjustment, Bylaw, Company, CompanyDetail, CompanyToKved,
-    CompanyToPredecessor, ExchangeDataCompany, Founder, Predecessor,
+    CompanyToPredecessor, ExchangeDataCompany, FoundedCompanies, Founder, Predecessor,
     Signer, TerminationStarted
 )
-from data_ocean.converter import BulkCreateManager
+from data_ocean.cache import bump_data_versions
+from data_ocean.converter import BulkCreateManager, BulkUpdateManager, RecordChildren
 from data_ocean.downloader import Downloader
+from data_ocean.savepoint import Checkpoint
 from data_ocean.utils import (cut_first_word, format_date_to_yymmdd, get_first_word,
                               to_lower_string_if_exists, log_records)
 from location_register.converter.address import AddressConverter
+from stats.report_metrics import ReportMetrics
 from stats.tasks import endpoints_cache_warm_up
 
 logger = logging.getLogger(__name__)
@@ -36,6 +43,7 @@ class UkrCompanyFullConverter(CompanyConverter):
         self.RECORD_TAG = 'SUBJECT'
         self.bulk_manager = BulkCreateManager()
         self.branch_bulk_manager = BulkCreateManager()
+        self.update_manager = BulkUpdateManager()
         self.all_bylaw_dict = self.put_objects_to_dict("name", "business_register", "Bylaw")
         self.all_predecessors_dict = self.put_objects_to_dict("name", "business_register", "Predecessor")
         self.all_companies_dict = {}
@@ -51,32 +59,74 @@ class UkrCompanyFullConverter(CompanyConverter):
         self.assignee_to_dict = {}
         self.exchange_data_to_dict = {}
         self.branches_to_dict = {}
+        self.stored_companies_dict = {}
+        self.stored_branches_dict = {}
+        self.stored_related_dict = {}
         self.company_country = AddressConverter().save_or_get_country('Ukraine')
         self.source = Company.UKRAINE_REGISTER
-        self.already_stored_companies =\
-            list(Company.objects.filter(source=Company.UKRAINE_REGISTER).values_list('id', flat=True))
+        # companies stored before the import are selected in delete_outdated() by this bound,
+        # so worker processes of process_parallel() do not load ids of all companies
+        self.last_stored_company_id =\
+            Company.include_deleted_objects.order_by('-id').values_list('id', flat=True).first() or 0
         self.uptodated_companies = []
         self.invalid_data_counter = 0
+        # EDRPOU of added, changed and deleted founders to refresh FoundedCompanies in delete_outdated()
+        self.changed_founders_edrpou = set()
         super().__init__()
 
     def save_or_get_bylaw(self, bylaw_from_record):
         if bylaw_from_record not in self.all_bylaw_dict:
-            new_bylaw = Bylaw.objects.create(name=bylaw_from_record)
+            new_bylaw = Bylaw.objects.get_or_create(name=bylaw_from_record)[0]
             self.all_bylaw_dict[bylaw_from_record] = new_bylaw
             return new_bylaw
         return self.all_bylaw_dict[bylaw_from_record]
 
     def save_or_get_predecessor(self, item):
-        if item.xpath('NAME')[0].text not in self.all_predecessors_dict or \
-                (hasattr(self.all_predecessors_dict, item.xpath('NAME')[0].text) and item.xpath('CODE')[0].text != \
-                 self.all_predecessors_dict[item.xpath('NAME')[0].text].code):
+        item_fields = RecordChildren(item)
+        if item_fields['NAME'][0].text not in self.all_predecessors_dict or \
+                (hasattr(self.all_predecessors_dict, item_fields['NAME'][0].text) and item_fields['CODE'][0].text != \
+                 self.all_predecessors_dict[item_fields['NAME'][0].text].code):
             new_predecessor = Predecessor.objects.create(
-                name=item.xpath('NAME')[0].text.lower(),
-                edrpou=item.xpath('CODE')[0].text
+                name=item_fields['NAME'][0].text.lower(),
+                edrpou=item_fields['CODE'][0].text
             )
-            self.all_predecessors_dict[item.xpath('NAME')[0].text] = new_predecessor
+            self.all_predecessors_dict[item_fields['NAME'][0].text] = new_predecessor
             return new_predecessor
-        return self.all_predecessors_dict[item.xpath('NAME')[0].text]
+        return self.all_predecessors_dict[item_fields['NAME'][0].text]
+
+    def prefetch_stored_data(self, records):
+        """
+        loading all already stored companies of the chunk with their branches and related objects
+        by a few queries instead of querying DB for every record
+        """
+        codes = []
+        for record in records:
+            record_fields = RecordChildren(record)
+            edrpou = record_fields['EDRPOU'][0].text
+            name = record_fields['NAME'][0].text
+            if edrpou and name:
+                codes.append(name.lower() + edrpou)
+        self.stored_companies_dict = {}
+        for company in Company.include_deleted_objects.filter(code__in=codes, source=self.source):
+            self.stored_companies_dict.setdefault(company.code, company)
+        company_ids = [company.id for company in self.stored_companies_dict.values()]
+        self.stored_branches_dict = defaultdict(list)
+        for branch in Company.include_deleted_objects.filter(parent_id__in=company_ids):
+            self.stored_branches_dict[branch.parent_id].append(branch)
+            company_ids.append(branch.id)
+        self.stored_related_dict = {}
+        for model in (Founder, Signer, Assignee, CompanyToKved, ExchangeDataCompany, CompanyToPredecessor,
+                      CompanyDetail, TerminationStarted, BancruptcyReadjustment):
+            self.stored_related_dict[model] = defaultdict(list)
+            for obj in model.include_deleted_objects.filter(company_id__in=company_ids):
+                self.stored_related_dict[model][obj.company_id].append(obj)
+
+    def get_stored_related(self, model, company):
+        return list(self.stored_related_dict[model].get(company.id, []))
+
+    def get_first_stored_related(self, model, company):
+        stored_objects = self.stored_related_dict[model].get(company.id)
+        return stored_objects[0] if stored_objects else None
 
     def extract_detail_founder_data(self, founder_info):
         info_to_list = founder_info.split(',')
@@ -207,7 +257,7 @@ class UkrCompanyFullConverter(CompanyConverter):
             self.founder_to_dict[code].append(founder)
 
     def update_founders(self, founders_from_record, beneficiaries_from_record, company):
-        already_stored_founders = list(Founder.include_deleted_objects.filter(company_id=company.id))
+        already_stored_founders = self.get_stored_related(Founder, company)
         for item in founders_from_record:
             info = item.text
             # checking if field contains data
@@ -255,6 +305,7 @@ class UkrCompanyFullConverter(CompanyConverter):
                                 stored_founder.equity = equity
                                 update_fields.append('equity')
                             if edrpou and stored_founder.edrpou != edrpou:
+                                self.changed_founders_edrpou.update((stored_founder.edrpou, edrpou))
                                 stored_founder.edrpou = edrpou
                                 update_fields.append('edrpou')
                             if country and stored_founder.country != country:
@@ -263,9 +314,10 @@ class UkrCompanyFullConverter(CompanyConverter):
                             if stored_founder.deleted_at:
                                 stored_founder.deleted_at = None
                                 update_fields.append('deleted_at')
+                                self.changed_founders_edrpou.add(stored_founder.edrpou)
                             if update_fields:
                                 update_fields.append('updated_at')
-                                stored_founder.save(update_fields=update_fields)
+                                self.update_manager.add(stored_founder, update_fields)
                         already_stored_founders.remove(stored_founder)
                         break
             if not already_stored:
@@ -282,6 +334,7 @@ class UkrCompanyFullConverter(CompanyConverter):
                     is_founder=True
                 )
                 self.bulk_manager.add(founder)
+                self.changed_founders_edrpou.add(founder.edrpou)
         for beneficiary in beneficiaries_from_record:
             name_beneficiary, country_beneficiary, address_beneficiary, edrpou_beneficiary = \
                 self.extract_beneficiary_data(beneficiary.text)
@@ -298,6 +351,7 @@ class UkrCompanyFullConverter(CompanyConverter):
                             stored_founder.info_beneficiary = info_beneficiary
                             stored_founder.address = address_beneficiary
                             stored_founder.country = country_beneficiary
+                            self.changed_founders_edrpou.update((stored_founder.edrpou, edrpou_beneficiary))
                             stored_founder.edrpou = edrpou_beneficiary
                             stored_founder.is_beneficiary = True
                             stored_founder.is_founder = False
@@ -306,8 +360,9 @@ class UkrCompanyFullConverter(CompanyConverter):
                             if stored_founder.deleted_at:
                                 stored_founder.deleted_at = None
                                 update_fields.append('deleted_at')
+                                self.changed_founders_edrpou.add(stored_founder.edrpou)
                             update_fields.append('updated_at')
-                            stored_founder.save(update_fields=update_fields)
+                            self.update_manager.add(stored_founder, update_fields)
                         already_stored_founders.remove(stored_founder)
                         break
             if not already_stored:
@@ -325,9 +380,11 @@ class UkrCompanyFullConverter(CompanyConverter):
                 if country_beneficiary and len(country_beneficiary) > 100:
                     print('country', country_beneficiary, 'name', name, 'address', address)
                 self.bulk_manager.add(founder)
+                self.changed_founders_edrpou.add(founder.edrpou)
         if len(already_stored_founders):
             for outdated_founder in already_stored_founders:
-                outdated_founder.soft_delete()
+                self.update_manager.soft_delete(outdated_founder)
+                self.changed_founders_edrpou.add(outdated_founder.edrpou)
 
     def add_company_detail(self, founding_document_number, executive_power, superior_management,
                            managing_paper, terminated_info, termination_cancel_info, vp_dates,
@@ -345,7 +402,7 @@ class UkrCompanyFullConverter(CompanyConverter):
     def update_company_detail(self, founding_document_number, executive_power, superior_management,
                               managing_paper, terminated_info, termination_cancel_info, vp_dates,
                               company):
-        company_detail = CompanyDetail.include_deleted_objects.filter(company_id=company.id).first()
+        company_detail = self.get_first_stored_related(CompanyDetail, company)
         if company_detail:
             update_fields = []
             if company_detail.founding_document_number != founding_document_number:
@@ -374,7 +431,7 @@ class UkrCompanyFullConverter(CompanyConverter):
                 update_fields.append('deleted_at')
             if len(update_fields):
                 update_fields.append('updated_at')
-                company_detail.save(update_fields=update_fields)
+                self.update_manager.add(company_detail, update_fields)
         else:
             company_detail = CompanyDetail()
             company_detail.founding_document_number = founding_document_number
@@ -390,12 +447,13 @@ class UkrCompanyFullConverter(CompanyConverter):
     def add_assignees(self, assignees_from_record, code):
         assignees = []
         for item in assignees_from_record:
+            item_fields = RecordChildren(item)
             assignee = Assignee()
-            if item.xpath('NAME')[0].text:
-                assignee.name = item.xpath('NAME')[0].text.lower()
+            if item_fields['NAME'][0].text:
+                assignee.name = item_fields['NAME'][0].text.lower()
             else:
                 assignee.name = ''
-            assignee.edrpou = item.xpath('CODE')[0].text
+            assignee.edrpou = item_fields['CODE'][0].text
             if not assignee.edrpou:
                 assignee.edrpou = ''
             if assignee.name or assignee.edrpou:
@@ -403,14 +461,15 @@ class UkrCompanyFullConverter(CompanyConverter):
         self.assignee_to_dict[code] = assignees
 
     def update_assignees(self, assignees_from_record, company):
-        already_stored_assignees = list(Assignee.include_deleted_objects.filter(company_id=company.id))
+        already_stored_assignees = self.get_stored_related(Assignee, company)
         for item in assignees_from_record:
-            name = item.xpath('NAME')[0].text
+            item_fields = RecordChildren(item)
+            name = item_fields['NAME'][0].text
             if name:
                 name = name.lower()
             else:
                 name = ''
-            edrpou = item.xpath('CODE')[0].text
+            edrpou = item_fields['CODE'][0].text
             if not edrpou:
                 edrpou = ''
             if not name and not edrpou:
@@ -422,7 +481,7 @@ class UkrCompanyFullConverter(CompanyConverter):
                         already_stored = True
                         if stored_assignee.deleted_at:
                             stored_assignee.deleted_at = None
-                            stored_assignee.save(update_fields=['deleted_at', 'updated_at'])
+                            self.update_manager.add(stored_assignee, ['deleted_at'])
                         already_stored_assignees.remove(stored_assignee)
                         break
             if not already_stored:
@@ -433,109 +492,113 @@ class UkrCompanyFullConverter(CompanyConverter):
                 self.bulk_manager.add(assignee)
         if len(already_stored_assignees):
             for outdated_assignees in already_stored_assignees:
-                outdated_assignees.soft_delete()
+                self.update_manager.soft_delete(outdated_assignees)
 
     def add_branches(self, branches_from_record, code):
         branches = []
         for item in branches_from_record:
+            item_fields = RecordChildren(item)
             branch = Company()
-            if item.xpath('CODE'):
-                branch.edrpou = item.xpath('CODE')[0].text or ''
+            if item_fields['CODE']:
+                branch.edrpou = item_fields['CODE'][0].text or ''
             else:
                 branch.edrpou = ''
-            if item.xpath('NAME'):
-                branch.name = item.xpath('NAME')[0].text or ''
+            if item_fields['NAME']:
+                branch.name = item_fields['NAME'][0].text or ''
             else:
                 continue
-            branch.address = item.xpath('ADDRESS')[0].text
-            branch.registration_date = format_date_to_yymmdd(item.xpath('CREATE_DATE')[0].text)
-            if item.xpath('CONTACTS'):
-                branch.contact_info = item.xpath('CONTACTS')[0].text
+            branch.address = item_fields['ADDRESS'][0].text
+            branch.registration_date = format_date_to_yymmdd(item_fields['CREATE_DATE'][0].text)
+            if item_fields['CONTACTS']:
+                branch.contact_info = item_fields['CONTACTS'][0].text
             branch.code = branch.edrpou + branch.name
             branches.append(branch)
-            if item.xpath('SIGNER'):
-                self.add_signers([item.xpath('SIGNER')[0]], branch.code)
-            if item.xpath('ACTIVITY_KINDS'):
-                self.add_company_to_kved(item.xpath('ACTIVITY_KINDS')[0], branch.code)
-            self.add_exchange_data(item.xpath('EXCHANGE_DATA')[0], branch.code)
+            if item_fields['SIGNER']:
+                self.add_signers([item_fields['SIGNER'][0]], branch.code)
+            if item_fields['ACTIVITY_KINDS']:
+                self.add_company_to_kved(item_fields['ACTIVITY_KINDS'][0], branch.code)
+            self.add_exchange_data(item_fields['EXCHANGE_DATA'][0], branch.code)
         self.branches_to_dict[code] = branches
 
     def update_branches(self, branches_from_record, company):
-        already_stored_branches = list(Company.include_deleted_objects.filter(parent_id=company.id))
+        already_stored_branches = list(self.stored_branches_dict.get(company.id, []))
         for item in branches_from_record:
+            item_fields = RecordChildren(item)
             already_stored = False
             if len(already_stored_branches):
                 for branch in already_stored_branches:
-                    if branch.name == item.xpath('NAME')[0].text and \
-                            branch.edrpou == item.xpath('CODE')[0].text:
+                    if branch.name == item_fields['NAME'][0].text and \
+                            branch.edrpou == item_fields['CODE'][0].text:
                         already_stored = True
                         self.uptodated_companies.append(branch.id)
                         update_fields = []
-                        if branch.address != item.xpath('ADDRESS')[0].text:
-                            branch.address = item.xpath('ADDRESS')[0].text
+                        if branch.address != item_fields['ADDRESS'][0].text:
+                            branch.address = item_fields['ADDRESS'][0].text
                             update_fields.append('address')
-                        if branch.registration_date != format_date_to_yymmdd(item.xpath('CREATE_DATE')[0].text):
-                            branch.address = format_date_to_yymmdd(item.xpath('CREATE_DATE')[0].text)
+                        if branch.registration_date != format_date_to_yymmdd(item_fields['CREATE_DATE'][0].text):
+                            branch.address = format_date_to_yymmdd(item_fields['CREATE_DATE'][0].text)
                             update_fields.append('registration_date')
-                        if item.xpath('CONTACTS') and branch.contact_info != item.xpath('CONTACTS')[0].text:
-                            branch.contact_info = item.xpath('CONTACTS')[0].text
+                        if item_fields['CONTACTS'] and branch.contact_info != item_fields['CONTACTS'][0].text:
+                            branch.contact_info = item_fields['CONTACTS'][0].text
                             update_fields.append('contact_info')
                         if branch.deleted_at:
                             branch.deleted_at = None
                             update_fields.append('deleted_at')
                         if len(update_fields):
                             update_fields.append('updated_at')
-                            branch.save(update_fields=update_fields)
-                        if item.xpath('SIGNER'):
-                            self.update_signers([item.xpath('SIGNER')[0]], branch)
-                        if item.xpath('ACTIVITY_KINDS'):
-                            self.update_company_to_kved(item.xpath('ACTIVITY_KINDS')[0], branch)
-                        self.update_exchange_data(item.xpath('EXCHANGE_DATA')[0], branch)
+                            self.update_manager.add(branch, update_fields)
+                        if item_fields['SIGNER']:
+                            self.update_signers([item_fields['SIGNER'][0]], branch)
+                        if item_fields['ACTIVITY_KINDS']:
+                            self.update_company_to_kved(item_fields['ACTIVITY_KINDS'][0], branch)
+                        self.update_exchange_data(item_fields['EXCHANGE_DATA'][0], branch)
             if not already_stored:
                 branch = Company()
-                if item.xpath('CODE'):
-                    branch.edrpou = item.xpath('CODE')[0].text or ''
+                if item_fields['CODE']:
+                    branch.edrpou = item_fields['CODE'][0].text or ''
                 else:
                     branch.edrpou = ''
-                if item.xpath('NAME'):
-                    branch.name = item.xpath('NAME')[0].text or ''
+                if item_fields['NAME']:
+                    branch.name = item_fields['NAME'][0].text or ''
                 else:
                     continue
-                branch.address = item.xpath('ADDRESS')[0].text
-                branch.registration_date = format_date_to_yymmdd(item.xpath('CREATE_DATE')[0].text)
-                if item.xpath('CONTACTS'):
-                    branch.contact_info = item.xpath('CONTACTS')[0].text
+                branch.address = item_fields['ADDRESS'][0].text
+                branch.registration_date = format_date_to_yymmdd(item_fields['CREATE_DATE'][0].text)
+                if item_fields['CONTACTS']:
+                    branch.contact_info = item_fields['CONTACTS'][0].text
                 branch.code = branch.edrpou + branch.name
                 self.bulk_manager.add(branch)
-                if item.xpath('SIGNER'):
-                    self.add_signers([item.xpath('SIGNER')[0]], branch.code)
-                if item.xpath('ACTIVITY_KINDS'):
-                    self.add_company_to_kved(item.xpath('ACTIVITY_KINDS')[0], branch.code)
-                self.add_exchange_data(item.xpath('EXCHANGE_DATA')[0], branch.code)
+                if item_fields['SIGNER']:
+                    self.add_signers([item_fields['SIGNER'][0]], branch.code)
+                if item_fields['ACTIVITY_KINDS']:
+                    self.add_company_to_kved(item_fields['ACTIVITY_KINDS'][0], branch.code)
+                self.add_exchange_data(item_fields['EXCHANGE_DATA'][0], branch.code)
 
     def add_bancruptcy_readjustment(self, record, code):
+        record_fields = RecordChildren(record)
         bancruptcy_readjustment = BancruptcyReadjustment()
         bancruptcy_readjustment.op_date = format_date_to_yymmdd(
-            record.xpath('BANKRUPTCY_READJUSTMENT_INFO/OP_DATE')[0].text) or None
-        bancruptcy_readjustment.reason = record.xpath(
-            'BANKRUPTCY_READJUSTMENT_INFO/REASON')[0].text.lower()
-        bancruptcy_readjustment.sbj_state = record.xpath(
-            'BANKRUPTCY_READJUSTMENT_INFO/SBJ_STATE')[0].text.lower()
-        if record.xpath('BANKRUPTCY_READJUSTMENT_INFO/BANKRUPTCY_READJUSTMENT_HEAD_NAME'):
-            head_name = record.xpath('BANKRUPTCY_READJUSTMENT_INFO/BANKRUPTCY_READJUSTMENT_HEAD_NAME')[0].text
+            record_fields['BANKRUPTCY_READJUSTMENT_INFO/OP_DATE'][0].text) or None
+        bancruptcy_readjustment.reason = record_fields[
+            'BANKRUPTCY_READJUSTMENT_INFO/REASON'][0].text.lower()
+        bancruptcy_readjustment.sbj_state = record_fields[
+            'BANKRUPTCY_READJUSTMENT_INFO/SBJ_STATE'][0].text.lower()
+        if record_fields['BANKRUPTCY_READJUSTMENT_INFO/BANKRUPTCY_READJUSTMENT_HEAD_NAME']:
+            head_name = record_fields['BANKRUPTCY_READJUSTMENT_INFO/BANKRUPTCY_READJUSTMENT_HEAD_NAME'][0].text
             if head_name:
                 bancruptcy_readjustment.head_name = head_name.lower()
         self.bancruptcy_readjustment_to_dict[code] = bancruptcy_readjustment
 
     def update_bancruptcy_readjustment(self, record, company):
+        record_fields = RecordChildren(record)
         already_stored_bancruptcy_readjustment = \
-            BancruptcyReadjustment.include_deleted_objects.filter(company_id=company.id).first()
-        if record.xpath('BANKRUPTCY_READJUSTMENT_INFO/OP_DATE'):
-            op_date = format_date_to_yymmdd(record.xpath('BANKRUPTCY_READJUSTMENT_INFO/OP_DATE')[0].text) or None
-            reason = record.xpath('BANKRUPTCY_READJUSTMENT_INFO/REASON')[0].text.lower()
-            sbj_state = record.xpath('BANKRUPTCY_READJUSTMENT_INFO/SBJ_STATE')[0].text.lower()
-            if record.xpath('BANKRUPTCY_READJUSTMENT_INFO/BANKRUPTCY_READJUSTMENT_HEAD_NAME'):
-                head_name = record.xpath('BANKRUPTCY_READJUSTMENT_INFO/BANKRUPTCY_READJUSTMENT_HEAD_NAME')[0].text
+            self.get_first_stored_related(BancruptcyReadjustment, company)
+        if record_fields['BANKRUPTCY_READJUSTMENT_INFO/OP_DATE']:
+            op_date = format_date_to_yymmdd(record_fields['BANKRUPTCY_READJUSTMENT_INFO/OP_DATE'][0].text) or None
+            reason = record_fields['BANKRUPTCY_READJUSTMENT_INFO/REASON'][0].text.lower()
+            sbj_state = record_fields['BANKRUPTCY_READJUSTMENT_INFO/SBJ_STATE'][0].text.lower()
+            if record_fields['BANKRUPTCY_READJUSTMENT_INFO/BANKRUPTCY_READJUSTMENT_HEAD_NAME']:
+                head_name = record_fields['BANKRUPTCY_READJUSTMENT_INFO/BANKRUPTCY_READJUSTMENT_HEAD_NAME'][0].text
                 if head_name:
                     head_name = head_name.lower()
             else:
@@ -568,35 +631,37 @@ class UkrCompanyFullConverter(CompanyConverter):
                     update_fields.append('deleted_at')
                 if len(update_fields):
                     update_fields.append('updated_at')
-                    already_stored_bancruptcy_readjustment.save(update_fields=update_fields)
+                    self.update_manager.add(already_stored_bancruptcy_readjustment, update_fields)
         elif already_stored_bancruptcy_readjustment:
-            already_stored_bancruptcy_readjustment.soft_delete()
+            self.update_manager.soft_delete(already_stored_bancruptcy_readjustment)
 
     def add_company_to_kved(self, kveds_from_record, code):
         company_to_kveds = []
         for item in kveds_from_record:
-            if not item.xpath('NAME'):
+            item_fields = RecordChildren(item)
+            if not item_fields['NAME']:
                 continue
-            kved_code = item.xpath('CODE')[0].text
-            kved_name = item.xpath('NAME')[0].text
+            kved_code = item_fields['CODE'][0].text
+            kved_name = item_fields['NAME'][0].text
             if not kved_name:
                 continue
             if not kved_code:
                 kved_code = ''
             company_to_kved = CompanyToKved()
             company_to_kved.kved = self.get_kved_from_DB(kved_code, kved_name)
-            if item.xpath('PRIMARY'):
-                company_to_kved.primary_kved = item.xpath('PRIMARY')[0].text == "так"
+            if item_fields['PRIMARY']:
+                company_to_kved.primary_kved = item_fields['PRIMARY'][0].text == "так"
             company_to_kveds.append(company_to_kved)
         self.company_to_kved_to_dict[code] = company_to_kveds
 
     def update_company_to_kved(self, kveds_from_record, company):
-        already_stored_company_to_kved = list(CompanyToKved.include_deleted_objects.filter(company_id=company.id))
+        already_stored_company_to_kved = self.get_stored_related(CompanyToKved, company)
         for item in kveds_from_record:
-            if not item.xpath('NAME'):
+            item_fields = RecordChildren(item)
+            if not item_fields['NAME']:
                 continue
-            kved_code = item.xpath('CODE')[0].text
-            kved_name = item.xpath('NAME')[0].text
+            kved_code = item_fields['CODE'][0].text
+            kved_name = item_fields['NAME'][0].text
             if not kved_name:
                 continue
             if not kved_code:
@@ -608,68 +673,70 @@ class UkrCompanyFullConverter(CompanyConverter):
                     if stored_company_to_kved.kved_id == kved_from_db.id:
                         already_stored = True
                         update_fields = []
-                        if item.xpath('PRIMARY'):
-                            if stored_company_to_kved.primary_kved != (item.xpath('PRIMARY')[0].text == "так"):
-                                stored_company_to_kved.primary_kved = item.xpath('PRIMARY')[0].text == "так"
+                        if item_fields['PRIMARY']:
+                            if stored_company_to_kved.primary_kved != (item_fields['PRIMARY'][0].text == "так"):
+                                stored_company_to_kved.primary_kved = item_fields['PRIMARY'][0].text == "так"
                                 update_fields.append('primary_kved')
                         if stored_company_to_kved.deleted_at:
                             stored_company_to_kved.deleted_at = None
                             update_fields.append('deleted_at')
                         if len(update_fields):
                             update_fields.append('updated_at')
-                            stored_company_to_kved.save(update_fields=update_fields)
+                            self.update_manager.add(stored_company_to_kved, update_fields)
                         already_stored_company_to_kved.remove(stored_company_to_kved)
                         break
             if not already_stored:
                 company_to_kved = CompanyToKved()
                 company_to_kved.company = company
                 company_to_kved.kved = kved_from_db
-                if item.xpath('PRIMARY'):
-                    company_to_kved.primary_kved = item.xpath('PRIMARY')[0].text == "так"
+                if item_fields['PRIMARY']:
+                    company_to_kved.primary_kved = item_fields['PRIMARY'][0].text == "так"
                 self.bulk_manager.add(company_to_kved)
         if len(already_stored_company_to_kved):
             for outdated_company_to_kved in already_stored_company_to_kved:
-                outdated_company_to_kved.soft_delete()
+                self.update_manager.soft_delete(outdated_company_to_kved)
 
     def add_exchange_data(self, exchange_data_from_record, code):
         exchange_datas = []
         for item in exchange_data_from_record:
-            if item.xpath('AUTHORITY_NAME') and item.xpath('AUTHORITY_NAME')[0].text:
+            item_fields = RecordChildren(item)
+            if item_fields['AUTHORITY_NAME'] and item_fields['AUTHORITY_NAME'][0].text:
                 exchange_data = ExchangeDataCompany()
-                exchange_data.authority = self.save_or_get_authority(item.xpath(
-                    'AUTHORITY_NAME')[0].text)
-                if item.xpath('TAX_PAYER_TYPE'):
-                    taxpayer_type = item.xpath('TAX_PAYER_TYPE')[0].text
+                exchange_data.authority = self.save_or_get_authority(item_fields[
+                    'AUTHORITY_NAME'][0].text)
+                if item_fields['TAX_PAYER_TYPE']:
+                    taxpayer_type = item_fields['TAX_PAYER_TYPE'][0].text
                     exchange_data.taxpayer_type = self.save_or_get_taxpayer_type(taxpayer_type)
-                if item.xpath('START_DATE'):
+                if item_fields['START_DATE']:
                     exchange_data.start_date = format_date_to_yymmdd(
-                        item.xpath('START_DATE')[0].text) or None
-                if item.xpath('START_NUM'):
-                    exchange_data.start_number = item.xpath('START_NUM')[0].text
-                if item.xpath('END_DATE'):
+                        item_fields['START_DATE'][0].text) or None
+                if item_fields['START_NUM']:
+                    exchange_data.start_number = item_fields['START_NUM'][0].text
+                if item_fields['END_DATE']:
                     exchange_data.end_date = format_date_to_yymmdd(
-                        item.xpath('END_DATE')[0].text) or None
-                if item.xpath('END_NUM'):
-                    exchange_data.end_number = item.xpath('END_NUM')[0].text
+                        item_fields['END_DATE'][0].text) or None
+                if item_fields['END_NUM']:
+                    exchange_data.end_number = item_fields['END_NUM'][0].text
                 exchange_datas.append(exchange_data)
             self.exchange_data_to_dict[code] = exchange_datas
 
     def update_exchange_data(self, exchange_data_from_record, company):
-        already_stored_exchange_data = list(ExchangeDataCompany.include_deleted_objects.filter(company_id=company.id))
+        already_stored_exchange_data = self.get_stored_related(ExchangeDataCompany, company)
         for item in exchange_data_from_record:
-            if not item.xpath('NAME'):
+            item_fields = RecordChildren(item)
+            if not item_fields['NAME']:
                 continue
-            authority = self.save_or_get_authority(item.xpath('AUTHORITY_NAME')[0].text)
-            taxpayer_type = item.xpath('TAX_PAYER_TYPE')[0].text
+            authority = self.save_or_get_authority(item_fields['AUTHORITY_NAME'][0].text)
+            taxpayer_type = item_fields['TAX_PAYER_TYPE'][0].text
             start_date, end_date = None, None
             if taxpayer_type:
                 taxpayer_type = self.save_or_get_taxpayer_type(taxpayer_type)
-            if item.xpath('START_DATE')[0].text:
-                start_date = format_date_to_yymmdd(item.xpath('START_DATE')[0].text) or None
-            start_number = item.xpath('START_NUM')[0].text
-            if item.xpath('END_DATE')[0].text:
-                end_date = format_date_to_yymmdd(item.xpath('END_DATE')[0].text) or None
-            end_number = item.xpath('END_NUM')[0].text
+            if item_fields['START_DATE'][0].text:
+                start_date = format_date_to_yymmdd(item_fields['START_DATE'][0].text) or None
+            start_number = item_fields['START_NUM'][0].text
+            if item_fields['END_DATE'][0].text:
+                end_date = format_date_to_yymmdd(item_fields['END_DATE'][0].text) or None
+            end_number = item_fields['END_NUM'][0].text
             already_stored = False
             if len(already_stored_exchange_data):
                 for stored_exchange_data in already_stored_exchange_data:
@@ -694,7 +761,7 @@ class UkrCompanyFullConverter(CompanyConverter):
                             update_fields.append('deleted_at')
                         if len(update_fields):
                             update_fields.append('updated_at')
-                            stored_exchange_data.save(update_fields=update_fields)
+                            self.update_manager.add(stored_exchange_data, update_fields)
                         already_stored_exchange_data.remove(stored_exchange_data)
             if not already_stored:
                 exchange_data = ExchangeDataCompany()
@@ -708,22 +775,23 @@ class UkrCompanyFullConverter(CompanyConverter):
                 self.bulk_manager.add(exchange_data)
         if len(already_stored_exchange_data):
             for outdated_exchange_data in already_stored_exchange_data:
-                outdated_exchange_data.soft_delete()
+                self.update_manager.soft_delete(outdated_exchange_data)
 
     def add_company_to_predecessors(self, predecessors_from_record, code):
         company_to_predecessors = []
         for item in predecessors_from_record:
-            if item.xpath('NAME')[0].text:
+            item_fields = RecordChildren(item)
+            if item_fields['NAME'][0].text:
                 company_to_predecessor = CompanyToPredecessor()
                 company_to_predecessor.predecessor = self.save_or_get_predecessor(item)
                 company_to_predecessors.append(company_to_predecessor)
         self.company_to_predecessor_to_dict[code] = company_to_predecessors
 
     def update_company_to_predecessors(self, predecessors_from_record, company):
-        already_stored_company_to_predecessors = \
-            list(CompanyToPredecessor.include_deleted_objects.filter(company_id=company.id))
+        already_stored_company_to_predecessors = self.get_stored_related(CompanyToPredecessor, company)
         for item in predecessors_from_record:
-            if item.xpath('NAME')[0].text:
+            item_fields = RecordChildren(item)
+            if item_fields['NAME'][0].text:
                 already_stored = False
                 predecessor = self.save_or_get_predecessor(item)
                 if len(already_stored_company_to_predecessors):
@@ -732,7 +800,7 @@ class UkrCompanyFullConverter(CompanyConverter):
                             already_stored = True
                             if stored_predecessor.deleted_at:
                                 stored_predecessor.deleted_at = None
-                                stored_predecessor.save(update_fields=['deleted_at', 'updated_at'])
+                                self.update_manager.add(stored_predecessor, ['deleted_at'])
                             already_stored_company_to_predecessors.remove(stored_predecessor)
                             break
                 if not already_stored:
@@ -742,7 +810,7 @@ class UkrCompanyFullConverter(CompanyConverter):
                     self.bulk_manager.add(company_to_predecessor)
         if len(already_stored_company_to_predecessors):
             for outdated_company_to_predecessors in already_stored_company_to_predecessors:
-                outdated_company_to_predecessors.soft_delete()
+                self.update_manager.soft_delete(outdated_company_to_predecessors)
 
     def add_signers(self, signers_from_record, code):
         signers = []
@@ -753,7 +821,7 @@ class UkrCompanyFullConverter(CompanyConverter):
         self.signer_to_dict[code] = signers
 
     def update_signers(self, signers_from_record, company):
-        already_stored_signers = list(Signer.include_deleted_objects.filter(company_id=company.id))
+        already_stored_signers = self.get_stored_related(Signer, company)
         for item in signers_from_record:
             already_stored = False
             if len(already_stored_signers):
@@ -762,7 +830,7 @@ class UkrCompanyFullConverter(CompanyConverter):
                         already_stored = True
                         if stored_signer.deleted_at:
                             stored_signer.deleted_at = None
-                            stored_signer.save(update_fields=['deleted_at', 'updated_at'])
+                            self.update_manager.add(stored_signer, ['deleted_at'])
                         already_stored_signers.remove(stored_signer)
                         break
             if not already_stored:
@@ -772,42 +840,43 @@ class UkrCompanyFullConverter(CompanyConverter):
                 self.bulk_manager.add(signer)
         if len(already_stored_signers):
             for outdated_signers in already_stored_signers:
-                outdated_signers.soft_delete()
+                self.update_manager.soft_delete(outdated_signers)
 
     def add_termination_started(self, record, code):
+        record_fields = RecordChildren(record)
         termination_started = TerminationStarted()
-        if record.xpath('TERMINATION_STARTED_INFO/OP_DATE')[0].text:
+        if record_fields['TERMINATION_STARTED_INFO/OP_DATE'][0].text:
             termination_started.op_date = format_date_to_yymmdd(
-                record.xpath('TERMINATION_STARTED_INFO/OP_DATE')[0].text) or None
-        termination_started.reason = record.xpath('TERMINATION_STARTED_INFO'
-                                                  '/REASON')[0].text.lower()
-        termination_started.sbj_state = record.xpath(
-            'TERMINATION_STARTED_INFO/SBJ_STATE')[0].text.lower()
-        if record.xpath('TERMINATION_STARTED_INFO/SIGNER_NAME'):
-            signer_name = record.xpath('TERMINATION_STARTED_INFO/SIGNER_NAME')[0].text
+                record_fields['TERMINATION_STARTED_INFO/OP_DATE'][0].text) or None
+        termination_started.reason = record_fields['TERMINATION_STARTED_INFO'
+                                                  '/REASON'][0].text.lower()
+        termination_started.sbj_state = record_fields[
+            'TERMINATION_STARTED_INFO/SBJ_STATE'][0].text.lower()
+        if record_fields['TERMINATION_STARTED_INFO/SIGNER_NAME']:
+            signer_name = record_fields['TERMINATION_STARTED_INFO/SIGNER_NAME'][0].text
             if signer_name:
                 termination_started.signer_name = signer_name.lower()
-        if record.xpath('TERMINATION_STARTED_INFO/CREDITOR_REQ_END_DATE'):
+        if record_fields['TERMINATION_STARTED_INFO/CREDITOR_REQ_END_DATE']:
             termination_started.creditor_reg_end_date = format_date_to_yymmdd(
-                record.xpath('TERMINATION_STARTED_INFO/CREDITOR_REQ_END_DATE')[0].text) or '1990-01-01'
+                record_fields['TERMINATION_STARTED_INFO/CREDITOR_REQ_END_DATE'][0].text) or '1990-01-01'
         self.termination_started_to_dict[code] = termination_started
 
     def update_termination_started(self, record, company):
-        already_stored_termination_started = \
-            TerminationStarted.include_deleted_objects.filter(company_id=company.id).first()
-        if record.xpath('TERMINATION_STARTED_INFO/OP_DATE'):
-            op_date = format_date_to_yymmdd(record.xpath('TERMINATION_STARTED_INFO/OP_DATE')[0].text) or None
-            reason = record.xpath('TERMINATION_STARTED_INFO/REASON')[0].text.lower()
-            sbj_state = record.xpath('TERMINATION_STARTED_INFO/SBJ_STATE')[0].text.lower()
-            if record.xpath('TERMINATION_STARTED_INFO/SIGNER_NAME'):
-                signer_name = record.xpath('TERMINATION_STARTED_INFO/SIGNER_NAME')[0].text
+        record_fields = RecordChildren(record)
+        already_stored_termination_started = self.get_first_stored_related(TerminationStarted, company)
+        if record_fields['TERMINATION_STARTED_INFO/OP_DATE']:
+            op_date = format_date_to_yymmdd(record_fields['TERMINATION_STARTED_INFO/OP_DATE'][0].text) or None
+            reason = record_fields['TERMINATION_STARTED_INFO/REASON'][0].text.lower()
+            sbj_state = record_fields['TERMINATION_STARTED_INFO/SBJ_STATE'][0].text.lower()
+            if record_fields['TERMINATION_STARTED_INFO/SIGNER_NAME']:
+                signer_name = record_fields['TERMINATION_STARTED_INFO/SIGNER_NAME'][0].text
                 if signer_name:
                     signer_name = signer_name.lower()
             else:
                 signer_name = None
-            if record.xpath('TERMINATION_STARTED_INFO/CREDITOR_REQ_END_DATE'):
+            if record_fields['TERMINATION_STARTED_INFO/CREDITOR_REQ_END_DATE']:
                 creditor_reg_end_date = format_date_to_yymmdd(
-                    record.xpath('TERMINATION_STARTED_INFO/CREDITOR_REQ_END_DATE')[0].text) or '1990-01-01'
+                    record_fields['TERMINATION_STARTED_INFO/CREDITOR_REQ_END_DATE'][0].text) or '1990-01-01'
             else:
                 creditor_reg_end_date = '1990-01-01'
             if not already_stored_termination_started:
@@ -842,70 +911,72 @@ class UkrCompanyFullConverter(CompanyConverter):
                     update_fields.append('deleted_at')
                 if len(update_fields):
                     update_fields.append('updated_at')
-                    already_stored_termination_started.save(update_fields=update_fields)
+                    self.update_manager.add(already_stored_termination_started, update_fields)
         elif already_stored_termination_started:
-            already_stored_termination_started.soft_delete()
+            self.update_manager.soft_delete(already_stored_termination_started)
 
     def save_to_db(self, records):
+        self.prefetch_stored_data(records)
+        self.time_it('trying get companies\t')
         for record in records:
-            edrpou = record.xpath('EDRPOU')[0].text
+            record_fields = RecordChildren(record)
+            edrpou = record_fields['EDRPOU'][0].text
             if not edrpou:
                 self.invalid_data_counter += 1
                 log_records(record, self.LOCAL_FOLDER + 'invalid_companies.txt', self.invalid_data_counter)
                 continue
-            if record.xpath('NAME')[0].text:
-                name = record.xpath('NAME')[0].text.lower()
+            if record_fields['NAME'][0].text:
+                name = record_fields['NAME'][0].text.lower()
             else:
                 self.invalid_data_counter += 1
                 log_records(record, self.LOCAL_FOLDER + 'invalid_companies.txt', self.invalid_data_counter)
                 continue
             code = name + edrpou
-            address = record.xpath('ADDRESS')[0].text
-            founding_document_number = record.xpath('FOUNDING_DOCUMENT_NUM')[0].text
-            contact_info = record.xpath('CONTACTS')[0].text
-            vp_dates = record.xpath('VP_DATES')[0].text
-            short_name = record.xpath('SHORT_NAME')[0].text
+            address = record_fields['ADDRESS'][0].text
+            founding_document_number = record_fields['FOUNDING_DOCUMENT_NUM'][0].text
+            contact_info = record_fields['CONTACTS'][0].text
+            vp_dates = record_fields['VP_DATES'][0].text
+            short_name = record_fields['SHORT_NAME'][0].text
             if short_name:
                 short_name = short_name.lower()
-            executive_power = record.xpath('EXECUTIVE_POWER')[0].text
+            executive_power = record_fields['EXECUTIVE_POWER'][0].text
             if executive_power:
                 executive_power = executive_power.lower()
-            superior_management = record.xpath('SUPERIOR_MANAGEMENT')[0].text
+            superior_management = record_fields['SUPERIOR_MANAGEMENT'][0].text
             if superior_management:
                 superior_management = superior_management.lower()
-            managing_paper = record.xpath('MANAGING_PAPER')[0].text
+            managing_paper = record_fields['MANAGING_PAPER'][0].text
             if managing_paper:
                 managing_paper = managing_paper.lower()
-            terminated_info = record.xpath('TERMINATED_INFO')[0].text
+            terminated_info = record_fields['TERMINATED_INFO'][0].text
             if terminated_info:
                 terminated_info = terminated_info.lower()
-            termination_cancel_info = record.xpath('TERMINATION_CANCEL_INFO')[0].text
+            termination_cancel_info = record_fields['TERMINATION_CANCEL_INFO'][0].text
             if termination_cancel_info:
                 termination_cancel_info = termination_cancel_info.lower()
-            authorized_capital = record.xpath('AUTHORIZED_CAPITAL')[0].text
+            authorized_capital = record_fields['AUTHORIZED_CAPITAL'][0].text
             if authorized_capital:
                 authorized_capital = authorized_capital.replace(',', '.')
                 authorized_capital = float(authorized_capital)
             registration_date = None
             registration_info = None
-            registration = record.xpath('REGISTRATION')[0].text
+            registration = record_fields['REGISTRATION'][0].text
             if registration:
                 registration_date = format_date_to_yymmdd(get_first_word(registration))
                 registration_info = cut_first_word(registration)
-            company_type = record.xpath('OPF')[0].text
+            company_type = record_fields['OPF'][0].text
             if company_type:
                 company_type = self.save_or_get_company_type(company_type, 'uk')
-            status = self.save_or_get_status(record.xpath('STAN')[0].text)
-            bylaw = self.save_or_get_bylaw(record.xpath('STATUTE')[0].text)
-            authority = record.xpath('CURRENT_AUTHORITY')[0].text
+            status = self.save_or_get_status(record_fields['STAN'][0].text)
+            bylaw = self.save_or_get_bylaw(record_fields['STATUTE'][0].text)
+            authority = record_fields['CURRENT_AUTHORITY'][0].text
             if authority:
                 authority = self.save_or_get_authority(authority)
             else:
                 authority = None
             self.time_it('getting data from record')
 
-            company = Company.include_deleted_objects.filter(code=code, source=Company.UKRAINE_REGISTER).first()
-            self.time_it('trying get companies\t')
+            company = self.stored_companies_dict.get(code)
 
             if not company:
                 company = Company(
@@ -928,25 +999,25 @@ class UkrCompanyFullConverter(CompanyConverter):
                 self.bulk_manager.add(company)
                 self.add_company_detail(founding_document_number, executive_power, superior_management, managing_paper,
                                         terminated_info, termination_cancel_info, vp_dates, code)
-                if len(record.xpath('ACTIVITY_KINDS')[0]):
-                    self.add_company_to_kved(record.xpath('ACTIVITY_KINDS')[0], code)
-                if len(record.xpath('SIGNERS')[0]):
-                    self.add_signers(record.xpath('SIGNERS')[0], code)
-                if record.xpath('TERMINATION_STARTED_INFO/OP_DATE'):
+                if len(record_fields['ACTIVITY_KINDS'][0]):
+                    self.add_company_to_kved(record_fields['ACTIVITY_KINDS'][0], code)
+                if len(record_fields['SIGNERS'][0]):
+                    self.add_signers(record_fields['SIGNERS'][0], code)
+                if record_fields['TERMINATION_STARTED_INFO/OP_DATE']:
                     self.add_termination_started(record, code)
-                if record.xpath('BANKRUPTCY_READJUSTMENT_INFO/OP_DATE'):
+                if record_fields['BANKRUPTCY_READJUSTMENT_INFO/OP_DATE']:
                     self.add_bancruptcy_readjustment(record, code)
-                if len(record.xpath('PREDECESSORS')[0]):
-                    self.add_company_to_predecessors(record.xpath('PREDECESSORS')[0], code)
-                if len(record.xpath('ASSIGNEES')[0]):
-                    self.add_assignees(record.xpath('ASSIGNEES')[0], code)
-                if len(record.xpath('EXCHANGE_DATA')[0]):
-                    self.add_exchange_data(record.xpath('EXCHANGE_DATA')[0], code)
-                self.add_founders(record.xpath('FOUNDERS')[0] if len(record.xpath('FOUNDERS')[0]) else [],
-                                  record.xpath('BENEFICIARIES')[0] if len(record.xpath('BENEFICIARIES')[0]) else [],
+                if len(record_fields['PREDECESSORS'][0]):
+                    self.add_company_to_predecessors(record_fields['PREDECESSORS'][0], code)
+                if len(record_fields['ASSIGNEES'][0]):
+                    self.add_assignees(record_fields['ASSIGNEES'][0], code)
+                if len(record_fields['EXCHANGE_DATA'][0]):
+                    self.add_exchange_data(record_fields['EXCHANGE_DATA'][0], code)
+                self.add_founders(record_fields['FOUNDERS'][0] if len(record_fields['FOUNDERS'][0]) else [],
+                                  record_fields['BENEFICIARIES'][0] if len(record_fields['BENEFICIARIES'][0]) else [],
                                   code)
-                if len(record.xpath('BRANCHES')[0]):
-                    self.add_branches(record.xpath('BRANCHES')[0], code)
+                if len(record_fields['BRANCHES'][0]):
+                    self.add_branches(record_fields['BRANCHES'][0], code)
                 self.time_it('save companies\t')
             else:
                 self.uptodated_companies.append(company.id)
@@ -1001,32 +1072,32 @@ class UkrCompanyFullConverter(CompanyConverter):
                     update_fields.append('deleted_at')
                 if update_fields:
                     update_fields.append('updated_at')
-                    company.save(update_fields=update_fields)
+                    self.update_manager.add(company, update_fields)
                 self.time_it('update companies\t')
                 self.update_company_detail(founding_document_number, executive_power, superior_management,
                                            managing_paper, terminated_info, termination_cancel_info, vp_dates, company)
                 self.time_it('update company details\t')
                 self.update_founders(
-                    record.xpath('FOUNDERS')[0] if len(record.xpath('FOUNDERS')[0]) else [],
-                    record.xpath('BENEFICIARIES')[0] if len(record.xpath('BENEFICIARIES')[0]) else [],
+                    record_fields['FOUNDERS'][0] if len(record_fields['FOUNDERS'][0]) else [],
+                    record_fields['BENEFICIARIES'][0] if len(record_fields['BENEFICIARIES'][0]) else [],
                     company
                 )
                 self.time_it('update founders\t\t')
-                self.update_company_to_kved(record.xpath('ACTIVITY_KINDS')[0], company)
+                self.update_company_to_kved(record_fields['ACTIVITY_KINDS'][0], company)
                 self.time_it('update kveds\t\t')
-                self.update_signers(record.xpath('SIGNERS')[0], company)
+                self.update_signers(record_fields['SIGNERS'][0], company)
                 self.time_it('update signers\t\t')
                 self.update_termination_started(record, company)
                 self.time_it('update termination\t')
                 self.update_bancruptcy_readjustment(record, company)
                 self.time_it('update bancruptcy\t')
-                self.update_company_to_predecessors(record.xpath('PREDECESSORS')[0], company)
+                self.update_company_to_predecessors(record_fields['PREDECESSORS'][0], company)
                 self.time_it('update predecessors\t')
-                self.update_assignees(record.xpath('ASSIGNEES')[0], company)
+                self.update_assignees(record_fields['ASSIGNEES'][0], company)
                 self.time_it('update assignes\t\t')
-                self.update_exchange_data(record.xpath('EXCHANGE_DATA')[0], company)
+                self.update_exchange_data(record_fields['EXCHANGE_DATA'][0], company)
                 self.time_it('update exchange data\t')
-                self.update_branches(record.xpath('BRANCHES')[0], company)
+                self.update_branches(record_fields['BRANCHES'][0], company)
 
         if len(self.bulk_manager.queues['business_register.Company']):
             self.bulk_manager.commit(Company)
@@ -1047,6 +1118,7 @@ class UkrCompanyFullConverter(CompanyConverter):
                 for founder in self.founder_to_dict[code]:
                     founder.company = company
                     self.bulk_manager.add(founder)
+                    self.changed_founders_edrpou.add(founder.edrpou)
             if code in self.signer_to_dict:
                 for signer in self.signer_to_dict[code]:
                     signer.company = company
@@ -1085,6 +1157,9 @@ class UkrCompanyFullConverter(CompanyConverter):
         self.bulk_manager.commit(CompanyDetail)
         self.bulk_manager.commit(TerminationStarted)
         self.bulk_manager.commit(BancruptcyReadjustment)
+        for model in (Company, Founder, Signer, Assignee, CompanyToPredecessor, ExchangeDataCompany,
+                      CompanyToKved, CompanyDetail, TerminationStarted, BancruptcyReadjustment):
+            self.update_manager.commit(model)
         self.bulk_manager.queues['business_register.Company'] = []
         self.bulk_manager.queues['business_register.Founder'] = []
         self.bulk_manager.queues['business_register.Signer'] = []
@@ -1105,47 +1180,67 @@ class UkrCompanyFullConverter(CompanyConverter):
         self.assignee_to_dict = {}
         self.exchange_data_to_dict = {}
         self.branches_to_dict = {}
+        self.stored_companies_dict = {}
+        self.stored_branches_dict = {}
+        self.stored_related_dict = {}
         self.time_it('save others\t\t')
 
+    def get_chunk_state(self):
+        state = {
+            'uptodated_companies': self.uptodated_companies,
+            'invalid_data_counter': self.invalid_data_counter,
+            'changed_founders_edrpou': list(self.changed_founders_edrpou),
+        }
+        self.uptodated_companies = []
+        self.invalid_data_counter = 0
+        self.changed_founders_edrpou = set()
+        return state
+
+    def merge_chunk_state(self, state):
+        self.uptodated_companies.extend(state['uptodated_companies'])
+        self.invalid_data_counter += state['invalid_data_counter']
+        self.changed_founders_edrpou.update(state.get('changed_founders_edrpou', ()))
+
+    def get_delta_queryset(self):
+        return Company.objects.filter(source=self.source)
+
+    def get_record_code(self, record):
+        record_fields = RecordChildren(record)
+        edrpou = record_fields['EDRPOU'][0].text
+        name = record_fields['NAME'][0].text
+        if edrpou and name:
+            return name.lower() + edrpou
+
+    def mark_unchanged(self, object_ids):
+        self.uptodated_companies.extend(object_ids)
+
     def delete_outdated(self):
-        outdated_companies = list(set(self.already_stored_companies) - set(self.uptodated_companies))
-        for company_id in outdated_companies:
-            if CompanyDetail.objects.filter(company_id=company_id).first():
-                CompanyDetail.objects.filter(company_id=company_id).first().soft_delete()
-            if CompanyToPredecessor.objects.filter(company_id=company_id).first():
-                CompanyToPredecessor.objects.filter(company_id=company_id).first().soft_delete()
-            if TerminationStarted.objects.filter(company_id=company_id).first():
-                TerminationStarted.objects.filter(company_id=company_id).first().soft_delete()
-            if BancruptcyReadjustment.objects.filter(company_id=company_id).first():
-                BancruptcyReadjustment.objects.filter(company_id=company_id).first().soft_delete()
-            outdated_founders = list(Founder.objects.filter(company_id=company_id))
-            if len(outdated_founders):
-                for founder in outdated_founders:
-                    founder.soft_delete()
-            outdated_signers = list(Signer.objects.filter(company_id=company_id))
-            if len(outdated_signers):
-                for signer in outdated_signers:
-                    signer.soft_delete()
-            outdated_assignees = list(Assignee.objects.filter(company_id=company_id))
-            if len(outdated_assignees):
-                for assignee in outdated_assignees:
-                    assignee.soft_delete()
-            outdated_exchange_data = list(ExchangeDataCompany.objects.filter(company_id=company_id))
-            if len(outdated_exchange_data):
-                for exchange_data in outdated_exchange_data:
-                    exchange_data.soft_delete()
-            outdated_company_to_kved = list(CompanyToKved.objects.filter(company_id=company_id))
-            if len(outdated_company_to_kved):
-                for company_to_kved in outdated_company_to_kved:
-                    company_to_kved.soft_delete()
-            Company.objects.get(id=company_id).soft_delete()
+        with transaction.atomic():
+            with self.ids_table(self.uptodated_companies, 'uptodated_ids') as uptodated_ids:
+                outdated_companies = list(Company.objects.filter(
+                    source=Company.UKRAINE_REGISTER, id__lte=self.last_stored_company_id,
+                ).exclude(id__in=uptodated_ids).values_list('id', flat=True))
+            if outdated_companies:
+                with self.ids_table(outdated_companies) as outdated_ids:
+                    self.changed_founders_edrpou.update(Founder.objects.filter(
+                        company_id__in=outdated_ids
+                    ).values_list('edrpou', flat=True).distinct())
+                    for model in (CompanyDetail, CompanyToPredecessor, TerminationStarted, BancruptcyReadjustment,
+                                  Founder, Signer, Assignee, ExchangeDataCompany, CompanyToKved):
+                        model.objects.filter(company_id__in=outdated_ids).soft_delete()
+                    Company.objects.filter(id__in=outdated_ids).soft_delete()
+            # refreshed once in the main process, as worker processes save founders of the same EDRPOU
+            # concurrently and each upsert would overwrite the rows with its own snapshot
+            FoundedCompanies.refresh(self.changed_founders_edrpou)
+        self.changed_founders_edrpou = set()
 
 
 class UkrCompanyFullDownloader(Downloader):
     reg_name = 'business_ukr_company'
     zip_required_file_sign = 'ufop_full'
     unzip_required_file_sign = 'EDR_UO_FULL'
-    unzip_after_download = True
+    # the XML is read straight from the archive
+    unzip_after_download = False
     source_dataset_url = settings.BUSINESS_UKR_COMPANY_SOURCE_PACKAGE
     LOCAL_FILE_NAME = settings.LOCAL_FILE_NAME_UO_FULL
 
@@ -1170,28 +1265,45 @@ class UkrCompanyFullDownloader(Downloader):
         self.report_init()
         self.report.long_time_converter = True
         self.report.save()
-        self.download()
-
-        self.LOCAL_FILE_NAME = self.file_name
-        self.remove_unreadable_characters()
+        checkpoint = Checkpoint(self.reg_name)
+        if checkpoint.file_name and os.path.isfile(self.file_path):
+            # the previous update was interrupted, continue it with already downloaded archive
+            logger.info(f'{self.reg_name}: continue from checkpoint at index = {checkpoint.index}')
+        else:
+            checkpoint.remove()
+            self.download()
+        self.LOCAL_FILE_NAME = self.get_zipped_file_name()
 
         self.report.update_start = timezone.now()
         self.report.save()
 
         logger.info(f'{self.reg_name}: process() with {self.file_path} started ...')
         ukr_company_full = UkrCompanyFullConverter()
-        ukr_company_full.LOCAL_FILE_NAME = self.file_name
+        ukr_company_full.SOURCE_ZIP_FILE = self.file_path
+        ukr_company_full.LOCAL_FILE_NAME = self.LOCAL_FILE_NAME
+        ukr_company_full.CLEAN_SOURCE = True
+        ukr_company_full.PROCESSES = settings.PROCESSES_UO_FULL
+        ukr_company_full.PIPELINED = settings.PIPELINED_UO_FULL
+        ukr_company_full.DELTA = settings.DELTA_UO_FULL
 
         sleep(5)
-        if ukr_company_full.process():
+        update_result = ukr_company_full.process_parallel(checkpoint=checkpoint)
+        self.report.converter_stats = ukr_company_full.pipeline_stats
+        if update_result:
             logger.info(f'{self.reg_name}: process() with {self.file_path} finished successfully.')
             self.report.update_status = True
             self.report.update_finish = timezone.now()
 
             sleep(5)
+            self.update_search_vectors(Company)
+            PepFounderMatcher().refresh(
+                Founder.include_deleted_objects.filter(updated_at__gte=self.report.update_start)
+            )
             self.vacuum_analyze(table_list=['business_register_company', ])
 
             self.remove_file()
+            ReportMetrics('company').refresh()
+            bump_data_versions('company')
             endpoints_cache_warm_up(endpoints=[
                 '/api/company/',
                 '/api/company/uk/',
@@ -3,14 +3,16 @@ from time import sleep
 import re
 import requests
 from django.utils import timezone
+from data_ocean.cache import bump_data_versions
 from data_ocean.downloader import Downloader
 from business_register.converter.business_converter import BusinessConverter
 from business_register.models.fop_models import (ExchangeDataFop, Fop,
                                                  FopToKved)
 from django.conf import settings
-from data_ocean.converter import BulkCreateManager
+from data_ocean.converter import BulkCreateManager, RecordChildren
 from data_ocean.models import Register
 from data_ocean.utils import get_first_word, cut_first_word, format_date_to_yymmdd
+from stats.report_metrics import ReportMetrics
 from stats.tasks import endpoints_cache_warm_up
 
 logger = logging.getLogger(__name__)
@@ -34,20 +36,21 @@ class FopConverter(BusinessConverter):
     def add_fop_kveds_to_dict(self, fop_kveds_from_record, code):
         all_fop_foptokveds = []
         for activity in fop_kveds_from_record:
-            code_info = activity.xpath('CODE')
+            activity_fields = RecordChildren(activity)
+            code_info = activity_fields['CODE']
             if not code_info:
                 continue
             kved_code = code_info[0].text
             if not kved_code:
                 continue
-            name_info = activity.xpath('NAME')
+            name_info = activity_fields['NAME']
             if not name_info:
                 continue
             kved_name = name_info[0].text
             if not kved_name:
                 continue
             kved = self.get_kved_from_DB(kved_code, kved_name)
-            is_primary = activity.xpath('PRIMARY')[0].text == "так"
+            is_primary = activity_fields['PRIMARY'][0].text == "так"
             fop_to_kved = FopToKved(kved=kved, primary_kved=is_primary)
             all_fop_foptokveds.append(fop_to_kved)
         if len(all_fop_foptokveds):
@@ -57,20 +60,21 @@ class FopConverter(BusinessConverter):
     def update_fop_kveds(self, fop_kveds_from_record, fop):
         already_stored_foptokveds = list(FopToKved.objects.filter(fop=fop))
         for activity in fop_kveds_from_record:
-            code_info = activity.xpath('CODE')
+            activity_fields = RecordChildren(activity)
+            code_info = activity_fields['CODE']
             if not code_info:
                 continue
             kved_code = code_info[0].text
             if not kved_code:
                 continue
-            name_info = activity.xpath('NAME')
+            name_info = activity_fields['NAME']
             if not name_info:
                 continue
             kved_name = name_info[0].text
             if not kved_name:
                 continue
             kved = self.get_kved_from_DB(kved_code, kved_name)
-            is_primary = activity.xpath('PRIMARY')[0].text == "так"
+            is_primary = activity_fields['PRIMARY'][0].text == "так"
             alredy_stored = False
             if len(already_stored_foptokveds):
                 for stored_foptokved in already_stored_foptokveds:
@@ -90,27 +94,28 @@ class FopConverter(BusinessConverter):
                 outdated_foptokved.soft_delete()
 
     def extract_exchange_data(self, answer):
-        authority_info = answer.xpath('AUTHORITY_NAME')
+        answer_fields = RecordChildren(answer)
+        authority_info = answer_fields['AUTHORITY_NAME']
         authority = None
         if authority_info and authority_info[0].text:
             authority = self.save_or_get_authority(authority_info[0].text)
-        taxpayer_info = answer.xpath('TAX_PAYER_TYPE')
+        taxpayer_info = answer_fields['TAX_PAYER_TYPE']
         taxpayer_type = None
         if taxpayer_info and taxpayer_info[0].text:
             taxpayer_type = self.save_or_get_taxpayer_type(taxpayer_info[0].text)
-        start_date_info = answer.xpath('START_DATE')
+        start_date_info = answer_fields['START_DATE']
         start_date = None
         if start_date_info and start_date_info[0].text:
             start_date = format_date_to_yymmdd(start_date_info[0].text)
-        start_number_info = answer.xpath('START_NUM')
+        start_number_info = answer_fields['START_NUM']
         start_number = None
         if start_number_info:
             start_number = start_number_info[0].text
-        end_date_info = answer.xpath('END_DATE')
+        end_date_info = answer_fields['END_DATE']
         end_date = None
         if end_date_info and end_date_info[0].text:
             end_date = format_date_to_yymmdd(end_date_info[0].text)
-        end_number_info = answer.xpath('END_NUM')
+        end_number_info = answer_fields['END_NUM']
         end_number = None
         if end_number_info and end_number_info[0].text:
             end_number = end_number_info[0].text
@@ -158,7 +163,8 @@ class FopConverter(BusinessConverter):
 
     def save_detailed_fop_to_db(self, records):
         for record in records:
-            fullname = record.xpath('NAME')[0].text
+            record_fields = RecordChildren(record)
+            fullname = record_fields['NAME'][0].text
             if not fullname:
                 logger.warning(f'ФОП без прізвища: {record}')
                 self.report.invalid_data += 1
@@ -168,31 +174,31 @@ class FopConverter(BusinessConverter):
                 continue
             if fullname:
                 fullname = fullname.lower()
-            address = record.xpath('ADDRESS')[0].text
+            address = record_fields['ADDRESS'][0].text
             if not address:
                 address = 'EMPTY'
             code = fullname + address
-            status = self.save_or_get_status(record.xpath('STAN')[0].text)
-            registration_text = record.xpath('REGISTRATION')[0].text
+            status = self.save_or_get_status(record_fields['STAN'][0].text)
+            registration_text = record_fields['REGISTRATION'][0].text
             # first getting date, then registration info if REGISTRATION.text exists
             registration_date = None
             registration_info = None
             if registration_text:
                 registration_date = format_date_to_yymmdd(get_first_word(registration_text))
                 registration_info = cut_first_word(registration_text)
-            estate_manager = record.xpath('ESTATE_MANAGER')[0].text
-            termination_text = record.xpath('TERMINATED_INFO')[0].text
+            estate_manager = record_fields['ESTATE_MANAGER'][0].text
+            termination_text = record_fields['TERMINATED_INFO'][0].text
             termination_date = None
             terminated_info = None
             if termination_text:
                 termination_date = format_date_to_yymmdd(get_first_word(termination_text))
                 terminated_info = cut_first_word(termination_text)
-            termination_cancel_info = record.xpath('TERMINATION_CANCEL_INFO')[0].text
-            contact_info = record.xpath('CONTACTS')[0].text
-            vp_dates = record.xpath('VP_DATES')[0].text
-            authority = self.save_or_get_authority(record.xpath('CURRENT_AUTHORITY')[0].text)
-            fop_kveds = record.xpath('ACTIVITY_KINDS')[0]
-            exchange_data = record.xpath('EXCHANGE_DATA')[0]
+            termination_cancel_info = record_fields['TERMINATION_CANCEL_INFO'][0].text
+            contact_info = record_fields['CONTACTS'][0].text
+            vp_dates = record_fields['VP_DATES'][0].text
+            authority = self.save_or_get_authority(record_fields['CURRENT_AUTHORITY'][0].text)
+            fop_kveds = record_fields['ACTIVITY_KINDS'][0]
+            exchange_data = record_fields['EXCHANGE_DATA'][0]
             fop = Fop.objects.filter(code=code).first()
             if not fop:
                 fop = Fop(
@@ -298,7 +304,8 @@ class FopConverter(BusinessConverter):
 
     def save_to_db(self, records):
         for record in records:
-            fullname = record.xpath('FIO')[0].text
+            record_fields = RecordChildren(record)
+            fullname = record_fields['FIO'][0].text
             if not fullname:
                 logger.warning(f'ФОП без прізвища: {record}')
                 self.report.invalid_data += 1
@@ -307,11 +314,11 @@ class FopConverter(BusinessConverter):
                 logger.warning(f'ФОП із задовгим прізвищем: {record}')
                 continue
             fullname = fullname.lower()
-            address = record.xpath('ADDRESS')[0].text
+            address = record_fields['ADDRESS'][0].text
             if not address:
                 address = 'EMPTY'
             code = fullname + address
-            status = self.save_or_get_status(record.xpath('STAN')[0].text)
+            status = self.save_or_get_status(record_fields['STAN'][0].text)
             fop = Fop.objects.filter(code=code).first()
             if not fop:
                 fop = Fop.objects.create(
@@ -328,7 +335,7 @@ class FopConverter(BusinessConverter):
                 if len(update_fields):
                     update_fields.append('updated_at')
                     fop.save(update_fields=update_fields)
-            kved_data = record.xpath('KVED')[0].text
+            kved_data = record_fields['KVED'][0].text
             if kved_data and ' ' in kved_data:
                 kved = self.extract_kved(kved_data)
                 self.save_or_update_kved(kved, fop)
@@ -382,9 +389,12 @@ class FopDownloader(Downloader):
         self.report.save()
 
         sleep(5)
+        self.update_search_vectors(Fop)
         self.vacuum_analyze(table_list=['business_register_fop', ])
 
         self.remove_file()
+        ReportMetrics('fop').refresh()
+        bump_data_versions('fop')
         endpoints_cache_warm_up(endpoints=['/api/fop/'])
         new_total_records = Fop.objects.count()
         self.update_register_field(settings.FOP_REGISTER_LIST, 'total_records', new_total_records)
@@ -1,15 +1,20 @@
 import logging
+import os
 import requests
 from time import sleep
 
 from django.conf import settings
+from django.db import transaction
 from django.utils import timezone
 
 from business_register.converter.business_converter import BusinessConverter
 from business_register.models.fop_models import (ExchangeDataFop, Fop, FopToKved)
-from data_ocean.converter import BulkCreateManager
+from data_ocean.cache import bump_data_versions
+from data_ocean.converter import BulkCreateManager, RecordChildren
 from data_ocean.downloader import Downloader
+from data_ocean.savepoint import Checkpoint
 from data_ocean.utils import get_first_word, cut_first_word, format_date_to_yymmdd, to_lower_string_if_exists
+from stats.report_metrics import ReportMetrics
 from stats.tasks import endpoints_cache_warm_up
 
 logger = logging.getLogger(__name__)
@@ -28,26 +33,28 @@ class FopFullConverter(BusinessConverter):
         self.bulk_manager = BulkCreateManager()
         self.new_fops_foptokveds = {}
         self.new_fops_exchange_data = {}
+        self.uptodated_fops = []
         super().__init__()
 
     def add_fop_kveds_to_dict(self, fop_kveds_from_record, code):
         all_fop_foptokveds = []
         for activity in fop_kveds_from_record:
-            code_info = activity.xpath('CODE')
+            activity_fields = RecordChildren(activity)
+            code_info = activity_fields['CODE']
             if not code_info:
                 continue
             kved_code = code_info[0].text
             if not kved_code:
                 continue
-            name_info = activity.xpath('NAME')
+            name_info = activity_fields['NAME']
             if not name_info:
                 continue
             kved_name = name_info[0].text
             if not kved_name:
                 continue
             kved = self.get_kved_from_DB(kved_code, kved_name)
-            if activity.xpath('PRIMARY'):
-                is_primary = activity.xpath('PRIMARY')[0].text == "так"
+            if activity_fields['PRIMARY']:
+                is_primary = activity_fields['PRIMARY'][0].text == "так"
             else:
                 is_primary = False
             fop_to_kved = FopToKved(kved=kved, primary_kved=is_primary)
@@ -60,21 +67,22 @@ class FopFullConverter(BusinessConverter):
         already_stored_foptokveds = list(FopToKved.objects.filter(fop_id=fop.id))
         self.time_it('trying get kveds\t')
         for activity in fop_kveds_from_record:
-            code_info = activity.xpath('CODE')
+            activity_fields = RecordChildren(activity)
+            code_info = activity_fields['CODE']
             if not code_info:
                 continue
             kved_code = code_info[0].text
             if not kved_code:
                 continue
-            name_info = activity.xpath('NAME')
+            name_info = activity_fields['NAME']
             if not name_info:
                 continue
             kved_name = name_info[0].text
             if not kved_name:
                 continue
             kved = self.get_kved_from_DB(kved_code, kved_name)
-            if activity.xpath('PRIMARY'):
-                is_primary = activity.xpath('PRIMARY')[0].text == "так"
+            if activity_fields['PRIMARY']:
+                is_primary = activity_fields['PRIMARY'][0].text == "так"
             else:
                 is_primary = False
             alredy_stored = False
@@ -97,27 +105,28 @@ class FopFullConverter(BusinessConverter):
                 outdated_foptokved.soft_delete()
 
     def extract_exchange_data(self, answer):
-        authority_info = answer.xpath('AUTHORITY_NAME')
+        answer_fields = RecordChildren(answer)
+        authority_info = answer_fields['AUTHORITY_NAME']
         authority = None
         if authority_info and authority_info[0].text:
             authority = self.save_or_get_authority(authority_info[0].text)
-        taxpayer_info = answer.xpath('TAX_PAYER_TYPE')
+        taxpayer_info = answer_fields['TAX_PAYER_TYPE']
         taxpayer_type = None
         if taxpayer_info and taxpayer_info[0].text:
             taxpayer_type = self.save_or_get_taxpayer_type(taxpayer_info[0].text)
-        start_date_info = answer.xpath('START_DATE')
+        start_date_info = answer_fields['START_DATE']
         start_date = None
         if start_date_info and start_date_info[0].text:
             start_date = format_date_to_yymmdd(start_date_info[0].text)
-        start_number_info = answer.xpath('START_NUM')
+        start_number_info = answer_fields['START_NUM']
         start_number = None
         if start_number_info:
             start_number = start_number_info[0].text
-        end_date_info = answer.xpath('END_DATE')
+        end_date_info = answer_fields['END_DATE']
         end_date = None
         if end_date_info and end_date_info[0].text:
             end_date = format_date_to_yymmdd(end_date_info[0].text)
-        end_number_info = answer.xpath('END_NUM')
+        end_number_info = answer_fields['END_NUM']
         end_number = None
         if end_number_info and end_number_info[0].text:
             end_number = end_number_info[0].text
@@ -174,7 +183,8 @@ class FopFullConverter(BusinessConverter):
 
     def save_to_db(self, records):
         for record in records:
-            fullname = record.xpath('NAME')[0].text
+            record_fields = RecordChildren(record)
+            fullname = record_fields['NAME'][0].text
             if not fullname:
                 logger.warning(f'ФОП без прізвища: {record}')
                 # self.report.invalid_data += 1
@@ -184,12 +194,12 @@ class FopFullConverter(BusinessConverter):
                 continue
             if fullname:
                 fullname = fullname.lower()
-            address = record.xpath('ADDRESS')[0].text
+            address = record_fields['ADDRESS'][0].text
             if not address:
                 address = 'EMPTY'
             code = fullname + address
-            status = self.save_or_get_status(record.xpath('STAN')[0].text)
-            registration_text = record.xpath('REGISTRATION')[0].text
+            status = self.save_or_get_status(record_fields['STAN'][0].text)
+            registration_text = record_fields['REGISTRATION'][0].text
             # first getting date, then registration info if REGISTRATION.text exists
             registration_date = None
             registration_date_second = None
@@ -202,22 +212,22 @@ class FopFullConverter(BusinessConverter):
                 registration_date_second = format_date_to_yymmdd(registration_text[1])
                 if 3 <= len(registration_text):
                     registration_number = registration_text[2]
-            estate_manager = record.xpath('ESTATE_MANAGER')[0].text
-            termination_text = record.xpath('TERMINATED_INFO')[0].text
+            estate_manager = record_fields['ESTATE_MANAGER'][0].text
+            termination_text = record_fields['TERMINATED_INFO'][0].text
             termination_date = None
             terminated_info = None
             if termination_text:
                 termination_date = format_date_to_yymmdd(get_first_word(termination_text))
                 terminated_info = cut_first_word(termination_text)
-            termination_cancel_info = record.xpath('TERMINATION_CANCEL_INFO')[0].text
-            contact_info = record.xpath('CONTACTS')[0].text
-            vp_dates = record.xpath('VP_DATES')[0].text
-            if record.xpath('CURRENT_AUTHORITY')[0].text:
-                authority = self.save_or_get_authority(record.xpath('CURRENT_AUTHORITY')[0].text)
+            termination_cancel_info = record_fields['TERMINATION_CANCEL_INFO'][0].text
+            contact_info = record_fields['CONTACTS'][0].text
+            vp_dates = record_fields['VP_DATES'][0].text
+            if record_fields['CURRENT_AUTHORITY'][0].text:
+                authority = self.save_or_get_authority(record_fields['CURRENT_AUTHORITY'][0].text)
             else:
                 authority = None
-            fop_kveds = record.xpath('ACTIVITY_KINDS')[0]
-            exchange_data = record.xpath('EXCHANGE_DATA')[0]
+            fop_kveds = record_fields['ACTIVITY_KINDS'][0]
+            exchange_data = record_fields['EXCHANGE_DATA'][0]
             self.time_it('getting data from record')
             fop = Fop.objects.filter(code=code).first()
             self.time_it('trying get fops\t\t')
@@ -246,6 +256,7 @@ class FopFullConverter(BusinessConverter):
                     self.add_fop_exchange_data_to_dict(exchange_data, code)
                 self.time_it('save fops\t\t')
             else:
+                self.uptodated_fops.append(fop.id)
                 # TODO: make a decision: our algorithm when Fop changes fullname or address?
                 update_fields = []
                 if fop.status_id != status.id:
@@ -297,6 +308,7 @@ class FopFullConverter(BusinessConverter):
                 self.time_it('update exchange_data\t')
         if len(self.bulk_manager.queues['business_register.Fop']):
             self.bulk_manager.commit(Fop)
+            self.uptodated_fops.extend(fop.id for fop in self.bulk_manager.queues['business_register.Fop'])
         for fop in self.bulk_manager.queues['business_register.Fop']:
             if fop.code not in self.new_fops_foptokveds:
                 continue
@@ -322,6 +334,45 @@ class FopFullConverter(BusinessConverter):
         self.bulk_manager.queues['business_register.ExchangeDataFop'] = []
         self.time_it('save others\t\t')
 
+    def get_chunk_state(self):
+        state = {'uptodated_fops': self.uptodated_fops}
+        self.uptodated_fops = []
+        return state
+
+    def merge_chunk_state(self, state):
+        self.uptodated_fops.extend(state['uptodated_fops'])
+
+    def get_delta_queryset(self):
+        return Fop.objects.all()
+
+    def get_record_code(self, record):
+        record_fields = RecordChildren(record)
+        fullname = record_fields['NAME'][0].text
+        if not fullname or len(fullname) > 100:
+            return None
+        return fullname.lower() + (record_fields['ADDRESS'][0].text or 'EMPTY')
+
+    def mark_unchanged(self, object_ids):
+        self.uptodated_fops.extend(object_ids)
+
+    def delete_outdated(self):
+        # the register has millions of FOPs, so the ids met in the file are stored instead of outdated ones
+        if not self.uptodated_fops:
+            return
+        # it is called only after the whole file was read, a short file is stopped by the share of outdated FOPs
+        with transaction.atomic(), self.ids_table(self.uptodated_fops) as uptodated_ids:
+            outdated_count = Fop.objects.exclude(id__in=uptodated_ids).count()
+            total_count = Fop.objects.count()
+            if outdated_count > total_count * settings.FOP_OUTDATED_MAX_SHARE:
+                logger.error(f'{outdated_count} of {total_count} FOPs are not in the file, '
+                             f'more than FOP_OUTDATED_MAX_SHARE = {settings.FOP_OUTDATED_MAX_SHARE}. '
+                             f'Outdated FOPs are not deleted.')
+                return
+            outdated_fops = Fop.objects.exclude(id__in=uptodated_ids).values('id')
+            FopToKved.objects.filter(fop_id__in=outdated_fops).soft_delete()
+            ExchangeDataFop.objects.filter(fop_id__in=outdated_fops).soft_delete()
+            Fop.objects.exclude(id__in=uptodated_ids).soft_delete()
+
     print("For storing run FopFullConverter().process()")
 
 
@@ -330,7 +381,8 @@ class FopFullDownloader(Downloader):
     reg_name = 'business_fop'
     zip_required_file_sign = 'ufop_full'
     unzip_required_file_sign = 'EDR_FOP_FULL'
-    unzip_after_download = True
+    # the XML is read straight from the archive
+    unzip_after_download = False
     source_dataset_url = settings.BUSINESS_FOP_SOURCE_PACKAGE
     LOCAL_FILE_NAME = settings.LOCAL_FILE_NAME_FOP_FULL
 
@@ -355,27 +407,41 @@ class FopFullDownloader(Downloader):
         self.report_init()
         self.report.long_time_converter = True
         self.report.save()
-        self.download()
-
-        self.LOCAL_FILE_NAME = self.file_name
-        self.remove_unreadable_characters()
+        checkpoint = Checkpoint(self.reg_name)
+        if checkpoint.file_name and os.path.isfile(self.file_path):
+            # the previous update was interrupted, continue it with already downloaded archive
+            logger.info(f'{self.reg_name}: continue from checkpoint at index = {checkpoint.index}')
+        else:
+            checkpoint.remove()
+            self.download()
+        self.LOCAL_FILE_NAME = self.get_zipped_file_name()
 
         self.report.update_start = timezone.now()
         self.report.save()
 
         logger.info(f'{self.reg_name}: process() with {self.file_path} started ...')
         fop_full = FopFullConverter()
-        fop_full.LOCAL_FILE_NAME = self.file_name
+        fop_full.SOURCE_ZIP_FILE = self.file_path
+        fop_full.LOCAL_FILE_NAME = self.LOCAL_FILE_NAME
+        fop_full.CLEAN_SOURCE = True
+        fop_full.PROCESSES = settings.PROCESSES_FOP_FULL
+        fop_full.PIPELINED = settings.PIPELINED_FOP_FULL
+        fop_full.DELTA = settings.DELTA_FOP_FULL
 
         sleep(5)
-        if fop_full.process():
+        update_result = fop_full.process_parallel(checkpoint=checkpoint)
+        self.report.converter_stats = fop_full.pipeline_stats
+        if update_result:
             logger.info(f'{self.reg_name}: process() with {self.file_path} finished successfully.')
             self.report.update_status = True
 
             sleep(5)
+            self.update_search_vectors(Fop)
             self.vacuum_analyze(table_list=['business_register_fop', ])
 
             self.remove_file()
+            ReportMetrics('fop').refresh()
+            bump_data_versions('fop')
             endpoints_cache_warm_up(endpoints=['/api/fop/'])
             new_total_records = Fop.objects.count()
             self.update_register_field(settings.FOP_REGISTER_LIST, 'total_records', new_total_records)
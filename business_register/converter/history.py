@@ -4,7 +4,30 @@ from django.conf import settings
 
 from business_register.constants import HistoryTypes
 from business_register.models.company_models import Company, CompanyDetail, Signer, Founder
-from data_ocean.converter import Converter
+from data_ocean.converter import BulkCopyManager, Converter, RecordChildren
+
+
+def get_companies(edrpous):
+    """
+    Returns {edrpou: company} for the given EDRPOU in one query, the company with the lowest id
+    is taken for a duplicated EDRPOU as Company.objects.filter(edrpou=edrpou).first() does.
+    """
+    companies = {}
+    for company in Company.objects.filter(
+            edrpou__in={edrpou for edrpou in edrpous if edrpou}
+    ).only('id', 'edrpou', 'name').order_by('-id'):
+        companies[company.edrpou] = company
+    return companies
+
+
+def get_first_related_ids(model, companies):
+    """Returns {company id: id of the first related object of the model} in one query."""
+    related_ids = {}
+    for company_id, object_id in model.objects.filter(
+            company_id__in=[company.id for company in companies]
+    ).order_by('-id').values_list('company_id', 'id'):
+        related_ids[company_id] = object_id
+    return related_ids
 
 
 class AddressHistorical(Converter):
@@ -14,29 +37,29 @@ class AddressHistorical(Converter):
     RECORD_TAG = 'DATA_RECORD'
     HistoricalCompany = apps.get_model('business_register', 'HistoricalCompany')
     tables = [HistoricalCompany]
-    create_queues = []
+    bulk_manager = BulkCopyManager()
 
     def save_to_db(self, records):
-        for record in records:
-            company = self.HistoricalCompany()
-            company.edrpou = record.xpath('EDRPOU')[0].text
-            address = record.xpath('Address')[0].text
-            company.address = " ".join(address.split())[:1000]
-            company.history_date = datetime.datetime.strptime(
-                record.xpath('DATE')[0].text,
-                "%Y/%m/%d %H:%M:%S"
-            ).strftime("%Y-%m-%d %H:%M:%S")
-            try:
-                company_exists = Company.objects.filter(edrpou=company.edrpou).first()
-                company.id = company_exists.id
-            except AttributeError:
-                company.id = 0  # for changed records that can't be assigned to existing company
-            company.history_type = HistoryTypes.UPDATE
-            company.code = record.xpath('NAME')[0].text + record.xpath('EDRPOU')[0].text
-            company.created_at = datetime.datetime.now()
-            self.create_queues.append(company)
-        self.HistoricalCompany.objects.bulk_create(self.create_queues)
-        self.create_queues = []
+        records_fields = [RecordChildren(record) for record in records]
+        companies = get_companies(record_fields['EDRPOU'][0].text for record_fields in records_fields)
+        for record_fields in records_fields:
+            edrpou = record_fields['EDRPOU'][0].text
+            address = record_fields['Address'][0].text
+            company_exists = companies.get(edrpou)
+            self.bulk_manager.add(self.HistoricalCompany, {
+                # 0 for changed records that can't be assigned to existing company
+                'id': company_exists.id if company_exists else 0,
+                'edrpou': edrpou,
+                'address': " ".join(address.split())[:1000],
+                'history_date': datetime.datetime.strptime(
+                    record_fields['DATE'][0].text,
+                    "%Y/%m/%d %H:%M:%S"
+                ).strftime("%Y-%m-%d %H:%M:%S"),
+                'history_type': HistoryTypes.UPDATE,
+                'code': record_fields['NAME'][0].text + edrpou,
+                'created_at': datetime.datetime.now(),
+            })
+        self.bulk_manager.commit(self.HistoricalCompany)
 
 
 class SignerHistorical(Converter):
@@ -46,63 +69,74 @@ class SignerHistorical(Converter):
     RECORD_TAG = 'DATA_RECORD'
     HistoricalSigner = apps.get_model('business_register', 'HistoricalSigner')
     tables = [HistoricalSigner]
-    create_queues = []
+    bulk_manager = BulkCopyManager()
 
     def save_to_db(self, records):
-        for record in records:
-            signer = self.HistoricalSigner()
-            edrpou = record.xpath('EDRPOU')[0].text
-            signer.name = record.xpath('SIGNER')[0].text
-            signer.history_date = datetime.datetime.strptime(
-                record.xpath('DATE')[0].text,
-                "%Y/%m/%d %H:%M:%S"
-            ).strftime("%Y-%m-%d %H:%M:%S")
-            try:
-                company_exists = Company.objects.filter(edrpou=edrpou).first()
-                signer.company = company_exists
-            except AttributeError:
+        records_fields = [RecordChildren(record) for record in records]
+        companies = get_companies(record_fields['EDRPOU'][0].text for record_fields in records_fields)
+        signer_ids = get_first_related_ids(Signer, companies.values())
+        for record_fields in records_fields:
+            edrpou = record_fields['EDRPOU'][0].text
+            company_exists = companies.get(edrpou)
+            if not company_exists:
                 continue
-            try:
-                signer.id = Signer.objects.filter(company=company_exists).first().id
-            except AttributeError:
-                signer.id = 0  # for changed records that can't be assigned to existing company
-            signer.history_type = HistoryTypes.UPDATE
-            signer.code = record.xpath('NAME')[0].text + record.xpath('EDRPOU')[0].text
-            signer.created_at = datetime.datetime.now()
-            self.create_queues.append(signer)
-        self.HistoricalSigner.objects.bulk_create(self.create_queues)
-        self.create_queues = []
+            signer_id = signer_ids.get(company_exists.id)
+            self.bulk_manager.add(self.HistoricalSigner, {
+                # 0 for changed records that can't be assigned to existing company
+                'id': signer_id or 0,
+                'name': record_fields['SIGNER'][0].text,
+                'company': company_exists,
+                'history_date': datetime.datetime.strptime(
+                    record_fields['DATE'][0].text,
+                    "%Y/%m/%d %H:%M:%S"
+                ).strftime("%Y-%m-%d %H:%M:%S"),
+                'history_type': HistoryTypes.UPDATE,
+                'code': record_fields['NAME'][0].text + edrpou,
+                'created_at': datetime.datetime.now(),
+            })
+        self.bulk_manager.commit(self.HistoricalSigner)
 
 
 class FounderHistorical(Converter):
     LOCAL_FILE_NAME = settings.LOCAL_FILE_NAME_UO_FOUNDER
     LOCAL_FOLDER = settings.LOCAL_FOLDER
-    CHUNK_SIZE = 1
+    CHUNK_SIZE = 2000
     RECORD_TAG = 'DATA_RECORD'
     HistoricalFounder = apps.get_model('business_register', 'HistoricalFounder')
     DATE_OF_DATA_PURCHASE = '2019-06-07 15:25:48.000000'
     tables = []
+    bulk_manager = BulkCopyManager()
+
+    @staticmethod
+    def get_company_edrpou(record_fields):
+        company_edrpou_info = record_fields['EDRPOU']
+        if company_edrpou_info:
+            return company_edrpou_info[0].text
 
     def save_to_db(self, records):
-        for record in records:
-            company_edrpou_info = record.xpath('EDRPOU')
-            if not company_edrpou_info:
-                return
-            company_edrpou = company_edrpou_info[0].text
+        records_fields = [RecordChildren(record) for record in records]
+        companies = get_companies(self.get_company_edrpou(record_fields) for record_fields in records_fields)
+        founder_ids = {}
+        for company_id, name, founder_id in Founder.objects.filter(
+                company_id__in=[company.id for company in companies.values()]
+        ).order_by('-id').values_list('company_id', 'name', 'id'):
+            founder_ids[company_id, name] = founder_id
+        for record_fields in records_fields:
+            company_edrpou = self.get_company_edrpou(record_fields)
             if not company_edrpou:
-                return
-            company = Company.objects.filter(edrpou=company_edrpou).first()
+                continue
+            company = companies.get(company_edrpou)
             if not company:
-                return
-            founder_name_info = record.xpath('FOUNDER_NAME')
+                continue
+            founder_name_info = record_fields['FOUNDER_NAME']
             if not founder_name_info:
-                return
+                continue
             founder_name = founder_name_info[0].text
             if not founder_name:
-                return
+                continue
             founder_name = founder_name.lower()
             founder_code = None
-            founder_code_info = record.xpath('FOUNDER_CODE')
+            founder_code_info = record_fields['FOUNDER_CODE']
             if founder_code_info:
                 founder_code = founder_code_info[0].text
             founder_edrpou = None
@@ -110,23 +144,23 @@ class FounderHistorical(Converter):
             if founder_code and len(founder_code) == 8:
                 founder_edrpou = founder_code
             founder_equity = None
-            founder_equity_info = record.xpath('FOUNDER_EQUITY')
+            founder_equity_info = record_fields['FOUNDER_EQUITY']
             if founder_equity_info:
                 founder_equity = founder_equity_info[0].text
             if founder_equity:
                 founder_equity = float(founder_equity.replace(',', '.'))
-            existed_founder = Founder.objects.filter(company=company, name=founder_name)
-            if existed_founder:
-                founder_id = existed_founder.id
-            else:
-                founder_id = 0
-            history_date = self.DATE_OF_DATA_PURCHASE
-            self.HistoricalFounder.objects.create(id=founder_id,
-                                                  created_at=datetime.datetime.now(),
-                                                  history_date=history_date,
-                                                  history_type=HistoryTypes.UPDATE,
-                                                  name=founder_name, edrpou=founder_edrpou,
-                                                  equity=founder_equity, company=company)
+            self.bulk_manager.add(self.HistoricalFounder, {
+                # 0 for changed records that can't be assigned to existing founder
+                'id': founder_ids.get((company.id, founder_name), 0),
+                'created_at': datetime.datetime.now(),
+                'history_date': self.DATE_OF_DATA_PURCHASE,
+                'history_type': HistoryTypes.UPDATE,
+                'name': founder_name,
+                'edrpou': founder_edrpou,
+                'equity': founder_equity,
+                'company': company,
+            })
+        self.bulk_manager.commit(self.HistoricalFounder)
 
 
 class NameHistorical(Converter):
@@ -136,28 +170,28 @@ class NameHistorical(Converter):
     RECORD_TAG = 'DATA_RECORD'
     HistoricalCompany = apps.get_model('business_register', 'HistoricalCompany')
     tables = [HistoricalCompany]
-    create_queues = []
+    bulk_manager = BulkCopyManager()
 
     def save_to_db(self, records):
-        for record in records:
-            company = self.HistoricalCompany()
-            company.edrpou = record.xpath('EDRPOU')[0].text
-            company.name = record.xpath('NAME')[0].text
-            company.history_date = datetime.datetime.strptime(
-                record.xpath('DATE')[0].text,
-                "%Y/%m/%d %H:%M:%S"
-            ).strftime("%Y-%m-%d %H:%M:%S")
-            try:
-                company_exists = Company.objects.filter(edrpou=company.edrpou).first()
-                company.id = company_exists.id
-            except AttributeError:
-                company.id = 0  # for changed records that can't be assigned to existing company
-            company.history_type = HistoryTypes.UPDATE
-            company.code = record.xpath('NAME')[0].text + record.xpath('EDRPOU')[0].text
-            company.created_at = datetime.datetime.now()
-            self.create_queues.append(company)
-        self.HistoricalCompany.objects.bulk_create(self.create_queues)
-        self.create_queues = []
+        records_fields = [RecordChildren(record) for record in records]
+        companies = get_companies(record_fields['EDRPOU'][0].text for record_fields in records_fields)
+        for record_fields in records_fields:
+            edrpou = record_fields['EDRPOU'][0].text
+            company_exists = companies.get(edrpou)
+            self.bulk_manager.add(self.HistoricalCompany, {
+                # 0 for changed records that can't be assigned to existing company
+                'id': company_exists.id if company_exists else 0,
+                'edrpou': edrpou,
+                'name': record_fields['NAME'][0].text,
+                'history_date': datetime.datetime.strptime(
+                    record_fields['DATE'][0].text,
+                    "%Y/%m/%d %H:%M:%S"
+                ).strftime("%Y-%m-%d %H:%M:%S"),
+                'history_type': HistoryTypes.UPDATE,
+                'code': record_fields['NAME'][0].text + edrpou,
+                'created_at': datetime.datetime.now(),
+            })
+        self.bulk_manager.commit(self.HistoricalCompany)
 
 
 class ShortNameHistorical(Converter):
@@ -167,33 +201,33 @@ class ShortNameHistorical(Converter):
     RECORD_TAG = 'DATA_RECORD'
     HistoricalCompany = apps.get_model('business_register', 'HistoricalCompany')
     tables = [HistoricalCompany]
-    create_queues = []
+    bulk_manager = BulkCopyManager()
 
     def save_to_db(self, records):
-        for record in records:
-            company = self.HistoricalCompany()
-            company.edrpou = record.xpath('EDRPOU')[0].text
-            if len(record.xpath('SHORT_NAME')) > 0:
-                company.short_name = record.xpath('SHORT_NAME')[0].text
+        records_fields = [RecordChildren(record) for record in records]
+        companies = get_companies(record_fields['EDRPOU'][0].text for record_fields in records_fields)
+        for record_fields in records_fields:
+            edrpou = record_fields['EDRPOU'][0].text
+            if len(record_fields['SHORT_NAME']) > 0:
+                short_name = record_fields['SHORT_NAME'][0].text
             else:
-                company.short_name = ''
-            company.history_date = datetime.datetime.strptime(
-                record.xpath('DATE')[0].text,
-                "%Y/%m/%d %H:%M:%S"
-            ).strftime("%Y-%m-%d %H:%M:%S")
-            name = ''
-            try:
-                company_exists = Company.objects.filter(edrpou=company.edrpou).first()
-                company.id = company_exists.id
-                name = company_exists.name
-            except AttributeError:
-                company.id = 0  # for changed records that can't be assigned to existing company
-            company.history_type = HistoryTypes.UPDATE
-            company.code = name + record.xpath('EDRPOU')[0].text
-            company.created_at = datetime.datetime.now()
-            self.create_queues.append(company)
-        self.HistoricalCompany.objects.bulk_create(self.create_queues)
-        self.create_queues = []
+                short_name = ''
+            company_exists = companies.get(edrpou)
+            name = company_exists.name if company_exists else ''
+            self.bulk_manager.add(self.HistoricalCompany, {
+                # 0 for changed records that can't be assigned to existing company
+                'id': company_exists.id if company_exists else 0,
+                'edrpou': edrpou,
+                'short_name': short_name,
+                'history_date': datetime.datetime.strptime(
+                    record_fields['DATE'][0].text,
+                    "%Y/%m/%d %H:%M:%S"
+                ).strftime("%Y-%m-%d %H:%M:%S"),
+                'history_type': HistoryTypes.UPDATE,
+                'code': name + edrpou,
+                'created_at': datetime.datetime.now(),
+            })
+        self.bulk_manager.commit(self.HistoricalCompany)
 
 
 class CapitalHistorical(Converter):
@@ -203,35 +237,36 @@ class CapitalHistorical(Converter):
     RECORD_TAG = 'DATA_RECORD'
     HistoricalCompanyDetail = apps.get_model('business_register', 'HistoricalCompanyDetail')
     tables = [HistoricalCompanyDetail]
-    create_queues = []
+    bulk_manager = BulkCopyManager()
 
     def save_to_db(self, records):
-        for record in records:
-            company_detail = self.HistoricalCompanyDetail()
-            edrpou = record.xpath('EDRPOU')[0].text
-            if len(record.xpath('AUTHORIZED_CAPITAL')) > 0:
-                company_detail.authorized_capital = record.xpath('AUTHORIZED_CAPITAL')[0].text
+        records_fields = [RecordChildren(record) for record in records]
+        companies = get_companies(record_fields['EDRPOU'][0].text for record_fields in records_fields)
+        company_detail_ids = get_first_related_ids(CompanyDetail, companies.values())
+        for record_fields in records_fields:
+            edrpou = record_fields['EDRPOU'][0].text
+            if len(record_fields['AUTHORIZED_CAPITAL']) > 0:
+                authorized_capital = record_fields['AUTHORIZED_CAPITAL'][0].text
             else:
-                company_detail.authorized_capital = ''
-            company_detail.history_date = datetime.datetime.strptime(
-                record.xpath('DATE')[0].text,
-                "%Y/%m/%d %H:%M:%S"
-            ).strftime("%Y-%m-%d %H:%M:%S")
-            try:
-                company_exists = Company.objects.filter(edrpou=edrpou).first()
-                company_detail.company = company_exists
-            except AttributeError:
+                authorized_capital = ''
+            company_exists = companies.get(edrpou)
+            if not company_exists:
                 continue
-            try:
-                company_detail.id = CompanyDetail.objects.filter(company=company_exists).first().id
-            except AttributeError:
-                company_detail.id = 0  # for changed records that can't be assigned
-            company_detail.history_type = HistoryTypes.UPDATE
-            company_detail.code = record.xpath('NAME')[0].text + record.xpath('EDRPOU')[0].text
-            company_detail.created_at = datetime.datetime.now()
-            self.create_queues.append(company_detail)
-        self.HistoricalCompanyDetail.objects.bulk_create(self.create_queues)
-        self.create_queues = []
+            company_detail_id = company_detail_ids.get(company_exists.id)
+            self.bulk_manager.add(self.HistoricalCompanyDetail, {
+                # 0 for changed records that can't be assigned
+                'id': company_detail_id or 0,
+                'authorized_capital': authorized_capital,
+                'company': company_exists,
+                'history_date': datetime.datetime.strptime(
+                    record_fields['DATE'][0].text,
+                    "%Y/%m/%d %H:%M:%S"
+                ).strftime("%Y-%m-%d %H:%M:%S"),
+                'history_type': HistoryTypes.UPDATE,
+                'code': record_fields['NAME'][0].text + edrpou,
+                'created_at': datetime.datetime.now(),
+            })
+        self.bulk_manager.commit(self.HistoricalCompanyDetail)
 
 
 class BranchHistorical(Converter):
@@ -241,35 +276,33 @@ class BranchHistorical(Converter):
     RECORD_TAG = 'DATA_RECORD'
     HistoricalCompany = apps.get_model('business_register', 'HistoricalCompany')
     tables = [HistoricalCompany]
-    create_queues = []
+    bulk_manager = BulkCopyManager()
 
     def save_to_db(self, records):
-        for record in records:
-            branch = self.HistoricalCompany()
-            # branch.edrpou = record.xpath('')[0].text
-            branch.name = record.xpath('BRANCH_NAME')[0].text
-            if len(record.xpath('BRANCH_CODE')) > 0:
-                branch.short_name = record.xpath('BRANCH_CODE')[0].text
+        records_fields = [RecordChildren(record) for record in records]
+        companies = get_companies(record_fields['EDRPOU'][0].text for record_fields in records_fields)
+        for record_fields in records_fields:
+            name = record_fields['BRANCH_NAME'][0].text
+            if len(record_fields['BRANCH_CODE']) > 0:
+                short_name = record_fields['BRANCH_CODE'][0].text
             else:
-                branch.short_name = ''
-            branch.history_date = datetime.datetime.strptime(
-                record.xpath('DATE')[0].text,
-                "%Y/%m/%d %H:%M:%S"
-            ).strftime("%Y-%m-%d %H:%M:%S")
-            try:
-                company_exists = Company.objects.filter(
-                    edrpou=record.xpath('EDRPOU')[0].text).first()
-                branch.id = company_exists.id
-                branch.parent = company_exists
-            except AttributeError:
-                branch.id = 0  # for changed records that can't be assigned to existing company
-            branch.history_type = HistoryTypes.UPDATE
-            branch.code = record.xpath('BRANCH_NAME')[0].text + \
-                          branch.short_name
-            branch.created_at = datetime.datetime.now()
-            self.create_queues.append(branch)
-        self.HistoricalCompany.objects.bulk_create(self.create_queues)
-        self.create_queues = []
+                short_name = ''
+            company_exists = companies.get(record_fields['EDRPOU'][0].text)
+            self.bulk_manager.add(self.HistoricalCompany, {
+                # 0 for changed records that can't be assigned to existing company
+                'id': company_exists.id if company_exists else 0,
+                'parent': company_exists,
+                'name': name,
+                'short_name': short_name,
+                'history_date': datetime.datetime.strptime(
+                    record_fields['DATE'][0].text,
+                    "%Y/%m/%d %H:%M:%S"
+                ).strftime("%Y-%m-%d %H:%M:%S"),
+                'history_type': HistoryTypes.UPDATE,
+                'code': name + short_name,
+                'created_at': datetime.datetime.now(),
+            })
+        self.bulk_manager.commit(self.HistoricalCompany)
 
 
 class InfoHistorical(Converter):
@@ -279,48 +312,48 @@ class InfoHistorical(Converter):
     RECORD_TAG = 'DATA_RECORD'
     HistoricalCompany = apps.get_model('business_register', 'HistoricalCompany')
     tables = [HistoricalCompany]
-    create_queues = []
+    bulk_manager = BulkCopyManager()
 
     def save_to_db(self, records):
-        for record in records:
-            company = self.HistoricalCompany()
-            company.edrpou = record.xpath('EDRPOU')[0].text
-            if len(record.xpath('PHONE_1')) > 0:
-                phone_1 = record.xpath('PHONE_1')[0].text
+        records_fields = [RecordChildren(record) for record in records]
+        companies = get_companies(record_fields['EDRPOU'][0].text for record_fields in records_fields)
+        for record_fields in records_fields:
+            edrpou = record_fields['EDRPOU'][0].text
+            if len(record_fields['PHONE_1']) > 0:
+                phone_1 = record_fields['PHONE_1'][0].text
             else:
                 phone_1 = ''
-            if len(record.xpath('PHONE_2')) > 0:
-                phone_2 = record.xpath('PHONE_2')[0].text
+            if len(record_fields['PHONE_2']) > 0:
+                phone_2 = record_fields['PHONE_2'][0].text
             else:
                 phone_2 = ''
-            if len(record.xpath('FAX')) > 0:
-                fax = record.xpath('FAX')[0].text
+            if len(record_fields['FAX']) > 0:
+                fax = record_fields['FAX'][0].text
             else:
                 fax = ''
-            if len(record.xpath('EMAIL')) > 0:
-                email = record.xpath('EMAIL')[0].text
+            if len(record_fields['EMAIL']) > 0:
+                email = record_fields['EMAIL'][0].text
             else:
                 email = ''
-            if len(record.xpath('WWW')) > 0:
-                www = record.xpath('WWW')[0].text
+            if len(record_fields['WWW']) > 0:
+                www = record_fields['WWW'][0].text
             else:
                 www = ''
-            company.contact_info = (
-                f'phone_1: {phone_1}; phone_2: {phone_2}; '
-                f'fax: {fax}; email: {email}; www: {www}'
-            )
-            company.history_date = datetime.datetime.strptime(
-                record.xpath('DATE')[0].text,
-                "%Y/%m/%d %H:%M:%S"
-            ).strftime("%Y-%m-%d %H:%M:%S")
-            try:
-                company_exists = Company.objects.filter(edrpou=company.edrpou).first()
-                company.id = company_exists.id
-            except AttributeError:
-                company.id = 0  # for changed records that can't be assigned to existing company
-            company.history_type = HistoryTypes.UPDATE
-            company.code = record.xpath('NAME')[0].text + record.xpath('EDRPOU')[0].text
-            company.created_at = datetime.datetime.now()
-            self.create_queues.append(company)
-        self.HistoricalCompany.objects.bulk_create(self.create_queues)
-        self.create_queues = []
+            company_exists = companies.get(edrpou)
+            self.bulk_manager.add(self.HistoricalCompany, {
+                # 0 for changed records that can't be assigned to existing company
+                'id': company_exists.id if company_exists else 0,
+                'edrpou': edrpou,
+                'contact_info': (
+                    f'phone_1: {phone_1}; phone_2: {phone_2}; '
+                    f'fax: {fax}; email: {email}; www: {www}'
+                ),
+                'history_date': datetime.datetime.strptime(
+                    record_fields['DATE'][0].text,
+                    "%Y/%m/%d %H:%M:%S"
+                ).strftime("%Y-%m-%d %H:%M:%S"),
+                'history_type': HistoryTypes.UPDATE,
+                'code': record_fields['NAME'][0].text + edrpou,
+                'created_at': datetime.datetime.now(),
+            })
+        self.bulk_manager.commit(self.HistoricalCompany)
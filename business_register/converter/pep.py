@@ -8,8 +8,10 @@ from django.utils import timezone
 from requests.auth import HTTPBasicAuth
 
 from business_register.converter.business_converter import BusinessConverter
+from business_register.converter.pep_founder_matcher import PepFounderMatcher
 from business_register.models.company_models import Company
 from business_register.models.pep_models import Pep, RelatedPersonsLink, CompanyLinkWithPep
+from data_ocean.cache import bump_data_versions
 from data_ocean.converter import Converter
 from data_ocean.downloader import Downloader
 from data_ocean.utils import to_lower_string_if_exists
@@ -827,7 +829,10 @@ class PepDownloader(Downloader):
         self.report.update_finish = timezone.now()
         self.report.save()
 
+        self.update_search_vectors(Pep)
+        PepFounderMatcher().refresh()
         self.vacuum_analyze(table_list=['business_register_pep', ])
+        bump_data_versions('pep')
         endpoints_cache_warm_up(endpoints=['/api/pep/'])
         self.report.update_status = True
         peps_total_records = Pep.objects.all().count()
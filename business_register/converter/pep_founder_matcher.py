@@ -0,0 +1,75 @@
+import logging
+import re
+from collections import defaultdict
+
+from django.db import transaction
+from django.utils import timezone
+
+from business_register.models.company_models import Founder
+from business_register.models.pep_models import Pep, PepFounderMatch
+
+logger = logging.getLogger(__name__)
+logger.setLevel(logging.INFO)
+
+
+class PepFounderMatcher:
+    """
+    Finds founders whose name contains the full name "last first middle" of a PEP and stores
+    them in PepFounderMatch for Pep.check_companies. Names of PEPs are normalized and indexed
+    by their tokens once, so each founder name is matched by a few dict lookups
+    instead of a substring scan of the Founder table per PEP.
+    """
+    batch_size = 10000
+    APOSTROPHES = str.maketrans({'’': "'", 'ʼ': "'", '`': "'", '‘': "'"})
+    TOKEN = re.compile(r"[\w'-]+")
+
+    def __init__(self):
+        self.peps_by_name = defaultdict(list)
+        for pep_id, last_name, first_name, middle_name in Pep.objects.values_list(
+                'id', 'last_name', 'first_name', 'middle_name'):
+            name = self.tokenize(' '.join([x for x in [last_name, first_name, middle_name] if x]))
+            if name:
+                self.peps_by_name[name].append(pep_id)
+        self.name_lengths = sorted({len(name) for name in self.peps_by_name})
+
+    @classmethod
+    def tokenize(cls, name):
+        return tuple(cls.TOKEN.findall(name.lower().translate(cls.APOSTROPHES)))
+
+    def match(self, name):
+        """Returns ids of PEPs whose full name is a sequence of words in the name."""
+        tokens = self.tokenize(name)
+        pep_ids = set()
+        for length in self.name_lengths:
+            for start in range(len(tokens) - length + 1):
+                pep_ids.update(self.peps_by_name.get(tokens[start:start + length], ()))
+        return pep_ids
+
+    def refresh(self, founders=None):
+        """
+        Rebuilds matches of all founders or only of the given founders queryset,
+        e.g. of the ones changed by an import. Matches of soft-deleted founders are removed.
+        """
+        start_time = timezone.now()
+        with transaction.atomic():
+            if founders is None:
+                PepFounderMatch.objects.all().delete()
+                founders_to_match = Founder.objects.all()
+            else:
+                founder_ids = founders.values('id')
+                PepFounderMatch.objects.filter(founder_id__in=founder_ids).delete()
+                founders_to_match = Founder.objects.filter(id__in=founder_ids)
+
+            matches = []
+            matches_count = 0
+            for founder_id, company_id, name in founders_to_match.values_list(
+                    'id', 'company_id', 'name').iterator(chunk_size=self.batch_size):
+                for pep_id in self.match(name):
+                    matches.append(PepFounderMatch(pep_id=pep_id, founder_id=founder_id, company_id=company_id))
+                if len(matches) >= self.batch_size:
+                    PepFounderMatch.objects.bulk_create(matches)
+                    matches_count += len(matches)
+                    matches = []
+            PepFounderMatch.objects.bulk_create(matches)
+            matches_count += len(matches)
+        logger.info(f'PEP founder matches: {matches_count} stored at {timezone.now() - start_time}')
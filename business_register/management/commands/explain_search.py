@@ -0,0 +1,38 @@
+import re
+
+from django.core.management.base import BaseCommand
+from django.test import RequestFactory
+from rest_framework.request import Request
+
+from business_register.views.company_views import CompanyViewSet
+from business_register.views.fop_views import FopViewSet
+from business_register.views.pep_views import PepViewSet
+from data_ocean.filters import RankedSearchFilter
+
+
+class Command(BaseCommand):
+    help = 'Run EXPLAIN ANALYZE for the ?search= query of the company, FOP or PEP list ' \
+           'and check that the search indexes are used instead of a sequential scan'
+    viewsets = {'company': CompanyViewSet, 'fop': FopViewSet, 'pep': PepViewSet}
+
+    def add_arguments(self, parser):
+        parser.add_argument('register', choices=list(self.viewsets))
+        parser.add_argument('search')
+        parser.add_argument('--page-size', type=int, default=10)
+
+    def handle(self, *args, **options):
+        viewset = self.viewsets[options['register']]
+        request = Request(RequestFactory().get('/', {'search': options['search']}))
+        view = viewset(request=request, format_kwarg=None, action='list')
+        search_backend = next(
+            backend for backend in viewset.filter_backends if issubclass(backend, RankedSearchFilter)
+        )()
+        queryset = search_backend.filter_queryset(request, view.get_queryset(), view)
+        plan = queryset[:options['page_size']].explain(analyze=True, buffers=True)
+        self.stdout.write(plan)
+
+        table = queryset.model._meta.db_table
+        if re.search(rf'Seq Scan on {table}\b', plan):
+            self.stdout.write(self.style.WARNING(f'{table} is read by a sequential scan'))
+        else:
+            self.stdout.write(self.style.SUCCESS(f'{table} is read by indexes'))
@@ -0,0 +1,10 @@
+from django.core.management.base import BaseCommand
+
+from business_register.converter.pep_founder_matcher import PepFounderMatcher
+
+
+class Command(BaseCommand):
+    help = 'Rebuild matches of PEP names with founders used by Pep.check_companies'
+
+    def handle(self, *args, **options):
+        PepFounderMatcher().refresh()
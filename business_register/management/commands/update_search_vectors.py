@@ -0,0 +1,22 @@
+from django.core.management.base import BaseCommand
+
+from business_register.models.company_models import Company
+from business_register.models.fop_models import Fop
+from business_register.models.pep_models import Pep
+
+
+class Command(BaseCommand):
+    help = 'Fill search vectors of companies, FOPs and PEPs, by default only the ones not indexed yet'
+    models = {'company': Company, 'fop': Fop, 'pep': Pep}
+
+    def add_arguments(self, parser):
+        parser.add_argument('registers', nargs='*', choices=list(self.models), default=list(self.models))
+        parser.add_argument('--all', action='store_true', help='Rebuild search vectors of all records')
+
+    def handle(self, *args, **options):
+        for register in options['registers']:
+            queryset = self.models[register].objects.all()
+            if not options['all']:
+                queryset = queryset.filter(search_vector__isnull=True)
+            updated = queryset.update_search_vectors()
+            self.stdout.write(f'{register}: {updated} search vectors updated')
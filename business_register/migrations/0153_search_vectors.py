@@ -0,0 +1,70 @@
+# Generated by Django 3.1.12 on 2021-07-15 10:24
+
+import django.contrib.postgres.indexes
+import django.contrib.postgres.search
+from django.contrib.postgres.operations import TrigramExtension
+from django.db import migrations
+
+# icontains lookups are made as UPPER(<column>::text) LIKE UPPER(%s), so the trigram
+# indexes are built on the same expression to be used by them
+TRIGRAM_INDEXES = (
+    ('business_register_company', 'name'),
+    ('business_register_company', 'edrpou'),
+    ('business_register_company', 'address'),
+    ('business_register_fop', 'fullname'),
+    ('business_register_fop', 'address'),
+    ('business_register_pep', 'fullname'),
+    ('business_register_pep', 'fullname_transcriptions_eng'),
+    ('business_register_pep', 'pep_type'),
+    ('business_register_pep', 'last_job_title'),
+    ('business_register_pep', 'last_employer'),
+)
+
+
+def trigram_index_name(table, column):
+    return f"{table.replace('business_register_', '')}_{column}_trgm_idx"
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('business_register', '0152_auto_20210713_1956'),
+    ]
+
+    operations = [
+        TrigramExtension(),
+        migrations.AddField(
+            model_name='company',
+            name='search_vector',
+            field=django.contrib.postgres.search.SearchVectorField(editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name='fop',
+            name='search_vector',
+            field=django.contrib.postgres.search.SearchVectorField(editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name='pep',
+            name='search_vector',
+            field=django.contrib.postgres.search.SearchVectorField(editable=False, null=True),
+        ),
+        migrations.AddIndex(
+            model_name='company',
+            index=django.contrib.postgres.indexes.GinIndex(fields=['search_vector'], name='company_search_vector_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='fop',
+            index=django.contrib.postgres.indexes.GinIndex(fields=['search_vector'], name='fop_search_vector_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='pep',
+            index=django.contrib.postgres.indexes.GinIndex(fields=['search_vector'], name='pep_search_vector_idx'),
+        ),
+    ] + [
+        migrations.RunSQL(
+            sql=f'CREATE INDEX {trigram_index_name(table, column)} ON {table} '
+                f'USING gin (UPPER({column}::text) gin_trgm_ops);',
+            reverse_sql=f'DROP INDEX {trigram_index_name(table, column)};',
+        )
+        for table, column in TRIGRAM_INDEXES
+    ]
@@ -0,0 +1,33 @@
+# Generated by Django 3.1.12 on 2021-07-16 09:12
+
+import django.contrib.postgres.fields
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('business_register', '0153_search_vectors'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='FoundedCompanies',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('edrpou', models.CharField(max_length=9, unique=True, verbose_name='number')),
+                ('company_ids', django.contrib.postgres.fields.ArrayField(base_field=models.PositiveIntegerField(), size=None)),
+                ('count', models.PositiveIntegerField()),
+            ],
+            options={
+                'verbose_name': 'founded companies',
+            },
+        ),
+        migrations.RunSQL(
+            sql='INSERT INTO business_register_foundedcompanies (edrpou, company_ids, count) '
+                'SELECT edrpou, array_agg(DISTINCT company_id ORDER BY company_id), count(DISTINCT company_id) '
+                'FROM business_register_founder '
+                "WHERE deleted_at IS NULL AND edrpou IS NOT NULL AND edrpou != '' GROUP BY edrpou;",
+            reverse_sql=migrations.RunSQL.noop,
+        ),
+    ]
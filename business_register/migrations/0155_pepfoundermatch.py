@@ -0,0 +1,36 @@
+# Generated by Django 3.1.12 on 2021-07-16 14:37
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+def match_peps_with_founders(apps, schema):
+    # matches are refreshed by imports, existing founders are matched once here
+    from business_register.converter.pep_founder_matcher import PepFounderMatcher
+    PepFounderMatcher().refresh()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('business_register', '0154_foundedcompanies'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PepFounderMatch',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('company', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='pep_founder_matches', to='business_register.company')),
+                ('founder', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='pep_matches', to='business_register.founder')),
+                ('pep', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='founder_matches', to='business_register.pep')),
+            ],
+            options={
+                'unique_together': {('pep', 'founder')},
+            },
+        ),
+        migrations.RunPython(
+            code=match_peps_with_founders,
+            reverse_code=migrations.RunPython.noop,
+        ),
+    ]
@@ -1,4 +1,10 @@
-from django.db import models
+from django.contrib.postgres.fields import ArrayField
+from django.contrib.postgres.indexes import GinIndex
+from django.contrib.postgres.search import SearchVectorField
+from django.db import connection, models
+from django.db.models import OuterRef, Subquery
+from django.db.models.expressions import RawSQL
+from django.db.models.functions import Coalesce
 from django.utils.translation import gettext_lazy as _
 from simple_history.models import HistoricalRecords
 
@@ -90,23 +96,36 @@ class Company(DataOceanModel):  # constraint for not null in both name & short_n
     source = models.CharField(_('source'), max_length=5, choices=SOURCES, null=True,
                               blank=True, default=None, db_index=True, help_text='Source')
     code = models.CharField(_('our code'), max_length=510, db_index=True, help_text='Our code')
-    history = HistoricalRecords()
+    search_vector = SearchVectorField(null=True, editable=False)
+    history = HistoricalRecords(excluded_fields=['search_vector'])
+
+    # fields of the search_vector with their weights, see data_ocean.filters.RankedSearchFilter
+    search_vector_fields = (('name', 'A'), ('edrpou', 'A'), ('address', 'B'))
 
     @property
     def founder_of(self):
         if not self.edrpou:
             return []
-        founder_of = Founder.objects.filter(edrpou=self.edrpou)
-        founded_companies = []
-        for founder in founder_of:
-            founded_companies.append(founder.company)
-        return founded_companies
+        founded_companies_ids = RawSQL(
+            f'SELECT unnest(company_ids) FROM {FoundedCompanies._meta.db_table} WHERE edrpou = %s',
+            [self.edrpou]
+        )
+        founded_companies_count = FoundedCompanies.objects.filter(edrpou=OuterRef('edrpou')).values('count')
+        return list(Company.include_deleted_objects.filter(
+            id__in=founded_companies_ids
+        ).select_related(
+            'company_type', 'status', 'country'
+        ).annotate(
+            founded_companies_count=Coalesce(Subquery(founded_companies_count), 0)
+        ).order_by('id'))
 
     @property
     def founder_of_count(self):
+        if hasattr(self, 'founded_companies_count'):
+            return self.founded_companies_count
         if not self.edrpou:
             return 0
-        return Founder.objects.filter(edrpou=self.edrpou).count()
+        return FoundedCompanies.objects.filter(edrpou=self.edrpou).values_list('count', flat=True).first() or 0
 
     @property
     def is_closed(self):
@@ -133,6 +152,9 @@ class Company(DataOceanModel):  # constraint for not null in both name & short_n
         index_together = [
             ('edrpou', 'source')
         ]
+        indexes = [
+            GinIndex(fields=['search_vector'], name='company_search_vector_idx'),
+        ]
 
 
 class Assignee(DataOceanModel):
@@ -246,6 +268,40 @@ class Founder(DataOceanModel):
         verbose_name = _('owner')
 
 
+class FoundedCompanies(models.Model):
+    """
+    Reverse ownership index: ids of the companies having a founder with the given EDRPOU.
+    Refreshed by the converters for the EDRPOU of changed founders, see refresh().
+    """
+    edrpou = models.CharField('number', max_length=9, unique=True)
+    company_ids = ArrayField(models.PositiveIntegerField())
+    count = models.PositiveIntegerField()
+
+    @classmethod
+    def refresh(cls, edrpous):
+        edrpous = [edrpou for edrpou in set(edrpous) if edrpou]
+        if not edrpous:
+            return
+        table = cls._meta.db_table
+        founder_table = Founder._meta.db_table
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f'INSERT INTO {table} (edrpou, company_ids, count) '
+                f'SELECT edrpou, array_agg(DISTINCT company_id ORDER BY company_id), count(DISTINCT company_id) '
+                f'FROM {founder_table} WHERE deleted_at IS NULL AND edrpou = ANY(%s) GROUP BY edrpou '
+                f'ON CONFLICT (edrpou) DO UPDATE SET company_ids = EXCLUDED.company_ids, count = EXCLUDED.count',
+                [edrpous]
+            )
+            cursor.execute(
+                f'DELETE FROM {table} WHERE edrpou = ANY(%s) AND NOT EXISTS ('
+                f'SELECT 1 FROM {founder_table} f WHERE f.deleted_at IS NULL AND f.edrpou = {table}.edrpou)',
+                [edrpous]
+            )
+
+    class Meta:
+        verbose_name = _('founded companies')
+
+
 class Predecessor(DataOceanModel):  # constraint for not null in both fields
     name = models.CharField('name', max_length=500, null=True, help_text='Predecessor name in Ukrainian')
     edrpou = models.CharField('number', max_length=405, null=True, help_text='EDRPOU number as string')
@@ -1,3 +1,5 @@
+from django.contrib.postgres.indexes import GinIndex
+from django.contrib.postgres.search import SearchVectorField
 from django.db import models
 from django.utils.translation import gettext_lazy as _
 from simple_history.models import HistoricalRecords
@@ -24,7 +26,10 @@ class Fop(DataOceanModel):
     authority = models.ForeignKey(Authority, on_delete=models.CASCADE,
                                   verbose_name=_('registration authority'), null=True, blank=True)
     code = models.CharField(_('our code'), max_length=675, db_index=True)
-    history = HistoricalRecords()
+    search_vector = SearchVectorField(null=True, editable=False)
+    history = HistoricalRecords(excluded_fields=['search_vector'])
+
+    search_vector_fields = (('fullname', 'A'), ('address', 'B'))
 
     def __str__(self):
         return self.fullname
@@ -33,6 +38,9 @@ class Fop(DataOceanModel):
         ordering = ['id']
         verbose_name = _('entrepreneur')
         verbose_name_plural = _('entrepreneurs')
+        indexes = [
+            GinIndex(fields=['search_vector'], name='fop_search_vector_idx'),
+        ]
 
 
 class FopToKved(DataOceanModel):
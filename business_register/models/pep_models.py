@@ -1,4 +1,6 @@
 from django.contrib.postgres.fields import ArrayField
+from django.contrib.postgres.indexes import GinIndex
+from django.contrib.postgres.search import SearchVectorField
 from django.db import models
 from django.utils.translation import gettext_lazy as _
 from simple_history.models import HistoricalRecords
@@ -140,22 +142,22 @@ class Pep(DataOceanModel):
         blank=True,
         default=list,
         help_text=_('id from the National agency on corruption prevention'))
-    history = HistoricalRecords(excluded_fields=['url', 'code'])
+    search_vector = SearchVectorField(null=True, editable=False)
+    history = HistoricalRecords(excluded_fields=['url', 'code', 'search_vector'])
+
+    search_vector_fields = (
+        ('fullname', 'A'), ('fullname_transcriptions_eng', 'A'),
+        ('last_employer', 'B'), ('last_job_title', 'C'), ('pep_type', 'D'),
+    )
 
     @property
     def check_companies(self):
-        pep_name = ' '.join([x for x in [self.last_name, self.first_name, self.middle_name] if x])
-        founders_with_pep_name = Founder.objects.filter(
-            name__contains=pep_name
-        ).select_related('company').distinct('company__edrpou')
-        if not len(founders_with_pep_name):
-            return []
-        possibly_founded_companies = []
-        related_companies_id = self.related_companies.values_list('company_id', flat=True)
-        for founder in founders_with_pep_name:
-            if founder.company_id not in related_companies_id:
-                possibly_founded_companies.append(founder.company)
-        return possibly_founded_companies
+        # companies having a founder with the PEP name, matched by PepFounderMatcher
+        return list(Company.include_deleted_objects.filter(
+            pep_founder_matches__pep=self
+        ).exclude(
+            id__in=self.related_companies.values('company_id')
+        ).order_by('edrpou', 'id').distinct('edrpou'))
 
     @property
     def pep_org_ua_link(self):
@@ -185,6 +187,7 @@ class Pep(DataOceanModel):
     class Meta:
         indexes = [
             models.Index(fields=['updated_at']),
+            GinIndex(fields=['search_vector'], name='pep_search_vector_idx'),
         ]
         verbose_name = _('politically exposed person')
         verbose_name_plural = _('politically exposed persons')
@@ -325,3 +328,13 @@ class CompanyLinkWithPep(DataOceanModel):
 
     def __str__(self):
         return f"connection of {self.company.name} with PEP {self.pep.fullname}"
+
+
+class PepFounderMatch(models.Model):
+    # founders with the full name of a PEP, see business_register.converter.pep_founder_matcher
+    pep = models.ForeignKey(Pep, on_delete=models.CASCADE, related_name='founder_matches')
+    founder = models.ForeignKey(Founder, on_delete=models.CASCADE, related_name='pep_matches')
+    company = models.ForeignKey(Company, on_delete=models.CASCADE, related_name='pep_founder_matches')
+
+    class Meta:
+        unique_together = [('pep', 'founder')]
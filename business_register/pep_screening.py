@@ -0,0 +1,123 @@
+import logging
+import re
+import sys
+import threading
+import unicodedata
+from itertools import combinations
+
+from django.utils import timezone
+
+from business_register.models.pep_models import Pep
+from data_ocean.cache import get_data_versions
+
+logger = logging.getLogger(__name__)
+logger.setLevel(logging.INFO)
+
+
+class PepNameIndex:
+    """
+    In-memory index of normalized PEP names for bulk screening. Each name variant - the full name,
+    the full name in English and every line of fullname_transcriptions_eng - is indexed by its
+    sorted words. The full names, built as "last first middle", are also indexed by the sorted
+    pair "last name first name", while transcriptions have other word orders and would pair
+    the first name with the patronymic. So a person is looked up without queries. The index
+    is loaded once per process and reloaded after PEP imports, see get().
+    """
+    FULL_MATCH_SCORE = 1.0
+    PAIR_MATCH_SCORE = 0.8
+    # the score of a candidate without the date of birth of the person or of the PEP is decreased by
+    UNKNOWN_DATE_OF_BIRTH_PENALTY = 0.1
+
+    APOSTROPHES = re.compile(r"['`’ʼ′ʹ‘]")
+    WORD = re.compile(r'\w+')
+
+    _instance = None
+    _lock = threading.Lock()
+
+    def __init__(self, version=None):
+        self.version = version
+        # pep id -> (fullname, date_of_birth, pep_type, is_pep)
+        self.peps = {}
+        self.names = {}
+        self.pairs = {}
+        start_time = timezone.now()
+        for pep_id, fullname, fullname_en, transcriptions, date_of_birth, pep_type, is_pep in (
+                Pep.objects.values_list(
+                    'id', 'fullname', 'fullname_en', 'fullname_transcriptions_eng',
+                    'date_of_birth', 'pep_type', 'is_pep',
+                ).iterator()):
+            self.peps[pep_id] = (fullname, date_of_birth, pep_type, is_pep)
+            for variant in (fullname, fullname_en):
+                words = self.normalize(variant or '')
+                if len(words) >= 2:
+                    self.add(self.pairs, self.key(words[:2]), pep_id)
+            for variant in {fullname, fullname_en, *(transcriptions or '').splitlines()}:
+                words = self.normalize(variant or '')
+                if len(words) >= 2:
+                    self.add(self.names, self.key(words), pep_id)
+        logger.info(f'PEP name index: {len(self.peps)} PEPs, {len(self.names)} names, '
+                    f'{len(self.pairs)} pairs loaded at {timezone.now() - start_time}')
+
+    @classmethod
+    def get(cls):
+        """Returns the index of the process, reloading it after the 'pep' data version is bumped by an import."""
+        version = get_data_versions(('pep',))['pep']
+        if cls._instance is None or cls._instance.version != version:
+            with cls._lock:
+                if cls._instance is None or cls._instance.version != version:
+                    cls._instance = cls(version)
+        return cls._instance
+
+    @classmethod
+    def normalize(cls, name):
+        """Returns the words of the name in lower case without apostrophes and diacritics."""
+        name = cls.APOSTROPHES.sub('', name.lower())
+        name = ''.join(char for char in unicodedata.normalize('NFKD', name) if not unicodedata.combining(char))
+        return cls.WORD.findall(name)
+
+    @staticmethod
+    def key(words):
+        return sys.intern(' '.join(sorted(words)))
+
+    @staticmethod
+    def add(index, key, pep_id):
+        pep_ids = index.setdefault(key, [])
+        if pep_id not in pep_ids:
+            pep_ids.append(pep_id)
+
+    @staticmethod
+    def is_same_date(date_of_birth, pep_date_of_birth):
+        # PEP dates can be partial, e.g. '1964' or '1964-02'
+        return date_of_birth.startswith(pep_date_of_birth) or pep_date_of_birth.startswith(date_of_birth)
+
+    def match(self, name, date_of_birth=None):
+        """
+        Returns candidates for the person ordered by score. The full name matches with any
+        word order, a name without the middle name or with extra words matches by a pair of words.
+        A candidate with a different date of birth is skipped.
+        """
+        words = self.normalize(name)
+        if len(words) < 2:
+            return []
+        scores = {pep_id: self.FULL_MATCH_SCORE for pep_id in self.names.get(self.key(words), ())}
+        for pair in combinations(words, 2):
+            for pep_id in self.pairs.get(self.key(pair), ()):
+                scores.setdefault(pep_id, self.PAIR_MATCH_SCORE)
+        candidates = []
+        for pep_id, score in scores.items():
+            fullname, pep_date_of_birth, pep_type, is_pep = self.peps[pep_id]
+            if date_of_birth and pep_date_of_birth:
+                if not self.is_same_date(date_of_birth, pep_date_of_birth):
+                    continue
+            else:
+                score -= self.UNKNOWN_DATE_OF_BIRTH_PENALTY
+            candidates.append({
+                'id': pep_id,
+                'fullname': fullname,
+                'date_of_birth': pep_date_of_birth,
+                'pep_type': pep_type,
+                'is_pep': is_pep,
+                'score': round(score, 2),
+            })
+        candidates.sort(key=lambda candidate: (-candidate['score'], candidate['id']))
+        return candidates
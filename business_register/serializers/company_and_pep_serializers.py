@@ -1,4 +1,8 @@
+import io
+from csv import DictReader
+
 from django.apps import apps
+from django.conf import settings
 from drf_dynamic_fields import DynamicFieldsMixin
 from drf_yasg.utils import swagger_serializer_method
 from rest_framework import serializers
@@ -21,19 +25,39 @@ HistoricalSigner = apps.get_model('business_register', 'HistoricalSigner')
 HistoricalTerminationStarted = apps.get_model('business_register', 'HistoricalTerminationStarted')
 
 
-def filter_with_parameter(obj, parameter, used_categories, model_related_name, serializer):
+PEP_RELATION_CATEGORIES = [
+    RelatedPersonsLink.FAMILY,
+    RelatedPersonsLink.BUSINESS,
+    RelatedPersonsLink.PERSONAL
+]
+COMPANY_RELATION_CATEGORIES = [
+    CompanyLinkWithPep.OWNER,
+    CompanyLinkWithPep.MANAGER
+]
+
+
+def get_categories(parameter, used_categories):
+    """Returns the categories given by the query parameter or None if all categories are requested."""
+    if not parameter:
+        return None
     if parameter == 'none':
         return []
-    if parameter:
-        categories = parameter.split(',')
-        for category in categories:
-            if category not in used_categories:
-                categories.remove(category)
-        queryset = getattr(obj, model_related_name).filter(
-            category__in=categories
-        )
-    else:
+    return [category for category in parameter.split(',') if category in used_categories]
+
+
+def filter_with_parameter(obj, parameter, used_categories, model_related_name, serializer, select_related=()):
+    categories = get_categories(parameter, used_categories)
+    if categories == []:
+        return []
+    if model_related_name in getattr(obj, '_prefetched_objects_cache', {}):
+        # filtering the prefetched objects instead of making a query per object
         queryset = getattr(obj, model_related_name).all()
+        if categories is not None:
+            queryset = [link for link in queryset if link.category in categories]
+    else:
+        queryset = getattr(obj, model_related_name).select_related(*select_related)
+        if categories is not None:
+            queryset = queryset.filter(category__in=categories)
     return serializer(queryset, many=True).data
 
 
@@ -87,8 +111,8 @@ class TerminationStartedSerializer(serializers.ModelSerializer):
 class CountFoundedCompaniesSerializer(serializers.ModelSerializer):
     company_type = serializers.StringRelatedField(help_text=Company._meta.get_field('company_type').help_text)
     status = serializers.StringRelatedField(help_text=Company._meta.get_field('status').help_text)
-    founder_of_count = serializers.IntegerField(help_text='The number of companies that have a founder '
-                                                          'with the same last name as this particular person.')
+    founder_of_count = serializers.IntegerField(help_text='The number of distinct companies that have '
+                                                          'this company as a founder.')
     id = serializers.IntegerField(help_text='DataOcean\'s internal unique identifier of the object (company).')
     is_closed = serializers.BooleanField(help_text='Boolean type. If its "true" - this company is closed, '
                                                    '"false" - this is an operating company.')
@@ -194,10 +218,7 @@ class CompanyDetailSerializer(DynamicFieldsMixin, serializers.ModelSerializer):
         return filter_with_parameter(
             obj=obj,
             parameter=self.context['request'].query_params.get('peps_relations'),
-            used_categories=[
-                CompanyLinkWithPep.OWNER,
-                CompanyLinkWithPep.MANAGER
-            ],
+            used_categories=COMPANY_RELATION_CATEGORIES,
             model_related_name='relationships_with_peps',
             serializer=CompanyLinkWithPepSerializer,
 
@@ -397,11 +418,7 @@ class PepDetailSerializer(DynamicFieldsMixin, serializers.ModelSerializer):
         return filter_with_parameter(
             obj=obj,
             parameter=self.context['request'].query_params.get('pep_relations'),
-            used_categories=[
-                RelatedPersonsLink.FAMILY,
-                RelatedPersonsLink.BUSINESS,
-                RelatedPersonsLink.PERSONAL
-            ],
+            used_categories=PEP_RELATION_CATEGORIES,
             model_related_name='from_person_links',
             serializer=FromRelatedPersonLinkSerializer)
 
@@ -410,43 +427,21 @@ class PepDetailSerializer(DynamicFieldsMixin, serializers.ModelSerializer):
         return filter_with_parameter(
             obj=obj,
             parameter=self.context['request'].query_params.get('pep_relations'),
-            used_categories=[
-                RelatedPersonsLink.FAMILY,
-                RelatedPersonsLink.BUSINESS,
-                RelatedPersonsLink.PERSONAL
-            ],
+            used_categories=PEP_RELATION_CATEGORIES,
             model_related_name='to_person_links',
             serializer=ToRelatedPersonLinkSerializer
         )
 
     @swagger_serializer_method(serializer_or_field=PepDetailLinkWithCompanySerializer(many=True))
     def get_related_companies(self, obj):
-        parameter = self.context['request'].query_params.get('company_relations')
-        if parameter == 'none':
-            return []
-        used_categories = [
-            CompanyLinkWithPep.OWNER,
-            CompanyLinkWithPep.MANAGER
-        ]
-        if parameter:
-            categories = parameter.split(',')
-            for category in categories:
-                if category not in used_categories:
-                    categories.remove(category)
-            queryset = obj.related_companies.filter(
-                category__in=categories
-            ).select_related(
-                'company',
-                'company__company_type',
-                'company__status'
-            )
-        else:
-            queryset = obj.related_companies.select_related(
-                'company',
-                'company__company_type',
-                'company__status'
-            )
-        return PepDetailLinkWithCompanySerializer(queryset, many=True).data
+        return filter_with_parameter(
+            obj=obj,
+            parameter=self.context['request'].query_params.get('company_relations'),
+            used_categories=COMPANY_RELATION_CATEGORIES,
+            model_related_name='related_companies',
+            serializer=PepDetailLinkWithCompanySerializer,
+            select_related=('company', 'company__company_type', 'company__status')
+        )
 
     @swagger_serializer_method(serializer_or_field=CountFoundedCompaniesSerializer(many=True))
     def get_check_companies(self, obj):
@@ -554,6 +549,65 @@ class PepListSerializer(DynamicFieldsMixin, serializers.ModelSerializer):
             'related_companies', 'pep_org_ua_link', 'created_at', 'updated_at',
         )
 
+
+class PepScreeningPersonSerializer(serializers.Serializer):
+    name = serializers.CharField(max_length=300, help_text='Full name of the person in any word order')
+    # dates of PEPs are compared by prefix, so other formats would drop or add matches silently
+    date_of_birth = serializers.RegexField(
+        r'^\d{4}(-\d{2}(-\d{2})?)?$', max_length=10, required=False, allow_blank=True, allow_null=True,
+        error_messages={'invalid': 'Date of birth must be in YYYY-MM-DD, YYYY-MM or YYYY format'},
+        help_text='Date of birth in YYYY-MM-DD format, can be partial: YYYY or YYYY-MM'
+    )
+
+
+class PepScreeningSerializer(serializers.Serializer):
+    persons = PepScreeningPersonSerializer(many=True, required=False)
+    file = serializers.FileField(
+        required=False, write_only=True,
+        help_text='CSV file in UTF-8 with the columns "name" and optional "date_of_birth"'
+    )
+
+    def validate_file(self, file):
+        try:
+            reader = DictReader(io.TextIOWrapper(file, encoding='utf-8-sig', newline=''))
+            if 'name' not in (reader.fieldnames or []):
+                raise serializers.ValidationError('The file must have the column "name"')
+            rows = [
+                {'name': row['name'], 'date_of_birth': row.get('date_of_birth')}
+                for row in reader if row['name']
+            ]
+        except UnicodeDecodeError:
+            raise serializers.ValidationError('The file must be in UTF-8')
+        persons = PepScreeningPersonSerializer(data=rows, many=True)
+        persons.is_valid(raise_exception=True)
+        return persons.validated_data
+
+    def validate(self, attrs):
+        if ('persons' in attrs) == ('file' in attrs):
+            raise serializers.ValidationError('Send the list of persons or the file')
+        persons = attrs.pop('file', None) or attrs['persons']
+        if len(persons) > settings.PEP_SCREENING_MAX_ROWS:
+            raise serializers.ValidationError(f'Too many persons, the limit is {settings.PEP_SCREENING_MAX_ROWS}')
+        return {'persons': persons}
+
+
+class PepScreeningCandidateSerializer(serializers.Serializer):
+    id = serializers.IntegerField(help_text='DataOcean\'s internal unique identifier of the object (PEP).')
+    fullname = serializers.CharField(help_text=Pep._meta.get_field('fullname').help_text)
+    date_of_birth = serializers.CharField(help_text=Pep._meta.get_field('date_of_birth').help_text)
+    pep_type = serializers.CharField(help_text=Pep._meta.get_field('pep_type').help_text)
+    is_pep = serializers.BooleanField(help_text=Pep._meta.get_field('is_pep').help_text)
+    score = serializers.FloatField(help_text='1 - the full name matches, 0.8 - last and first names match, '
+                                             'decreased by 0.1 if a date of birth is unknown')
+
+
+class PepScreeningResultSerializer(serializers.Serializer):
+    row = serializers.IntegerField(help_text='Index of the person in the request starting from 0')
+    name = serializers.CharField()
+    date_of_birth = serializers.CharField()
+    candidates = PepScreeningCandidateSerializer(many=True)
+
+
 # class PepListFreemiumSerializer(DynamicFieldsMixin, serializers.ModelSerializer):
 #     pep_type_display = serializers.CharField(
 #     source='get_pep_type_display',
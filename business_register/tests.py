@@ -1,3 +1,70 @@
-from django.test import TestCase
+from unittest import mock
 
-# Create your tests here.
+from django.test import SimpleTestCase
+
+from business_register.pep_screening import PepNameIndex
+
+PEPS = (
+    (1, 'Іванов Іван Іванович', 'Ivanov Ivan Ivanovych', 'Ivan Ivanovych Ivanov\nIvanov Ivan', '1964-02-03',
+     'national PEP', True),
+    (2, 'Іванов Іван Петрович', 'Ivanov Ivan Petrovych', '', None, 'member of PEP family', False),
+    (3, "Мар'яненко Мар'яна Олегівна", 'Marianenko Mariana Olehivna', '', '1980', 'national PEP', True),
+)
+
+
+class PepNameIndexTestCase(SimpleTestCase):
+    def setUp(self):
+        with mock.patch('business_register.pep_screening.Pep') as pep_model:
+            pep_model.objects.values_list.return_value.iterator.return_value = iter(PEPS)
+            self.index = PepNameIndex()
+
+    def get_scores(self, name, date_of_birth=None):
+        return [(candidate['id'], candidate['score']) for candidate in self.index.match(name, date_of_birth)]
+
+    def test_full_match(self):
+        candidates = self.index.match('Іванов Іван Іванович', '1964-02-03')
+        self.assertEqual(candidates[0], {
+            'id': 1,
+            'fullname': 'Іванов Іван Іванович',
+            'date_of_birth': '1964-02-03',
+            'pep_type': 'national PEP',
+            'is_pep': True,
+            'score': 1.0,
+        })
+        # a pair match without the date of birth of the PEP
+        self.assertEqual(self.get_scores('Іванов Іван Іванович', '1964-02-03'), [(1, 1.0), (2, 0.7)])
+
+    def test_word_order_and_transcriptions(self):
+        self.assertEqual(self.get_scores('Іван Іванович Іванов'), [(1, 0.9), (2, 0.7)])
+        self.assertEqual(self.get_scores('IVANOV Ivan Ivanovych'), [(1, 0.9), (2, 0.7)])
+        self.assertEqual(self.get_scores('Ivan Ivanov'), [(1, 0.9), (2, 0.7)])
+
+    def test_pair_match(self):
+        self.assertEqual(self.get_scores('Іванов Іван', '1990-01-01'), [(2, 0.7)])
+        self.assertEqual(self.get_scores('Мар’яненко Мар’яна', '1980-05-06'), [(3, 0.8)])
+        # the first name and the patronymic of a transcription are not a pair
+        self.assertEqual(self.get_scores('Ivan Ivanovych'), [])
+
+    def test_date_of_birth(self):
+        self.assertEqual(self.get_scores('Іванов Іван Іванович', '1964'), [(1, 1.0), (2, 0.7)])
+        self.assertEqual(self.get_scores('Іванов Іван Іванович', '1964-02'), [(1, 1.0), (2, 0.7)])
+        self.assertEqual(self.get_scores('Іванов Іван Іванович', '1964-02-04'), [(2, 0.7)])
+        self.assertEqual(self.get_scores("Мар'яненко Мар'яна Олегівна", '1980-05-06'), [(3, 1.0)])
+        self.assertEqual(self.get_scores("Мар'яненко Мар'яна Олегівна", '1981'), [])
+
+    def test_no_match(self):
+        self.assertEqual(self.get_scores('Іванов'), [])
+        self.assertEqual(self.get_scores('Петренко Петро Петрович'), [])
+
+    def test_get_reloads_after_import(self):
+        with mock.patch('business_register.pep_screening.Pep') as pep_model, \
+                mock.patch('business_register.pep_screening.get_data_versions') as get_data_versions, \
+                mock.patch.object(PepNameIndex, '_instance', None):
+            pep_model.objects.values_list.return_value.iterator.side_effect = lambda: iter(PEPS)
+            get_data_versions.return_value = {'pep': 1.0}
+            index = PepNameIndex.get()
+            self.assertIs(PepNameIndex.get(), index)
+            get_data_versions.return_value = {'pep': 2.0}
+            self.assertIsNot(PepNameIndex.get(), index)
+            self.assertEqual(pep_model.objects.values_list.call_count, 2)
+            get_data_versions.assert_called_with(('pep',))
@@ -1,23 +1,28 @@
 from django.apps import apps
+from django.db.models import Prefetch
 from django.utils.decorators import method_decorator
 from django_filters.rest_framework import DjangoFilterBackend
 from drf_yasg.utils import swagger_auto_schema
 from rest_framework import viewsets
-from rest_framework.filters import SearchFilter
 from rest_framework.response import Response
 
 from business_register.filters import CompanyFilterSet, HistoricalCompanyRelatedFilterSet
 from business_register.models.company_models import Company
+from business_register.models.pep_models import CompanyLinkWithPep
 from business_register.permissions import PepSchemaToken
 from business_register.serializers.company_and_pep_serializers import (
-    CompanyListSerializer, CompanyDetailSerializer, HistoricalAssigneeSerializer,
+    COMPANY_RELATION_CATEGORIES, get_categories, CompanyListSerializer, CompanyDetailSerializer,
+    HistoricalAssigneeSerializer,
     HistoricalBancruptcyReadjustmentSerializer, HistoricalCompanySerializer, HistoricalCompanyDetailSerializer,
     HistoricalCompanyToKvedSerializer, HistoricalCompanyToPredecessorSerializer,
     HistoricalExchangeDataCompanySerializer, HistoricalFounderSerializer, HistoricalSignerSerializer,
     HistoricalTerminationStartedSerializer
 )
 from data_converter.pagination import CachedCountPagination
-from data_ocean.views import CachedViewSetMixin, RegisterViewMixin
+from data_ocean.filters import RankedSearchFilter
+from data_ocean.views import (
+    BatchLookupMixin, CachedViewSetMixin, DynamicFieldsQuerysetMixin, RegisterViewMixin, batch_request_schema
+)
 
 HistoricalAssignee = apps.get_model('business_register', 'HistoricalAssignee')
 HistoricalBancruptcyReadjustment = apps.get_model('business_register', 'HistoricalBancruptcyReadjustment')
@@ -30,11 +35,37 @@ HistoricalFounder = apps.get_model('business_register', 'HistoricalFounder')
 HistoricalSigner = apps.get_model('business_register', 'HistoricalSigner')
 HistoricalTerminationStarted = apps.get_model('business_register', 'HistoricalTerminationStarted')
 
+# properties and method fields of company serializers, see DynamicFieldsQuerysetMixin
+COMPANY_FIELD_DEPENDENCIES = {
+    'address_en': ['address'],
+    'is_closed': ['status'],
+    'is_foreign': ['country'],
+    'founder_of': ['edrpou'],
+    'relationships_with_peps': ['relationships_with_peps__pep'],
+}
+
+
+def get_company_prefetches(request):
+    # peps_relations categories of CompanyDetailSerializer are filtered by the prefetch query
+    categories = get_categories(request.query_params.get('peps_relations'), COMPANY_RELATION_CATEGORIES)
+    if categories is None:
+        return []
+    return [Prefetch(
+        'relationships_with_peps',
+        queryset=CompanyLinkWithPep.objects.filter(category__in=categories),
+    )]
+
 
 @method_decorator(name='retrieve', decorator=swagger_auto_schema(tags=['business register']))
 @method_decorator(name='list', decorator=swagger_auto_schema(tags=['business register']))
+@method_decorator(name='batch', decorator=swagger_auto_schema(
+    tags=['business register'], request_body=batch_request_schema('edrpou'),
+    responses={200: CompanyListSerializer(many=True)},
+))
 class CompanyViewSet(RegisterViewMixin,
                      CachedViewSetMixin,
+                     BatchLookupMixin,
+                     DynamicFieldsQuerysetMixin,
                      viewsets.ReadOnlyModelViewSet):
     permission_classes = [RegisterViewMixin.permission_classes[0] | PepSchemaToken]
     pagination_class = CachedCountPagination
@@ -45,9 +76,16 @@ class CompanyViewSet(RegisterViewMixin,
         'bancruptcy_readjustment', 'company_detail', 'exchange_data', 'relationships_with_peps',
     )
     serializer_class = CompanyListSerializer
-    filter_backends = (DjangoFilterBackend, SearchFilter)
+    filter_backends = (DjangoFilterBackend, RankedSearchFilter)
     filterset_class = CompanyFilterSet
     search_fields = ('name', 'edrpou', 'address', 'status__name')
+    field_dependencies = COMPANY_FIELD_DEPENDENCIES
+    cache_registers = ('company', 'pep')
+    planned_actions = ('list', 'retrieve', 'batch')
+    batch_lookup_fields = {'edrpou': 'edrpou'}
+
+    def get_prefetches(self):
+        return get_company_prefetches(self.request)
 
     def get_serializer_class(self):
         if self.action == 'retrieve':
@@ -59,6 +97,7 @@ class CompanyViewSet(RegisterViewMixin,
 @method_decorator(name='list', decorator=swagger_auto_schema(tags=['business register']))
 class CompanyUkrViewSet(RegisterViewMixin,
                         CachedViewSetMixin,
+                        DynamicFieldsQuerysetMixin,
                         viewsets.ReadOnlyModelViewSet):
     permission_classes = [RegisterViewMixin.permission_classes[0] | PepSchemaToken]
     pagination_class = CachedCountPagination
@@ -71,9 +110,14 @@ class CompanyUkrViewSet(RegisterViewMixin,
         'bancruptcy_readjustment', 'company_detail', 'exchange_data', 'relationships_with_peps',
     )
     serializer_class = CompanyListSerializer
-    filter_backends = (DjangoFilterBackend, SearchFilter)
+    filter_backends = (DjangoFilterBackend, RankedSearchFilter)
     filterset_class = CompanyFilterSet
     search_fields = ('name', 'edrpou', 'address', 'status__name')
+    field_dependencies = COMPANY_FIELD_DEPENDENCIES
+    cache_registers = ('company', 'pep')
+
+    def get_prefetches(self):
+        return get_company_prefetches(self.request)
 
     def get_serializer_class(self):
         if self.action == 'retrieve':
@@ -85,6 +129,7 @@ class CompanyUkrViewSet(RegisterViewMixin,
 @method_decorator(name='list', decorator=swagger_auto_schema(tags=['business register']))
 class CompanyUkViewSet(RegisterViewMixin,
                        CachedViewSetMixin,
+                       DynamicFieldsQuerysetMixin,
                        viewsets.ReadOnlyModelViewSet):
     permission_classes = [RegisterViewMixin.permission_classes[0] | PepSchemaToken]
     pagination_class = CachedCountPagination
@@ -97,9 +142,14 @@ class CompanyUkViewSet(RegisterViewMixin,
         'bancruptcy_readjustment', 'company_detail', 'exchange_data', 'relationships_with_peps',
     )
     serializer_class = CompanyListSerializer
-    filter_backends = (DjangoFilterBackend, SearchFilter)
+    filter_backends = (DjangoFilterBackend, RankedSearchFilter)
     filterset_class = CompanyFilterSet
     search_fields = ('name', 'edrpou', 'address', 'status__name')
+    field_dependencies = COMPANY_FIELD_DEPENDENCIES
+    cache_registers = ('company', 'pep')
+
+    def get_prefetches(self):
+        return get_company_prefetches(self.request)
 
     def get_serializer_class(self):
         if self.action == 'retrieve':
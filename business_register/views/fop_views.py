@@ -14,14 +14,23 @@ from data_converter.pagination import CachedCountPagination
 from data_ocean.filters import FullWordSearchFilter
 from data_ocean.permissions import IsAuthenticatedAndPaidSubscription
 from data_ocean.tasks import export_to_s3
-from data_ocean.views import CachedViewSetMixin, RegisterViewMixin
+from data_ocean.throttling import XlsxExportThrottle
+from data_ocean.views import (
+    BatchLookupMixin, CachedViewSetMixin, DynamicFieldsQuerysetMixin, RegisterViewMixin, batch_request_schema
+)
 
 
 @method_decorator(name='retrieve', decorator=swagger_auto_schema(tags=['business register']))
 @method_decorator(name='list', decorator=swagger_auto_schema(tags=['business register']))
 @method_decorator(name='export_to_xlsx', decorator=swagger_auto_schema(auto_schema=None))
+@method_decorator(name='batch', decorator=swagger_auto_schema(
+    tags=['business register'], request_body=batch_request_schema('code'),
+    responses={200: FopSerializer(many=True)},
+))
 class FopViewSet(RegisterViewMixin,
                  CachedViewSetMixin,
+                 BatchLookupMixin,
+                 DynamicFieldsQuerysetMixin,
                  viewsets.ReadOnlyModelViewSet):
     pagination_class = CachedCountPagination
     queryset = Fop.objects.select_related(
@@ -32,9 +41,13 @@ class FopViewSet(RegisterViewMixin,
     filter_backends = (DjangoFilterBackend, FullWordSearchFilter)
     serializer_class = FopSerializer
     filterset_class = FopFilterSet
+    cache_registers = ('fop',)
     search_fields = ('fullname', 'address', 'status__name')
+    planned_actions = ('list', 'retrieve', 'batch')
+    batch_lookup_fields = {'code': 'code'}
 
-    @action(detail=False, url_path='xlsx', permission_classes=[IsAuthenticatedAndPaidSubscription])
+    @action(detail=False, url_path='xlsx', permission_classes=[IsAuthenticatedAndPaidSubscription],
+            throttle_classes=[XlsxExportThrottle])
     def export_to_xlsx(self, request):
         queryset = self.filter_queryset(self.get_queryset())
         if queryset.count() > settings.FOP_TO_XLSX_LIMIT:
@@ -1,4 +1,5 @@
 from django.conf import settings
+from django.db.models import Prefetch
 from django.shortcuts import get_object_or_404
 from django.utils.decorators import method_decorator
 from django.utils.translation import gettext_lazy as _
@@ -7,40 +8,92 @@ from drf_yasg.utils import swagger_auto_schema
 from rest_framework import viewsets
 from rest_framework.decorators import action
 from rest_framework.exceptions import ValidationError
-from rest_framework.filters import SearchFilter
+from rest_framework.parsers import JSONParser, MultiPartParser
 from rest_framework.response import Response
 
 from business_register.filters import PepFilterSet, PepExportFilterSet, PepCheckFilterSet
-from business_register.models.pep_models import Pep
+from business_register.models.pep_models import CompanyLinkWithPep, Pep, RelatedPersonsLink
+from business_register.pep_screening import PepNameIndex
 from business_register.permissions import PepSchemaToken
 from business_register.serializers.company_and_pep_serializers import (
-    PepListSerializer, PepDetailSerializer, PepDetailWithoutCheckCompaniesSerializer
+    COMPANY_RELATION_CATEGORIES, PEP_RELATION_CATEGORIES, PepListSerializer, PepDetailSerializer,
+    PepDetailWithoutCheckCompaniesSerializer, PepScreeningResultSerializer, PepScreeningSerializer, get_categories
 )
 from data_converter.filter import DODjangoFilterBackend
 from data_converter.pagination import CachedCountPagination
+from data_ocean.filters import RankedSearchFilter
 from data_ocean.permissions import IsAuthenticatedAndPaidSubscription
 from data_ocean.tasks import export_to_s3
-from data_ocean.views import CachedViewSetMixin, RegisterViewMixin
-from payment_system.permissions import PepChecksPermission
+from data_ocean.views import (
+    BatchLookupMixin, CachedViewSetMixin, DynamicFieldsQuerysetMixin, RegisterViewMixin, batch_request_schema
+)
+from data_ocean.throttling import XlsxExportThrottle
+from payment_system.permissions import PepChecksPermission, PepChecksThrottle
 
 
 @method_decorator(name='retrieve', decorator=swagger_auto_schema(tags=['pep']))
 @method_decorator(name='list', decorator=swagger_auto_schema(tags=['pep']))
 @method_decorator(name='retrieve_by_source_id', decorator=swagger_auto_schema(auto_schema=None))
 @method_decorator(name='export_to_xlsx', decorator=swagger_auto_schema(auto_schema=None))
+@method_decorator(name='batch', decorator=swagger_auto_schema(
+    tags=['pep'], request_body=batch_request_schema('id', 'source_id'),
+    responses={200: PepListSerializer(many=True)},
+))
+@method_decorator(name='screening', decorator=swagger_auto_schema(
+    tags=['pep'], responses={200: PepScreeningResultSerializer(many=True)},
+))
 class PepViewSet(RegisterViewMixin,
                  CachedViewSetMixin,
+                 BatchLookupMixin,
+                 DynamicFieldsQuerysetMixin,
                  viewsets.ReadOnlyModelViewSet):
     permission_classes = [RegisterViewMixin.permission_classes[0] | PepSchemaToken]
     pagination_class = CachedCountPagination
     queryset = Pep.objects.all()
     serializer_class = PepListSerializer
-    filter_backends = (DODjangoFilterBackend, SearchFilter)
+    filter_backends = (DODjangoFilterBackend, RankedSearchFilter)
     filterset_class = PepFilterSet
+    cache_registers = ('pep', 'company')
     search_fields = (
         'fullname', 'fullname_transcriptions_eng', 'pep_type',
         'last_job_title', 'last_employer',
     )
+    field_dependencies = {
+        'last_job_title_en': ['last_job_title'],
+        'last_employer_en': ['last_employer'],
+        'place_of_birth_en': ['place_of_birth'],
+        'pep_org_ua_link': ['source_id'],
+        # method fields of the detail serializer, see get_prefetches()
+        'from_person_links': ['from_person_links__to_person'],
+        'to_person_links': ['to_person_links__from_person'],
+        'related_companies': ['related_companies__company'],
+        'check_companies': [],
+    }
+    planned_actions = ('list', 'retrieve', 'retrieve_by_source_id', 'check', 'batch')
+    batch_lookup_fields = {'id': 'id', 'source_id': 'source_id'}
+
+    def get_prefetches(self):
+        if self.action in ('list', 'batch'):
+            return []
+        # categories of the detail serializer parameters are filtered by the prefetch queries
+        query_params = self.request.query_params
+        pep_categories = get_categories(query_params.get('pep_relations'), PEP_RELATION_CATEGORIES)
+        company_categories = get_categories(query_params.get('company_relations'), COMPANY_RELATION_CATEGORIES)
+        from_person_links = RelatedPersonsLink.objects.all()
+        to_person_links = RelatedPersonsLink.objects.all()
+        related_companies = CompanyLinkWithPep.objects.select_related(
+            'company', 'company__company_type', 'company__status', 'company__country',
+        )
+        if pep_categories is not None:
+            from_person_links = from_person_links.filter(category__in=pep_categories)
+            to_person_links = to_person_links.filter(category__in=pep_categories)
+        if company_categories is not None:
+            related_companies = related_companies.filter(category__in=company_categories)
+        return [
+            Prefetch('from_person_links', queryset=from_person_links),
+            Prefetch('to_person_links', queryset=to_person_links),
+            Prefetch('related_companies', queryset=related_companies),
+        ]
 
     def get_serializer_class(self):
         if self.action == 'retrieve':
@@ -54,7 +107,8 @@ class PepViewSet(RegisterViewMixin,
         serializer = self.get_serializer(pep)
         return Response(serializer.data)
 
-    @action(detail=False, url_path='xlsx', permission_classes=[IsAuthenticatedAndPaidSubscription])
+    @action(detail=False, url_path='xlsx', permission_classes=[IsAuthenticatedAndPaidSubscription],
+            throttle_classes=[XlsxExportThrottle])
     def export_to_xlsx(self, request):
         filterset = PepExportFilterSet(request.GET, self.get_queryset())
         if not filterset.is_valid():
@@ -80,6 +134,7 @@ class PepViewSet(RegisterViewMixin,
 
     @action(detail=False, filterset_class=PepCheckFilterSet,
             permission_classes=[PepChecksPermission],
+            throttle_classes=[PepChecksThrottle],
             filter_backends=[DODjangoFilterBackend],
             pagination_class=None,
             serializer_class=PepDetailWithoutCheckCompaniesSerializer)
@@ -88,3 +143,30 @@ class PepViewSet(RegisterViewMixin,
         peps = self.filter_queryset(self.get_queryset())
         serializer = self.get_serializer(peps, many=True)
         return Response(serializer.data)
+
+    @action(detail=False, methods=['post'],
+            permission_classes=[PepChecksPermission],
+            throttle_classes=[PepChecksThrottle],
+            parser_classes=[JSONParser, MultiPartParser],
+            filter_backends=[],
+            pagination_class=None,
+            serializer_class=PepScreeningSerializer)
+    def screening(self, request):
+        """
+        Bulk check of persons by the in-memory index of PEP names, see PepNameIndex.
+        Returns the persons having candidates with scores.
+        """
+        serializer = self.get_serializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        index = PepNameIndex.get()
+        results = []
+        for row, person in enumerate(serializer.validated_data['persons']):
+            candidates = index.match(person['name'], person.get('date_of_birth'))
+            if candidates:
+                results.append({
+                    'row': row,
+                    'name': person['name'],
+                    'date_of_birth': person.get('date_of_birth'),
+                    'candidates': candidates,
+                })
+        return Response(results)
@@ -9,7 +9,7 @@ from business_register.serializers.sanction_serializers import (
     CountrySanctionSerializer, PersonSanctionSerializer, CompanySanctionSerializer
 )
 from data_converter.filter import DODjangoFilterBackend
-from data_ocean.views import CachedViewSetMixin, RegisterViewMixin
+from data_ocean.views import CachedViewSetMixin, DynamicFieldsQuerysetMixin, RegisterViewMixin
 from payment_system.permissions import FreeForPayedProjects
 
 
@@ -17,6 +17,7 @@ from payment_system.permissions import FreeForPayedProjects
 @method_decorator(name='list', decorator=swagger_auto_schema(tags=['sanctions']))
 class CountrySanctionViewSet(RegisterViewMixin,
                              CachedViewSetMixin,
+                             DynamicFieldsQuerysetMixin,
                              viewsets.ReadOnlyModelViewSet):
     permission_classes = [FreeForPayedProjects]
     queryset = CountrySanction.objects.all()
@@ -32,6 +33,7 @@ class CountrySanctionViewSet(RegisterViewMixin,
 @method_decorator(name='list', decorator=swagger_auto_schema(tags=['sanctions']))
 class PersonSanctionViewSet(RegisterViewMixin,
                             CachedViewSetMixin,
+                            DynamicFieldsQuerysetMixin,
                             viewsets.ReadOnlyModelViewSet):
     permission_classes = [FreeForPayedProjects]
     queryset = PersonSanction.objects.all()
@@ -54,6 +56,7 @@ class PersonSanctionViewSet(RegisterViewMixin,
 @method_decorator(name='list', decorator=swagger_auto_schema(tags=['sanctions']))
 class CompanySanctionViewSet(RegisterViewMixin,
                              CachedViewSetMixin,
+                             DynamicFieldsQuerysetMixin,
                              viewsets.ReadOnlyModelViewSet):
     permission_classes = [FreeForPayedProjects]
     queryset = CompanySanction.objects.all()
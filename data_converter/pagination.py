@@ -1,13 +1,22 @@
+import base64
+import binascii
+import json
 import math
 from collections import OrderedDict
 
 from django.conf import settings
 from django.core.paginator import Paginator
 from django.core.cache import caches
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db.models import F, Model, Q
 from django.utils.functional import cached_property
 from drf_yasg import openapi
+from rest_framework.exceptions import ValidationError
 from rest_framework.pagination import PageNumberPagination
 from rest_framework.response import Response
+from rest_framework.utils.urls import remove_query_param, replace_query_param
+
+from data_ocean.cache import get_data_version_prefix, get_data_versions
 
 
 class CustomPagination(PageNumberPagination):
@@ -58,8 +67,10 @@ class CustomPagination(PageNumberPagination):
 class CachedCountsPaginator(Paginator):
     cache_timeout = 60 * 60 * 24  # 24 hours
 
-    def __init__(self, *args, request, **kwargs):
+    def __init__(self, *args, request, registers=(), **kwargs):
         self.request = request
+        # counts are kept per data version of the registers, see data_ocean.cache
+        self.registers = registers
         self.insensitive_keys = (
             CustomPagination.page_query_param,
             CustomPagination.page_size_query_param,
@@ -67,6 +78,8 @@ class CachedCountsPaginator(Paginator):
             'fields',
             'format',
             'o',
+            CachedCountPagination.cursor_query_param,
+            CachedCountPagination.with_count_query_param,
         )
         super().__init__(*args, **kwargs)
 
@@ -86,7 +99,10 @@ class CachedCountsPaginator(Paginator):
             if not is_empty:
                 key_params[key] = sorted(values)
 
-        return f"{self.request.path}?{str(key_params).replace(' ', '')}"
+        key = f"{self.request.path}?{str(key_params).replace(' ', '')}"
+        if self.registers:
+            key = f'{get_data_version_prefix(get_data_versions(self.registers))}:{key}'
+        return key
 
     @cached_property
     def count(self):
@@ -104,11 +120,157 @@ class CachedCountsPaginator(Paginator):
 
 
 class CachedCountPagination(CustomPagination):
+    """
+    Page number pagination with cached counts. Passing `?cursor=` switches to keyset
+    pagination: rows are walked in the order of the active `o=` ordering (or `id`)
+    with `id` as a tie-breaker, the next page is selected by the values of the last
+    row instead of OFFSET and no COUNT is made unless `?with_count=true` is passed.
+    """
     # django_paginator_class = CachedCountsPaginator
+    cursor_query_param = 'cursor'
+    with_count_query_param = 'with_count'
+    invalid_cursor_message = 'Invalid cursor'
 
     def django_paginator_class(self, queryset, page_size):
-        return CachedCountsPaginator(queryset, page_size, request=self.request)
+        return CachedCountsPaginator(
+            queryset, page_size, request=self.request, registers=getattr(self.view, 'cache_registers', ()),
+        )
 
     def paginate_queryset(self, queryset, request, view=None):
         self.request = request
+        self.view = view
+        self.cursor_mode = self.cursor_query_param in request.query_params
+        if self.cursor_mode:
+            return self.paginate_queryset_by_cursor(queryset, request)
         return super().paginate_queryset(queryset, request, view)
+
+    def get_paginated_response(self, data):
+        if not self.cursor_mode:
+            return super().get_paginated_response(data)
+        response_data = OrderedDict()
+        if self.with_count:
+            paginator = self.django_paginator_class(self.queryset, self.page_size)
+            response_data['count'] = paginator.count
+            response_data['last_page'] = math.ceil(paginator.count / paginator.per_page) or 1
+        response_data['next'] = self.get_next_link()
+        response_data['results'] = data
+        return Response(response_data)
+
+    def get_next_link(self):
+        if not self.cursor_mode:
+            return super().get_next_link()
+        if self.next_position is None:
+            return None
+        url = self.request.build_absolute_uri()
+        url = remove_query_param(url, self.page_query_param)
+        return replace_query_param(url, self.cursor_query_param, self.encode_cursor(self.next_position))
+
+    def paginate_queryset_by_cursor(self, queryset, request):
+        self.queryset = queryset
+        self.page_size = self.get_page_size(request)
+        self.with_count = request.query_params.get(self.with_count_query_param, '').lower() in ('true', '1')
+        self.ordering = self.get_keyset_ordering(queryset)
+        queryset = queryset.order_by(*[
+            F(field).desc(nulls_last=True) if descending else F(field).asc(nulls_last=True)
+            for field, descending in self.ordering
+        ])
+        position = self.decode_cursor(request.query_params[self.cursor_query_param])
+        if position is not None:
+            queryset = queryset.filter(self.get_keyset_filter(position))
+
+        results = list(queryset[:self.page_size + 1])
+        self.next_position = None
+        if len(results) > self.page_size:
+            results = results[:self.page_size]
+            self.next_position = [self.get_field_value(results[-1], field) for field, _ in self.ordering]
+        return results
+
+    @staticmethod
+    def get_keyset_ordering(queryset):
+        """Return the queryset ordering as (field, descending) pairs ending with the primary key."""
+        query = queryset.query
+        order_by = query.order_by or (query.default_ordering and queryset.model._meta.ordering) or ()
+        if not all(isinstance(item, str) and item != '?' for item in order_by):
+            order_by = ()
+        pk_name = queryset.model._meta.pk.name
+        ordering = []
+        for item in order_by:
+            descending = item.startswith('-')
+            field = item.lstrip('-')
+            if field == 'pk':
+                field = pk_name
+            ordering.append((field, descending))
+            if field == pk_name:
+                break
+        else:
+            ordering.append((pk_name, False))
+        return ordering
+
+    def get_keyset_filter(self, position):
+        """
+        Build the condition for rows going after the `position` in the ordering.
+        NULLs are ordered last in both directions, so a NULL value is only followed by NULLs.
+        """
+        keyset_filter = Q()
+        equal = Q()
+        for (field, descending), value in zip(self.ordering, position):
+            if value is None:
+                equal &= Q(**{f'{field}__isnull': True})
+                continue
+            lookup = 'lt' if descending else 'gt'
+            after = Q(**{f'{field}__{lookup}': value}) | Q(**{f'{field}__isnull': True})
+            keyset_filter |= equal & after
+            equal &= Q(**{field: value})
+        return keyset_filter
+
+    @staticmethod
+    def get_field_value(obj, field):
+        for attr in field.split('__'):
+            if obj is None:
+                return None
+            obj = getattr(obj, attr)
+        if isinstance(obj, Model):
+            return obj.pk
+        return obj
+
+    def encode_cursor(self, position):
+        data = json.dumps(position, cls=DjangoJSONEncoder, separators=(',', ':'))
+        return base64.urlsafe_b64encode(data.encode()).decode()
+
+    def decode_cursor(self, cursor):
+        if not cursor:
+            return None
+        try:
+            position = json.loads(base64.urlsafe_b64decode(cursor.encode()).decode())
+        except (TypeError, ValueError, binascii.Error):
+            raise ValidationError({self.cursor_query_param: [self.invalid_cursor_message]})
+        if not isinstance(position, list) or len(position) != len(self.ordering):
+            raise ValidationError({self.cursor_query_param: [self.invalid_cursor_message]})
+        return position
+
+    def get_paginated_response_schema(self, schema):
+        response_schema = super().get_paginated_response_schema(schema)
+        response_schema.properties['next'] = openapi.Schema(
+            description='Link to the next page in the cursor mode, null on the last page.',
+            type=openapi.TYPE_STRING,
+            x_nullable=True,
+        )
+        response_schema.properties.move_to_end('results')
+        return response_schema
+
+    def get_schema_fields(self, view):
+        return super().get_schema_fields(view) + [
+            openapi.Parameter(
+                name=self.cursor_query_param,
+                in_=openapi.IN_QUERY,
+                description='Switches to the cursor pagination without counting results. Pass an empty value '
+                            'for the first page and follow the "next" link for the next ones.',
+                type=openapi.TYPE_STRING,
+            ),
+            openapi.Parameter(
+                name=self.with_count_query_param,
+                in_=openapi.IN_QUERY,
+                description='Add "count" and "last_page" to the response in the cursor mode.',
+                type=openapi.TYPE_BOOLEAN,
+            ),
+        ]
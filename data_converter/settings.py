@@ -14,6 +14,8 @@ from data_converter.settings_local import *
 from django.utils.translation import ugettext_lazy as _
 
 DEBUG_TOOLBAR = locals().get('DEBUG_TOOLBAR', False)
+# scheme and host of API requests as the application gets them behind the proxy, used by the cache warmer
+CACHE_WARMING_SITE_URL = locals().get('CACHE_WARMING_SITE_URL', BACKEND_SITE_URL)
 
 # Application definition
 
@@ -294,4 +296,38 @@ NACP_DECLARATION_RETRIEVE = 'https://public-api.nazk.gov.ua/v2/documents/'
 NACP_DECLARATION_LIST = 'https://public-api.nazk.gov.ua/v2/documents/list/'
 
 FOP_TO_XLSX_LIMIT = 5000
-PEP_EXPORT_XLSX_DAYS_LIMIT = 30
\ No newline at end of file
+# FOPs missing in the full file are deleted only if their share of the register is not bigger
+FOP_OUTDATED_MAX_SHARE = 0.05
+PEP_EXPORT_XLSX_DAYS_LIMIT = 30
+
+# POST .../batch/ lookups by a list of identifiers, see data_ocean.views.BatchLookupMixin
+BATCH_LOOKUP_MAX_SIZE = 1000
+BATCH_LOOKUP_CHUNK_SIZE = 200
+# True - every identifier of the batch is counted as a request of the project, False - the whole batch is one request
+BATCH_LOOKUP_COUNT_PER_ITEM = False
+
+# persons in one request of the bulk PEP screening, see business_register.pep_screening.PepNameIndex
+PEP_SCREENING_MAX_ROWS = 10000
+
+# in-process cache warming, see stats.cache_warming.CacheWarmer
+CACHE_WARMING_WORKERS = 4
+# the most requested paths under the warmed endpoints, counted by ApiUsageTracking for the last days
+CACHE_WARMING_HOT_PATHS = 200
+CACHE_WARMING_USAGE_DAYS = 7
+
+# API usage events are inserted in batches, see stats.usage.ApiUsageBuffer
+API_USAGE_FLUSH_SIZE = 1000
+API_USAGE_FLUSH_SECONDS = 60
+# rows of ApiUsageTracking counted in one transaction, see stats.logic.rollup_api_usage
+API_USAGE_ROLLUP_BATCH_SIZE = 100000
+
+# a project and its active subscription are cached by the token, see ProjectAuthenticationMiddleware
+PROJECT_TOKEN_CACHE_SECONDS = 60
+# requests of projects are counted in the process and written to ProjectSubscription at most once per
+PROJECT_REQUESTS_FLUSH_SECONDS = 5
+
+# .xlsx exports of a user, see data_ocean.throttling.XlsxExportThrottle
+XLSX_EXPORTS_PER_HOUR = 10
+
+# text search configuration of the search_vector columns, 'simple' keeps words as is without stemming
+SEARCH_CONFIG = 'simple'
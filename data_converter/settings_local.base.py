@@ -91,6 +91,9 @@ CSRF_TRUSTED_ORIGINS = [
 ]
 
 LOCAL_FOLDER = 'unzipped_xml/'
+# buffer size of downloading source files and number of parallel HTTP Range requests per file
+DOWNLOAD_CHUNK_SIZE = 16 * 1024 * 1024
+DOWNLOAD_THREADS = 1
 
 DATA_GOV_UA_DATASETS_URL = 'https://data.gov.ua/dataset/'
 DATA_GOV_UA_SOURCE_PACKAGE = 'https://data.gov.ua/api/3/action/package_show?id='
@@ -120,6 +123,12 @@ LOCAL_FILE_NAME_FOP = ''
 CHUNK_SIZE_FOP = 100
 LOCAL_FILE_NAME_FOP_FULL = ''
 CHUNK_SIZE_FOP_FULL = 100
+# number of processes for parallel import of the full register (1 - without parallelism)
+PROCESSES_FOP_FULL = 1
+# reading, parsing and saving as concurrent stages (only without parallel processes)
+PIPELINED_FOP_FULL = False
+# skip subjects that have not changed since the previous import
+DELTA_FOP_FULL = False
 
 BUSINESS_UKR_COMPANY_SOURCE_REGISTER_ID = '1c7f3815-3259-45e0-bdf1-64dca07ddc10'
 BUSINESS_UKR_COMPANY_SOURCE_PACKAGE = DATA_GOV_UA_SOURCE_PACKAGE + BUSINESS_UKR_COMPANY_SOURCE_REGISTER_ID
@@ -127,6 +136,9 @@ LOCAL_FILE_NAME_UO = ''
 CHUNK_SIZE_UO = 100
 LOCAL_FILE_NAME_UO_FULL = ''
 CHUNK_SIZE_UO_FULL = 100
+PROCESSES_UO_FULL = 1
+PIPELINED_UO_FULL = False
+DELTA_UO_FULL = False
 
 LOCAL_FILE_NAME_UO_ADDRESS = ''
 LOCAL_FILE_NAME_UO_SIGNER = ''
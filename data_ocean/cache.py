@@ -0,0 +1,72 @@
+import hashlib
+import time
+from functools import partial, wraps
+
+from django.conf import settings
+from django.core.cache import cache
+from django.utils import translation
+from django.utils.cache import get_conditional_response, quote_etag
+from django.utils.http import http_date
+from django.views.decorators.cache import cache_page
+
+DATA_VERSION_KEY = 'data_version:{}'
+
+
+def get_data_versions(registers):
+    """
+    Returns {register: version} for the registers, e.g. ('company', 'pep'). A version is the unix time
+    of the last import of the register, a missing one (e.g. after the cache was cleared) starts from now.
+    """
+    keys = {DATA_VERSION_KEY.format(register): register for register in registers}
+    versions = cache.get_many(keys)
+    for key in keys.keys() - versions.keys():
+        cache.add(key, time.time(), None)
+        versions[key] = cache.get(key) or time.time()
+    return {keys[key]: version for key, version in versions.items()}
+
+
+def bump_data_versions(*registers):
+    """Makes all cached responses and counts of the registers unreachable, called after imports."""
+    cache.set_many({DATA_VERSION_KEY.format(register): time.time() for register in registers}, None)
+
+
+def get_data_version_prefix(versions):
+    """Returns a cache key prefix of the versions returned by get_data_versions()."""
+    return '.'.join(f'{register}{versions[register]:.6f}' for register in sorted(versions))
+
+
+def cache_by_data_version(view_method):
+    """
+    Caches responses of the viewset method for CACHE_MIDDLEWARE_SECONDS under a key prefixed by
+    the data versions of `cache_registers` of the view, so an import bumping a version invalidates
+    them without deleting keys. Responses get ETag and Last-Modified of the versions, and a request
+    with a matching If-None-Match or If-Modified-Since gets 304 without touching the data.
+    Without `cache_registers` it is a plain cache_page.
+    """
+    @wraps(view_method)
+    def wrapper(self, request, *args, **kwargs):
+        registers = getattr(self, 'cache_registers', ())
+        view = partial(view_method, self)
+        if not registers:
+            return cache_page(settings.CACHE_MIDDLEWARE_SECONDS)(view)(request, *args, **kwargs)
+
+        versions = get_data_versions(registers)
+        key_prefix = get_data_version_prefix(versions)
+        last_modified = int(max(versions.values()))
+        representation = '|'.join((
+            key_prefix,
+            request.get_full_path(),
+            request.META.get('HTTP_ACCEPT', ''),
+            translation.get_language() or '',
+        ))
+        etag = quote_etag(hashlib.md5(representation.encode()).hexdigest())
+        response = get_conditional_response(request, etag=etag, last_modified=last_modified)
+        if response is None:
+            response = cache_page(settings.CACHE_MIDDLEWARE_SECONDS, key_prefix=key_prefix)(view)(
+                request, *args, **kwargs
+            )
+        if response.status_code in (200, 304):
+            response['ETag'] = etag
+            response['Last-Modified'] = http_date(last_modified)
+        return response
+    return wrapper
@@ -1,21 +1,120 @@
 import codecs
+import hashlib
+import io
 import json
 import logging
+import multiprocessing
 import os
+import queue
+import re
+import threading
 import traceback
 import zipfile
-from collections import defaultdict
+from collections import defaultdict, deque
+from contextlib import contextmanager
+from multiprocessing.pool import AsyncResult
 
 import requests
 import xmltodict
 from django.apps import apps
+from django.db import connection, connections, models, transaction
+from django.db.models.expressions import RawSQL
+from django.utils import timezone
 from lxml import etree
 
+from data_ocean.models import ImportedRecordHash
 from data_ocean.utils import Timer
 from location_register.models.address_models import Country
 
 logger = logging.getLogger(__name__)
 
+# converter instance of a worker process of Converter.process_parallel()
+_worker_converter = None
+
+
+def _init_worker(converter_class):
+    global _worker_converter
+    _worker_converter = converter_class()
+
+
+def _save_raw_chunk(raw_records, encoding):
+    return _worker_converter.save_raw_chunk(raw_records, encoding)
+
+
+class XmlSourceStream(io.RawIOBase):
+    """
+    Binary stream of an XML source transcoded to UTF-8 while reading, with the encoding
+    declaration changed accordingly and references to control characters that are not
+    allowed in XML 1.0 (like '&#3;') removed, so the source can be passed to iterparse as is.
+    """
+    BLOCK_SIZE = 1024 * 1024
+    INVALID_CHAR_REFERENCE = re.compile(
+        r'&#(?:0*(?:[0-8]|1[124-9]|2[0-9]|3[01])|x0*(?:[0-8bcef]|1[0-9a-f]));', re.IGNORECASE
+    )
+    ENCODING_DECLARATION = re.compile(r'^(\ufeff?\s*<\?xml[^>]*encoding=["\'])[\w-]+')
+
+    def __init__(self, raw, encoding):
+        super().__init__()
+        self.raw = raw
+        self.decoder = codecs.getincrementaldecoder(encoding)()
+        self.buffer = b''
+        # the end of a block that can be a beginning of a split character reference
+        self.tail = ''
+        self.is_first_block = True
+        self.is_raw_finished = False
+
+    def readable(self):
+        return True
+
+    def read_block(self):
+        block = self.raw.read(self.BLOCK_SIZE)
+        self.is_raw_finished = not block
+        text = self.tail + self.decoder.decode(block, final=self.is_raw_finished)
+        self.tail = ''
+        if self.is_first_block:
+            # the XML declaration should be read as a whole
+            if not self.is_raw_finished and '>' not in text:
+                self.tail = text
+                return b''
+            text = self.ENCODING_DECLARATION.sub(r'\g<1>UTF-8', text, count=1)
+            self.is_first_block = False
+        reference_start = text.rfind('&', -12)
+        if not self.is_raw_finished and reference_start != -1 and ';' not in text[reference_start:]:
+            text, self.tail = text[:reference_start], text[reference_start:]
+        return self.INVALID_CHAR_REFERENCE.sub('', text).encode()
+
+    def readinto(self, b):
+        while len(self.buffer) < len(b) and not self.is_raw_finished:
+            self.buffer += self.read_block()
+        size = min(len(b), len(self.buffer))
+        b[:size] = self.buffer[:size]
+        self.buffer = self.buffer[size:]
+        return size
+
+    def close(self):
+        self.raw.close()
+        super().close()
+
+
+class RecordChildren(dict):
+    """
+    Direct children of an XML element grouped by tag in one pass over the element.
+    record_fields['NAME'] gives the same list as record.xpath('NAME') without compiling
+    and evaluating an XPath expression on every call, a missing tag gives an empty list.
+    Paths like 'TERMINATION_STARTED_INFO/OP_DATE' are resolved tag by tag.
+    """
+
+    def __init__(self, element):
+        super().__init__()
+        for child in element:
+            self.setdefault(child.tag, []).append(child)
+
+    def __missing__(self, path):
+        if '/' not in path:
+            return []
+        tag, subpath = path.split('/', 1)
+        return [found for child in self.get(tag, []) for found in RecordChildren(child)[subpath]]
+
 
 class Converter:
     UPDATE_FILE_NAME = "update.cfg"
@@ -24,6 +123,15 @@ class Converter:
     LOCAL_FOLDER = "source_data/"  # local folder for unzipped source files
     DOWNLOAD_FOLDER = "download/"  # folder to downloaded files
     URLS_DICT = {}  # control remote dataset files update
+    PROCESSES = 1  # number of worker processes for process_parallel()
+    RECORD_READ_SIZE = 16 * 1024 * 1024  # size of blocks for reading raw records from the source file
+    SOURCE_ZIP_FILE = None  # path to a zip archive to read the LOCAL_FILE_NAME member from without unzipping
+    CLEAN_SOURCE = False  # transcode the source to UTF-8 and remove invalid character references while reading
+    PIPELINED = False  # run reading, parsing and saving of a single process import as concurrent stages
+    PIPELINE_QUEUE_SIZE = 2  # number of chunks waiting between stages of process_pipelined()
+    pipeline_stats = None  # stages metrics of the last process_pipelined() run
+    source_version = None  # version of the source the checkpoint is written for, see get_source_version()
+    DELTA = False  # skip source records that are the same as in the previous import, see get_delta_queryset()
     timing = False
     timer = None
 
@@ -43,7 +151,7 @@ class Converter:
     def save_or_get_country(self, name):
         name = name.lower()
         if name not in self.all_countries_dict:
-            new_country = Country.objects.create(name=name)
+            new_country = Country.objects.get_or_create(name=name)[0]
             self.all_countries_dict[name] = new_country
             return new_country
         return self.all_countries_dict[name]
@@ -202,75 +310,514 @@ class Converter:
         ).objects.all()
                 }
 
+    @contextmanager
+    def ids_table(self, ids, name='converter_ids'):
+        """
+        stores ids into a temporary table and yields a subquery of them for '__in' lookups,
+        so a set of objects can be selected without passing every id as a query parameter
+        """
+        table = connection.ops.quote_name(name)
+        with connection.cursor() as cursor:
+            cursor.execute(f'DROP TABLE IF EXISTS {table}')
+            cursor.execute(f'CREATE TEMP TABLE {table} (id integer PRIMARY KEY)')
+            cursor.copy_expert(
+                f'COPY {table} (id) FROM STDIN',
+                io.StringIO(''.join(f'{object_id}\n' for object_id in set(ids)))
+            )
+            cursor.execute(f'ANALYZE {table}')
+        try:
+            yield RawSQL(f'SELECT id FROM {table}', [])
+        finally:
+            with connection.cursor() as cursor:
+                cursor.execute(f'DROP TABLE IF EXISTS {table}')
+
     def delete_outdated(self):
         """ delete some outdated records """
 
-    def process(self, start_index=0):
-        records = []
-        elements = etree.iterparse(
-            source=self.LOCAL_FOLDER + self.LOCAL_FILE_NAME,
-            tag=self.RECORD_TAG,
-            recover=False,
-        )
-
-        # for _ in range(start_index):
-        #     next(elements)
-
-        # i = start_index
-        i = 0
-        chunk_start_index = i
-        for _, elem in elements:
-            records_len = len(records)
+    def get_chunk_state(self):
+        """
+        returns bookkeeping data collected by save_to_db() for the last chunk,
+        used to pass it from a worker process to the main one in process_parallel()
+        """
+        return None
 
-            if records_len == 0:
-                chunk_start_index = i
+    def merge_chunk_state(self, state):
+        """ merges bookkeeping data of a chunk saved by a worker process """
 
-            # for text in elem.iter():
-            #     print('\t%28s\t%s' % (text.tag, text.text))
+    def get_delta_queryset(self):
+        """
+        hook for converters supporting delta imports: returns a queryset of objects
+        identified by codes from get_record_code(). Hashes of raw records are stored for these
+        objects by process_parallel() and process_pipelined(), so with DELTA a record with
+        the same hash as before is not saved again, only mark_unchanged() is called for its object
+        """
+        return None
+
+    def get_record_code(self, record):
+        """ hook for delta imports: returns the code of the object saved from the parsed record """
+        return None
+
+    def mark_unchanged(self, object_ids):
+        """ hook for delta imports: keeps ids of objects of skipped records, e.g. for delete_outdated() """
+
+    @staticmethod
+    def hash_raw_records(raw_records):
+        return [hashlib.md5(raw_record).hexdigest() for raw_record in raw_records]
+
+    def find_unchanged_records(self, hashes):
+        """ returns a dict of indexes of unchanged records to ids of their still existing objects """
+        stored_ids = dict(ImportedRecordHash.objects.filter(
+            converter=type(self).__name__, hash__in=hashes
+        ).values_list('hash', 'object_id'))
+        existing_ids = set(self.get_delta_queryset().filter(
+            id__in=stored_ids.values()
+        ).values_list('id', flat=True))
+        return {
+            index: stored_ids[record_hash] for index, record_hash in enumerate(hashes)
+            if stored_ids.get(record_hash) in existing_ids
+        }
+
+    def store_record_hashes(self, records, hashes):
+        codes = {}
+        for record, record_hash in zip(records, hashes):
+            code = self.get_record_code(record)
+            if code:
+                codes[code] = record_hash
+        code_ids = {}
+        # the first object is taken for duplicated codes, as converters do, so the lowest id is kept
+        for code, object_id in self.get_delta_queryset().filter(
+                code__in=codes).order_by('-id').values_list('code', 'id'):
+            code_ids[code] = object_id
+        object_hashes = {object_id: codes[code] for code, object_id in code_ids.items()}
+        converter_name = type(self).__name__
+        ImportedRecordHash.objects.filter(converter=converter_name, object_id__in=object_hashes).delete()
+        ImportedRecordHash.objects.bulk_create([
+            ImportedRecordHash(converter=converter_name, object_id=object_id, hash=record_hash)
+            for object_id, record_hash in object_hashes.items()
+        ])
+
+    def clear_record_hashes(self):
+        # hashes become stale when objects are changed by an import without them
+        if self.get_delta_queryset() is not None:
+            ImportedRecordHash.objects.filter(converter=type(self).__name__).delete()
 
-            records.append(elem)
-            records_len += 1
-            if records_len >= self.CHUNK_SIZE:
-                # print(f'>>> Start save to db records {chunk_start_index}-{i}')
-                try:
-                    if i >= start_index:
-                        self.time_it('preparing chunk of records')
-                        self.save_to_db(records)
-                    self.print_running_times()
-                    print(i)
-                except Exception as e:
-                    msg = f'!!! Save to db failed at index = {chunk_start_index}. Error: {str(e)}'
-                    logger.error(msg)
-                    traceback.print_exc()
-                    print(msg)
-                    return False
-                records.clear()
-
-                # http://lxml.de/parsing.html#modifying-the-tree
-                # Based on Liza Daly fast_iter
-                # http://www.ibm.com/developerworks/xml/library/x-hiperfparse/
-                # See also http://effbot.org/zone/element-iterparse.htm
-                #
-                # It safe to call clear() here because no descendants will be accessed
-                elem.clear()
-                # # Also eliminate now-empty references from the root node to elem
-                for ancestor in elem.xpath('ancestor-or-self::*'):
-                    while ancestor.getprevious() is not None:
-                        del ancestor.getparent()[0]
-
-                print('>>> Saved successfully')
-            i += 1
-        if records_len:
+    def process(self, start_index=0):
+        self.clear_record_hashes()
+        records = []
+        with self.open_source() as source:
+            elements = etree.iterparse(
+                source=source,
+                tag=self.RECORD_TAG,
+                recover=False,
+            )
+
+            # for _ in range(start_index):
+            #     next(elements)
+
+            # i = start_index
+            i = 0
+            chunk_start_index = i
+            for _, elem in elements:
+                records_len = len(records)
+
+                if records_len == 0:
+                    chunk_start_index = i
+
+                # for text in elem.iter():
+                #     print('\t%28s\t%s' % (text.tag, text.text))
+
+                records.append(elem)
+                records_len += 1
+                if records_len >= self.CHUNK_SIZE:
+                    # print(f'>>> Start save to db records {chunk_start_index}-{i}')
+                    try:
+                        if i >= start_index:
+                            self.time_it('preparing chunk of records')
+                            self.save_to_db(records)
+                        self.print_running_times()
+                        print(i)
+                    except Exception as e:
+                        msg = f'!!! Save to db failed at index = {chunk_start_index}. Error: {str(e)}'
+                        logger.error(msg)
+                        traceback.print_exc()
+                        print(msg)
+                        return False
+                    records.clear()
+
+                    # http://lxml.de/parsing.html#modifying-the-tree
+                    # Based on Liza Daly fast_iter
+                    # http://www.ibm.com/developerworks/xml/library/x-hiperfparse/
+                    # See also http://effbot.org/zone/element-iterparse.htm
+                    #
+                    # It safe to call clear() here because no descendants will be accessed
+                    elem.clear()
+                    # # Also eliminate now-empty references from the root node to elem
+                    for ancestor in elem.xpath('ancestor-or-self::*'):
+                        while ancestor.getprevious() is not None:
+                            del ancestor.getparent()[0]
+
+                    print('>>> Saved successfully')
+                i += 1
+            if records_len:
+                self.save_to_db(records)
+            if start_index == 0:
+                self.delete_outdated()
+            del elements
+            print('All the records have been rewritten.')
+            return True
+
+    def open_raw_source(self):
+        if self.SOURCE_ZIP_FILE:
+            return zipfile.ZipFile(self.SOURCE_ZIP_FILE).open(self.LOCAL_FILE_NAME)
+        return open(self.LOCAL_FOLDER + self.LOCAL_FILE_NAME, 'rb')
+
+    def open_source(self):
+        """ opens the source file or its member of SOURCE_ZIP_FILE as a binary stream """
+        if not self.CLEAN_SOURCE:
+            return self.open_raw_source()
+        with self.open_raw_source() as file:
+            encoding = self.read_encoding(file)
+        return XmlSourceStream(self.open_raw_source(), encoding)
+
+    @staticmethod
+    def read_encoding(file):
+        declaration = re.match(rb'(?:\xef\xbb\xbf)?\s*<\?xml[^>]*encoding=["\']([\w-]+)["\']', file.read(200))
+        return declaration.group(1).decode() if declaration else 'UTF-8'
+
+    def get_source_encoding(self):
+        with self.open_source() as file:
+            return self.read_encoding(file)
+
+    def find_record_start(self, buffer, position, end):
+        start_tag = f'<{self.RECORD_TAG}'.encode()
+        start = buffer.rfind(start_tag, position, end)
+        # skipping tags that only start with the same name like <SUBJECTS>
+        while start != -1 and buffer[start + len(start_tag):start + len(start_tag) + 1] not in b'> \t\r\n':
+            start = buffer.rfind(start_tag, position, start)
+        return start
+
+    def iter_raw_records(self, offset=0):
+        """
+        yields raw bytes of every record of the source file together with the offset of
+        the record end, so reading can be continued from any record boundary without parsing
+        the beginning of the file. Records with the RECORD_TAG can't be nested.
+        """
+        end_tag = f'</{self.RECORD_TAG}>'.encode()
+        with self.open_source() as file:
+            if file.seekable():
+                if file.seek(0, io.SEEK_END) < offset:
+                    raise ValueError(f'The source is shorter than the offset {offset}')
+                file.seek(offset)
+            else:
+                # a transcoded stream is read up to the offset
+                skipped = 0
+                while skipped < offset:
+                    block = file.read(min(self.RECORD_READ_SIZE, offset - skipped))
+                    if not block:
+                        raise ValueError(f'The source ended at {skipped} before the offset {offset}')
+                    skipped += len(block)
+            buffer = b''
+            buffer_offset = offset
+            while True:
+                block = file.read(self.RECORD_READ_SIZE)
+                if not block:
+                    break
+                buffer += block
+                position = 0
+                while True:
+                    end = buffer.find(end_tag, position)
+                    if end == -1:
+                        break
+                    end += len(end_tag)
+                    start = self.find_record_start(buffer, position, end)
+                    if start != -1:
+                        yield buffer[start:end], buffer_offset + end
+                    position = end
+                buffer = buffer[position:]
+                buffer_offset += position
+
+    @staticmethod
+    def parse_raw_records(raw_records, encoding):
+        parser = etree.XMLParser(encoding=encoding, huge_tree=True)
+        return [etree.fromstring(raw_record, parser) for raw_record in raw_records]
+
+    def save_chunk(self, records, hashes=None, encoding=None):
+        """
+        saves parsed records or raw records with their encoding in a transaction.
+        With hashes of raw records the hashes are stored for delta imports,
+        and with DELTA unchanged records are skipped before parsing.
+        """
+        is_delta_supported = hashes is not None and self.get_delta_queryset() is not None
+        with transaction.atomic():
+            if is_delta_supported and self.DELTA:
+                unchanged_records = self.find_unchanged_records(hashes)
+                self.mark_unchanged(list(unchanged_records.values()))
+                records = [record for index, record in enumerate(records) if index not in unchanged_records]
+                hashes = [record_hash for index, record_hash in enumerate(hashes) if index not in unchanged_records]
+            if encoding:
+                records = self.parse_raw_records(records, encoding)
             self.save_to_db(records)
-        if start_index == 0:
-            self.delete_outdated()
-        del elements
+            if is_delta_supported:
+                self.store_record_hashes(records, hashes)
+        return self.get_chunk_state()
+
+    def save_raw_chunk(self, raw_records, encoding):
+        return self.save_chunk(raw_records, self.hash_raw_records(raw_records), encoding)
+
+    def get_source_version(self):
+        """ identifies the content of the source file, a checkpoint of another content is not continued """
+        if self.SOURCE_ZIP_FILE:
+            with zipfile.ZipFile(self.SOURCE_ZIP_FILE) as zip_file:
+                info = zip_file.getinfo(self.LOCAL_FILE_NAME)
+            return f'{info.file_size}:{info.CRC:08x}'
+        stat = os.stat(self.LOCAL_FOLDER + self.LOCAL_FILE_NAME)
+        return f'{stat.st_size}:{stat.st_mtime_ns}'
+
+    def start_from_checkpoint(self, checkpoint):
+        """ merges states saved by the checkpoint and returns the offset and the index to continue from """
+        if not checkpoint:
+            return 0, 0
+        self.source_version = self.get_source_version()
+        if not checkpoint.is_for(self.LOCAL_FILE_NAME, self.source_version):
+            checkpoint.remove()
+            return 0, 0
+        for state in checkpoint.states:
+            self.merge_chunk_state(state)
+        print(f'>>> Continue from the checkpoint at index = {checkpoint.index}')
+        return checkpoint.offset, checkpoint.index
+
+    def process_parallel(self, processes=None, checkpoint=None):
+        """
+        The main process reads raw records of the source file and sends chunks of them
+        to a pool of worker processes, where each worker has its own converter and
+        DB connection, parses records and runs save_to_db() in a transaction.
+        Chunk results are merged in the order of the source file, then delete_outdated()
+        is called in the main process.
+        With data_ocean.savepoint.Checkpoint the offset after every merged chunk is saved,
+        and the next run with the same checkpoint continues from this offset.
+        """
+        processes = processes or self.PROCESSES
+        if processes <= 1 and self.PIPELINED:
+            return self.process_pipelined(checkpoint)
+        if processes <= 1 and not checkpoint and not self.DELTA:
+            return self.process()
+        offset, i = self.start_from_checkpoint(checkpoint)
+        encoding = self.get_source_encoding()
+        pool = None
+        if processes > 1:
+            # forked workers must open their own DB connections
+            connections.close_all()
+            pool = multiprocessing.Pool(processes, initializer=_init_worker, initargs=(type(self),))
+        pending_chunks = deque()
+        records = []
+        chunk_start_index = i
+        failed_index = i
+        try:
+            for raw_record, end_offset in self.iter_raw_records(offset):
+                if not records:
+                    chunk_start_index = i
+                    failed_index = i
+                records.append(raw_record)
+                i += 1
+                if len(records) >= self.CHUNK_SIZE:
+                    result = self.start_chunk(pool, records, encoding)
+                    pending_chunks.append((chunk_start_index, i, end_offset, result))
+                    records = []
+                    # limiting the number of chunks kept in memory
+                    if len(pending_chunks) >= processes * 2:
+                        failed_index = pending_chunks[0][0]
+                        self.complete_chunk(pending_chunks.popleft(), checkpoint)
+            if records:
+                failed_index = chunk_start_index
+                result = self.start_chunk(pool, records, encoding)
+                pending_chunks.append((chunk_start_index, i, end_offset, result))
+            while pending_chunks:
+                failed_index = pending_chunks[0][0]
+                self.complete_chunk(pending_chunks.popleft(), checkpoint)
+        except Exception as e:
+            msg = f'!!! Save to db failed at index = {failed_index}. Error: {str(e)}'
+            logger.error(msg)
+            traceback.print_exc()
+            print(msg)
+            if pool:
+                pool.terminate()
+            if checkpoint:
+                checkpoint.close()
+            return False
+        if pool:
+            pool.close()
+            pool.join()
+        self.delete_outdated()
+        if checkpoint:
+            checkpoint.remove()
+        print('All the records have been rewritten.')
+        return True
+
+    def start_chunk(self, pool, raw_records, encoding):
+        # without the pool the chunk is saved right away and its state is returned
+        if pool:
+            return pool.apply_async(_save_raw_chunk, (raw_records, encoding))
+        return self.save_raw_chunk(raw_records, encoding)
+
+    def complete_chunk(self, pending_chunk, checkpoint):
+        _, next_index, end_offset, result = pending_chunk
+        state = result.get() if isinstance(result, AsyncResult) else result
+        self.merge_chunk_state(state)
+        if checkpoint:
+            checkpoint.add(self.LOCAL_FILE_NAME, end_offset, next_index, state, self.source_version)
+        print(next_index)
+
+    def process_pipelined(self, checkpoint=None):
+        """
+        Runs the import as three stages connected by queues of PIPELINE_QUEUE_SIZE chunks:
+        a thread reading raw records of the source, a thread parsing them (lxml releases
+        the GIL while parsing) and the main thread running save_to_db() with its DB connection.
+        A full queue stops the stage before it, so a fast stage waits for a slow one instead
+        of keeping the whole file in memory. Checkpoints work as in process_parallel().
+        Work and wait times, throughput and queue depths of stages are kept in self.pipeline_stats.
+        """
+        offset, i = self.start_from_checkpoint(checkpoint)
+        encoding = self.get_source_encoding()
+        stop = threading.Event()
+        reader = PipelineStage('reading', queue.Queue(self.PIPELINE_QUEUE_SIZE), stop)
+        parser = PipelineStage('parsing', queue.Queue(self.PIPELINE_QUEUE_SIZE), stop)
+        writer = PipelineStage('saving', None, stop)
+
+        def read():
+            try:
+                records = []
+                chunk_start_index = index = i
+                end_offset = offset
+                for raw_record, end_offset in self.iter_raw_records(offset):
+                    # the saving failed, the rest of the file is not read
+                    if stop.is_set():
+                        return
+                    records.append(raw_record)
+                    index += 1
+                    if len(records) >= self.CHUNK_SIZE:
+                        if not reader.put((chunk_start_index, index, end_offset, records), len(records)):
+                            return
+                        records = []
+                        chunk_start_index = index
+                if records:
+                    if not reader.put((chunk_start_index, index, end_offset, records), len(records)):
+                        return
+                reader.put(None)
+            except Exception as e:
+                reader.put(e)
+
+        def parse():
+            try:
+                for chunk_start_index, index, end_offset, raw_records in parser.receive(reader):
+                    records = self.parse_raw_records(raw_records, encoding)
+                    hashes = self.hash_raw_records(raw_records)
+                    if not parser.put((chunk_start_index, index, end_offset, records, hashes), len(records)):
+                        return
+                parser.put(None)
+            except Exception as e:
+                parser.put(e)
+
+        threads = [threading.Thread(target=read, daemon=True), threading.Thread(target=parse, daemon=True)]
+        for thread in threads:
+            thread.start()
+        failed_index = i
+        try:
+            for chunk_start_index, index, end_offset, records, hashes in writer.receive(parser):
+                failed_index = chunk_start_index
+                state = self.save_chunk(records, hashes)
+                self.complete_chunk((chunk_start_index, index, end_offset, state), checkpoint)
+                writer.done(len(records))
+        except Exception as e:
+            stop.set()
+            msg = f'!!! Save to db failed at index = {failed_index}. Error: {str(e)}'
+            logger.error(msg)
+            traceback.print_exc()
+            print(msg)
+            if checkpoint:
+                checkpoint.close()
+            return False
+        finally:
+            self.pipeline_stats = {stage.name: stage.get_stats() for stage in (reader, parser, writer)}
+            for stage in (reader, parser, writer):
+                if stage.records:
+                    print(f'>>> Stage {stage.name}:')
+                    stage.timer.print_result()
+        self.delete_outdated()
+        if checkpoint:
+            checkpoint.remove()
         print('All the records have been rewritten.')
         return True
 
     print('Converter has imported.')
 
 
+class PipelineStage:
+    """
+    One stage of Converter.process_pipelined(): its output queue, a Timer of working and
+    waiting time, the number of records passed and the queue depth seen on every put.
+    receive() gets the output of the previous stage until the end of the source,
+    an exception of the previous stage is raised in the receiving one.
+    """
+    WORKING = 'working\t\t\t'
+    WAITING = 'waiting\t\t\t'
+
+    def __init__(self, name, output, stop):
+        self.name = name
+        self.output = output
+        self.stop = stop
+        self.timer = Timer()
+        self.records = 0
+        self.depth_sum = 0
+        self.depth_max = 0
+        self.puts = 0
+
+    def done(self, records_count):
+        self.timer.time_it(self.WORKING)
+        self.records += records_count
+
+    def put(self, item, records_count=0):
+        """ puts the item to the output queue waiting while it is full, returns False if the pipeline stopped """
+        self.done(records_count)
+        depth = self.output.qsize()
+        self.depth_sum += depth
+        self.depth_max = max(self.depth_max, depth)
+        self.puts += 1
+        while not self.stop.is_set():
+            try:
+                self.output.put(item, timeout=1)
+                break
+            except queue.Full:
+                continue
+        self.timer.time_it(self.WAITING)
+        return not self.stop.is_set()
+
+    def receive(self, previous_stage):
+        while not self.stop.is_set():
+            try:
+                item = previous_stage.output.get(timeout=1)
+            except queue.Empty:
+                continue
+            if item is None:
+                return
+            if isinstance(item, Exception):
+                raise item
+            self.timer.time_it(self.WAITING)
+            yield item
+
+    def get_stats(self):
+        working = self.timer.times_dict.get(self.WORKING, timezone.timedelta()).total_seconds()
+        stats = {
+            'records': self.records,
+            'working_seconds': round(working, 1),
+            'waiting_seconds': round(self.timer.times_dict.get(self.WAITING, timezone.timedelta()).total_seconds(), 1),
+            'records_per_second': round(self.records / working) if working else None,
+        }
+        if self.output:
+            stats['queue_depth_max'] = self.depth_max
+            stats['queue_depth_avg'] = round(self.depth_sum / self.puts, 2) if self.puts else 0
+        return stats
+
+
 class BulkCreateManager(object):  # https://www.caktusgroup.com/blog/2019/01/09/django-bulk-inserts/
     """
     This helper class keeps track of ORM objects to be created for multiple
@@ -293,3 +840,156 @@ class BulkCreateManager(object):  # https://www.caktusgroup.com/blog/2019/01/09/
         model_class = type(obj)
         model_key = model_class._meta.label
         self.queues[model_key].append(obj)
+
+
+class BulkUpdateManager(object):
+    """
+    This helper class keeps track of changed ORM objects and their changed fields
+    for multiple model classes, so the changes can be stored with one bulk_update
+    per model instead of a save() call per object.
+    Soft-deleted objects are updated too, so deleted_at can be cleared by the same flow.
+    """
+
+    def __init__(self):
+        self.queues = defaultdict(dict)
+        self.fields = defaultdict(set)
+
+    def add(self, obj, update_fields):
+        """
+        Add a changed object to the queue. 'updated_at' is set here because bulk_update
+        does not fill auto_now fields.
+        """
+        model_key = type(obj)._meta.label
+        obj.updated_at = timezone.now()
+        self.queues[model_key][obj.pk] = obj
+        self.fields[model_key].update(update_fields)
+        self.fields[model_key].add('updated_at')
+
+    def soft_delete(self, obj):
+        if not obj.deleted_at:
+            obj.deleted_at = timezone.now()
+            self.add(obj, ['deleted_at'])
+
+    def commit(self, model_class):
+        model_key = model_class._meta.label
+        objs = list(self.queues.pop(model_key, {}).values())
+        fields = self.fields.pop(model_key, set())
+        if not objs:
+            return
+        model_class.include_deleted_objects.bulk_update(objs, fields)
+        # keeping django-simple-history records as save() does
+        if hasattr(model_class, 'history'):
+            model_class.history.bulk_history_create(objs, update=True)
+
+
+class BulkCopyManager(object):
+    """
+    This helper class keeps rows to be stored for multiple model classes and loads them
+    with PostgreSQL COPY through a temporary staging table, without constructing ORM objects.
+    A row is a dict with field names (or attnames like 'company_id') as keys, or a tuple
+    with values in the order of field names given in 'fields' for the model label.
+    Fields missing in a row get their default value, auto_now/auto_now_add fields get current time.
+    """
+
+    def __init__(self, fields=None):
+        self.queues = defaultdict(list)
+        self.fields = fields or {}
+
+    def add(self, model_class, row):
+        self.queues[model_class._meta.label].append(row)
+
+    def commit(self, model_class, key_fields=None):
+        """
+        Stores all queued rows of the model and returns their ids in the order of adding.
+        Without key_fields all rows are inserted. With key_fields stored objects (including
+        soft-deleted) that match a row by these fields are updated with the fields given
+        in rows, other rows are inserted. Key fields should not contain NULL values.
+        """
+        model_key = model_class._meta.label
+        rows = self.queues.pop(model_key, [])
+        if not rows:
+            return []
+        field_names = self.fields.get(model_key)
+        rows = [row if isinstance(row, dict) else dict(zip(field_names, row)) for row in rows]
+        fields = [field for field in model_class._meta.concrete_fields if field is not model_class._meta.auto_field]
+        now = timezone.now()
+
+        def get_value(row, field):
+            if field.name in row:
+                value = row[field.name]
+            elif field.attname in row:
+                value = row[field.attname]
+            elif getattr(field, 'auto_now', False) or getattr(field, 'auto_now_add', False):
+                value = now
+            else:
+                # the same value as an unset field of a new model instance
+                value = field.get_default()
+            if isinstance(value, models.Model):
+                value = value.pk
+            if value is None:
+                return ''
+            # quoted empty string differs from NULL in CSV format of COPY
+            return '"' + str(value).replace('"', '""') + '"'
+
+        buffer = io.StringIO()
+        for row in rows:
+            buffer.write(','.join(get_value(row, field) for field in fields) + '\n')
+        buffer.seek(0)
+
+        qn = connection.ops.quote_name
+        table = qn(model_class._meta.db_table)
+        staging_table = qn(f'copy_{model_class._meta.db_table}')
+        pk = qn(model_class._meta.pk.column)
+        columns = ', '.join(qn(field.column) for field in fields)
+        staged_columns = ', '.join(f'staged.{qn(field.column)}' for field in fields)
+        ids = [None] * len(rows)
+        with transaction.atomic(), connection.cursor() as cursor:
+            cursor.execute(f'DROP TABLE IF EXISTS {staging_table}')
+            cursor.execute(f'CREATE TEMP TABLE {staging_table} AS SELECT {columns} FROM {table} WITH NO DATA')
+            cursor.execute(f'ALTER TABLE {staging_table} ADD COLUMN copy_row_number serial')
+            cursor.copy_expert(f'COPY {staging_table} ({columns}) FROM STDIN WITH (FORMAT csv)', buffer)
+            if not key_fields:
+                cursor.execute(
+                    f'INSERT INTO {table} ({columns}) SELECT {columns} FROM {staging_table} '
+                    f'ORDER BY copy_row_number RETURNING {pk}'
+                )
+                ids = [row[0] for row in cursor.fetchall()]
+            else:
+                key_columns = [qn(model_class._meta.get_field(name).column) for name in key_fields]
+                key_match = ' AND '.join(f'stored.{column} = staged.{column}' for column in key_columns)
+                update_columns = [
+                    qn(field.column) for field in fields
+                    if (field.name in rows[0] or field.attname in rows[0] or getattr(field, 'auto_now', False))
+                    and field.name not in key_fields and not getattr(field, 'auto_now_add', False)
+                ]
+                if update_columns:
+                    update_set = ', '.join(f'{column} = staged.{column}' for column in update_columns)
+                    cursor.execute(
+                        f'UPDATE {table} stored SET {update_set} FROM {staging_table} staged '
+                        f'WHERE {key_match} RETURNING staged.copy_row_number, stored.{pk}'
+                    )
+                else:
+                    cursor.execute(
+                        f'SELECT staged.copy_row_number, stored.{pk} FROM {table} stored '
+                        f'JOIN {staging_table} staged ON {key_match}'
+                    )
+                for row_number, object_id in cursor.fetchall():
+                    if ids[row_number - 1] is None or object_id < ids[row_number - 1]:
+                        ids[row_number - 1] = object_id
+                distinct_keys = ', '.join(f'staged.{column}' for column in key_columns)
+                returned_keys = ', '.join(key_columns)
+                inserted_match = ' AND '.join(f'inserted.{column} = staged.{column}' for column in key_columns)
+                cursor.execute(
+                    f'WITH inserted AS ('
+                    f'INSERT INTO {table} ({columns}) '
+                    f'SELECT DISTINCT ON ({distinct_keys}) {staged_columns} FROM {staging_table} staged '
+                    f'WHERE NOT EXISTS (SELECT 1 FROM {table} stored WHERE {key_match}) '
+                    f'ORDER BY {distinct_keys}, staged.copy_row_number '
+                    f'RETURNING {pk}, {returned_keys}) '
+                    f'SELECT staged.copy_row_number, inserted.{pk} FROM inserted '
+                    f'JOIN {staging_table} staged ON {inserted_match}'
+                )
+                for row_number, object_id in cursor.fetchall():
+                    ids[row_number - 1] = object_id
+            cursor.execute(f'DROP TABLE {staging_table}')
+        return ids
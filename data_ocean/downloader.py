@@ -1,15 +1,19 @@
 import codecs
+import hashlib
 import logging
 import os
+import re
 import subprocess
 import tempfile
 import zipfile
 from abc import ABC
+from concurrent.futures import ThreadPoolExecutor
 
 import requests
 from django.apps import apps
 from django.conf import settings
 from django.db import connections
+from django.db.models import Q
 from django.utils import timezone
 
 from data_ocean.models import Report, Register
@@ -19,13 +23,202 @@ logger = logging.getLogger(__name__)
 logger.setLevel(logging.INFO)
 
 
+class FileFetcher:
+    """
+    Downloads a file by HTTP into '<file_path>.part' and renames it after the size is checked.
+    A part file left by a failed download is resumed with a Range request on the next try,
+    only if the ETag or Last-Modified of the source, kept in '<file_path>.validator', is the same.
+    With threads > 1 and a server accepting ranges the file is fetched by that many
+    ranges in parallel, each into its own part file, which are joined at the end.
+    The sha256 checksum is computed while the data is written.
+    """
+    checksum_algorithm = 'sha256'
+
+    def __init__(self, url, file_path, chunk_size=16 * 1024 * 1024, threads=1,
+                 data=None, auth=None, headers=None):
+        self.url = url
+        self.file_path = file_path
+        self.chunk_size = chunk_size
+        self.threads = threads
+        self.data = data
+        self.auth = auth
+        self.headers = headers or {}
+        self.file_size = None
+        self.checksum = None
+        self.validator = None
+
+    def request(self, headers=None, method='get'):
+        return requests.request(method, self.url, data=self.data, auth=self.auth, stream=True,
+                                headers={**self.headers, **(headers or {})})
+
+    def get_part_path(self, index=None):
+        return f'{self.file_path}.part' if index is None else f'{self.file_path}.part{index}'
+
+    def get_validator_path(self):
+        return f'{self.file_path}.validator'
+
+    @staticmethod
+    def get_validator(response):
+        """ returns the strong ETag or Last-Modified of the source to resume part files with If-Range """
+        etag = response.headers.get('ETag')
+        if etag and not etag.startswith('W/'):
+            return etag
+        return response.headers.get('Last-Modified')
+
+    def read_validator(self):
+        if not os.path.isfile(self.get_validator_path()):
+            return None
+        with open(self.get_validator_path()) as f:
+            return f.read() or None
+
+    def write_validator(self, validator):
+        if validator:
+            with open(self.get_validator_path(), 'w') as f:
+                f.write(validator)
+        elif os.path.isfile(self.get_validator_path()):
+            os.remove(self.get_validator_path())
+
+    def hash_file(self, path, hasher):
+        with open(path, 'rb') as f:
+            for block in iter(lambda: f.read(self.chunk_size), b''):
+                hasher.update(block)
+
+    def fetch(self):
+        """ downloads the file, returns its size and checksum """
+        if self.threads > 1:
+            with self.request(method='head') as r:
+                r.raise_for_status()
+                total = int(r.headers.get('Content-Length') or 0)
+                accepts_ranges = r.headers.get('Accept-Ranges') == 'bytes'
+                validator = self.get_validator(r)
+            if accepts_ranges and total >= self.threads * self.chunk_size:
+                return self.fetch_ranges(total, validator)
+        return self.fetch_single()
+
+    def fetch_single(self):
+        part_path = self.get_part_path()
+        hasher = hashlib.new(self.checksum_algorithm)
+        offset = os.path.getsize(part_path) if os.path.isfile(part_path) else 0
+        validator = self.read_validator()
+        if offset and not validator:
+            # the part file can't be checked against the source, so it is not resumed
+            os.remove(part_path)
+            offset = 0
+        # the server sends the whole file instead of the range if the source has changed
+        with self.request({'Range': f'bytes={offset}-', 'If-Range': validator} if offset else None) as r:
+            if r.status_code == 416:
+                # the part file is already complete
+                self.hash_file(part_path, hasher)
+                total = self.get_total_from_content_range(r)
+                if total != offset:
+                    os.remove(part_path)
+                    raise requests.exceptions.RequestException(
+                        f'Error! Part file of {offset} bytes does not fit the file of {total} bytes.'
+                    )
+            else:
+                r.raise_for_status()
+                if r.status_code == 206:
+                    if self.get_start_from_content_range(r) != offset:
+                        os.remove(part_path)
+                        raise requests.exceptions.RequestException(
+                            f'Error! Range from {offset} bytes not served: {r.headers.get("Content-Range")}.'
+                        )
+                    self.hash_file(part_path, hasher)
+                    total = self.get_total_from_content_range(r)
+                    logger.info(f'Resuming download of {self.file_path} from {offset} bytes.')
+                else:
+                    # the source has changed or the server ignored Range, so the file is fetched from the start
+                    offset = 0
+                    total = int(r.headers['Content-Length']) if 'Content-Length' in r.headers else None
+                    self.write_validator(self.get_validator(r))
+                with open(part_path, 'ab' if offset else 'wb') as f:
+                    for chunk in r.iter_content(chunk_size=self.chunk_size):
+                        f.write(chunk)
+                        hasher.update(chunk)
+        size = os.path.getsize(part_path)
+        if total is not None and size != total:
+            if size > total:
+                os.remove(part_path)
+            raise requests.exceptions.RequestException(
+                f'Error! Bad file size after download: {size} bytes instead of {total}.'
+            )
+        os.replace(part_path, self.file_path)
+        self.write_validator(None)
+        self.file_size = size
+        self.checksum = hasher.hexdigest()
+        return self.file_size, self.checksum
+
+    def fetch_ranges(self, total, validator=None):
+        range_size = -(-total // self.threads)
+        ranges = [(start, min(start + range_size, total) - 1) for start in range(0, total, range_size)]
+        if not validator or validator != self.read_validator():
+            # part files of another version of the source or not checkable ones are not resumed
+            for index in range(len(ranges)):
+                if os.path.isfile(self.get_part_path(index)):
+                    os.remove(self.get_part_path(index))
+            self.write_validator(validator)
+        self.validator = validator
+        with ThreadPoolExecutor(max_workers=len(ranges)) as executor:
+            # list() re-raises the first error of the threads
+            list(executor.map(self.fetch_range, range(len(ranges)), ranges))
+        hasher = hashlib.new(self.checksum_algorithm)
+        part_path = self.get_part_path()
+        with open(part_path, 'wb') as f:
+            for index in range(len(ranges)):
+                with open(self.get_part_path(index), 'rb') as part:
+                    for block in iter(lambda: part.read(self.chunk_size), b''):
+                        f.write(block)
+                        hasher.update(block)
+        for index in range(len(ranges)):
+            os.remove(self.get_part_path(index))
+        os.replace(part_path, self.file_path)
+        self.write_validator(None)
+        self.file_size = total
+        self.checksum = hasher.hexdigest()
+        return self.file_size, self.checksum
+
+    def fetch_range(self, index, byte_range):
+        start, end = byte_range
+        part_path = self.get_part_path(index)
+        done = os.path.getsize(part_path) if os.path.isfile(part_path) else 0
+        if done > end - start + 1:
+            os.remove(part_path)
+            done = 0
+        if done == end - start + 1:
+            return
+        headers = {'Range': f'bytes={start + done}-{end}'}
+        if self.validator:
+            headers['If-Range'] = self.validator
+        with self.request(headers) as r:
+            r.raise_for_status()
+            # 200 - the source has changed during the download
+            if r.status_code != 206 or self.get_start_from_content_range(r) != start + done:
+                raise requests.exceptions.RequestException(f'Error! Range {start + done}-{end} not served.')
+            with open(part_path, 'ab') as f:
+                for chunk in r.iter_content(chunk_size=self.chunk_size):
+                    f.write(chunk)
+        if os.path.getsize(part_path) != end - start + 1:
+            raise requests.exceptions.RequestException(f'Error! Bad size of range {start}-{end} after download.')
+
+    @staticmethod
+    def get_start_from_content_range(response):
+        match = re.match(r'bytes (\d+)-', response.headers.get('Content-Range', ''))
+        return int(match.group(1)) if match else None
+
+    @staticmethod
+    def get_total_from_content_range(response):
+        match = re.search(r'/(\d+)$', response.headers.get('Content-Range', ''))
+        return int(match.group(1)) if match else None
+
+
 class Downloader(ABC):
     auth = None
     url = None
     data = {}
     headers = {}
     local_path = settings.LOCAL_FOLDER
-    chunk_size = 16 * 1024
+    chunk_size = settings.DOWNLOAD_CHUNK_SIZE
+    download_threads = settings.DOWNLOAD_THREADS
     stream = True
     reg_name = ''
     file_name = ''
@@ -103,6 +296,17 @@ class Downloader(ABC):
         logger.exception(f'{self.reg_name}: {msg}')
         raise Exception('Error!', msg)
 
+    def get_zipped_file_name(self):
+        """ finds the required file in the downloaded archive for reading it without unzipping """
+        self.is_zip_file()
+        for i in self.get_zip_filelist():
+            if self.unzip_required_file_sign in i:
+                self.report.unzip_file_name = i
+                self.report.unzip_status = True
+                self.report.save()
+                return i
+        self.no_req_sign()
+
     def unzip_source_file(self):
         self.is_zip_file()
         self.test_zip_file()
@@ -131,6 +335,15 @@ class Downloader(ABC):
         assert self.file_name
         return self.file_name
 
+    def update_search_vectors(self, model):
+        """Refreshes search vectors of the records changed by this update and of the ones not indexed yet."""
+        start_time = timezone.now()
+        updated = model.objects.filter(
+            Q(updated_at__gte=self.report.update_start) | Q(search_vector__isnull=True)
+        ).update_search_vectors()
+        logger.info(f'{self.reg_name}: search vectors of {updated} records of {model.__name__} '
+                    f'updated at {timezone.now() - start_time}')
+
     def vacuum_analyze(self, table_list=None):
         query = 'select count(*) from'
         query_optimize = 'vacuum analyze'
@@ -149,30 +362,23 @@ class Downloader(ABC):
         assert self.file_path
 
         start_time = timezone.now()
+        fetcher = FileFetcher(self.url, self.file_path, chunk_size=self.chunk_size, threads=self.download_threads,
+                              data=self.data, auth=self.auth, headers=self.get_headers())
         try:
-            with requests.get(self.url, data=self.data, stream=self.stream,
-                              auth=self.auth, headers=self.get_headers()) as r:
-                r.raise_for_status()
+            logger.info(f"{self.reg_name}: Start downloading: {self.file_path} ...")
+            # a part file of a failed download is kept and resumed by the next try
+            self.file_size, checksum = fetcher.fetch()
 
-                self.file_size = int(r.headers['Content-Length'])
-                logger.info(f"{self.reg_name}: Start downloading: {self.file_path}, size: {self.file_size} ...")
-                self.remove_file()
-                with open(self.file_path, 'wb') as f:
-                    for chunk in r.iter_content(chunk_size=self.chunk_size):
-                        f.write(chunk)
-                    f.flush()
+            logger.info(
+                f"{self.reg_name}: {self.file_path} ({self.file_size} bytes, {fetcher.checksum_algorithm} "
+                f"{checksum}) downloaded successfully at {timezone.now() - start_time}.")
 
-                if not self.file_size_is_correct():
-                    raise requests.exceptions.RequestException('Error! Bad file size after download.')
-
-                logger.info(
-                    f"{self.reg_name}: {self.file_path} downloaded successfully at {timezone.now() - start_time}.")
-
-                self.report.download_finish = timezone.now()
-                self.report.download_status = True
-                self.report.download_file_name = self.file_path
-                self.report.download_file_length = self.file_size
-                self.report.save()
+            self.report.download_finish = timezone.now()
+            self.report.download_status = True
+            self.report.download_file_name = self.file_path
+            self.report.download_file_length = self.file_size
+            self.report.download_checksum = checksum
+            self.report.save()
 
         except requests.exceptions.RequestException as e:
 
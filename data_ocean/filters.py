@@ -1,4 +1,11 @@
+import operator
+from functools import reduce
+
 import django_filters
+from django.conf import settings
+from django.contrib.postgres.search import SearchQuery, SearchRank
+from django.db.models import F, FloatField, Q
+from django.db.models.functions import Cast
 from django.utils.translation import ugettext_lazy as _
 from django.utils.text import format_lazy
 from django_filters.widgets import BooleanWidget
@@ -45,7 +52,48 @@ class RegisterFilter(django_filters.FilterSet):
         fields = ()
 
 
-class FullWordSearchFilter(SearchFilter):
+class RankedSearchFilter(SearchFilter):
+    """
+    Search for models with `search_vector_fields`. A row matches when its search_vector matches
+    the search string or when every search term is a part of one of the `search_fields`, as
+    with SearchFilter. Substring lookups are served by pg_trgm indexes and lookups through
+    relations are made by ids of the related rows, so the planner can combine indexes instead of a
+    sequential scan. Results are ordered by rank unless other ordering was requested.
+    """
+
+    def filter_queryset(self, request, queryset, view):
+        search_fields = self.get_search_fields(view, request)
+        search_terms = self.get_search_terms(request)
+        if (not search_fields or not search_terms
+                or not hasattr(queryset.model, 'search_vector_fields')):
+            return super().filter_queryset(request, queryset, view)
+
+        query = SearchQuery(' '.join(search_terms), config=settings.SEARCH_CONFIG)
+        terms_condition = reduce(operator.and_, (
+            reduce(operator.or_, (self.get_term_condition(queryset.model, field, term) for field in search_fields))
+            for term in search_terms
+        ))
+        queryset = queryset.filter(Q(search_vector=query) | terms_condition)
+        if not queryset.query.order_by:
+            # ts_rank() returns real, casting keeps the value exact for the cursor pagination
+            queryset = queryset.annotate(
+                search_rank=Cast(SearchRank(F('search_vector'), query), FloatField())
+            ).order_by('-search_rank', 'pk')
+        return queryset
+
+    def get_term_condition(self, model, field, term):
+        if '__' not in field:
+            return Q(**{f'{field}__icontains': term})
+        relation, field = field.split('__', 1)
+        related_model = model._meta.get_field(relation).related_model
+        # ids are fetched beforehand, `IN (SELECT ...)` under OR is a filter the indexes can't serve
+        related_ids = related_model._default_manager.filter(
+            self.get_term_condition(related_model, field, term)
+        ).values_list('pk', flat=True)
+        return Q(**{f'{relation}__in': list(related_ids)})
+
+
+class FullWordSearchFilter(RankedSearchFilter):
     def get_search_terms(self, request):
         params = request.query_params.get(self.search_param, '')
         params = params.replace('\x00', '')
@@ -0,0 +1,23 @@
+# Generated by Django 3.1.8 on 2021-06-01 10:00
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('data_ocean', '0028_register_name_in_daily_report'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='report',
+            name='download_file_length',
+            field=models.PositiveBigIntegerField(blank=True, default=0),
+        ),
+        migrations.AddField(
+            model_name='report',
+            name='download_checksum',
+            field=models.CharField(blank=True, max_length=64, null=True),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 3.1.8 on 2021-06-03 12:00
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('data_ocean', '0029_report_download_checksum'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='report',
+            name='converter_stats',
+            field=models.JSONField(blank=True, null=True),
+        ),
+    ]
@@ -0,0 +1,26 @@
+# Generated by Django 3.1.8 on 2021-06-07 11:20
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('data_ocean', '0030_report_converter_stats'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ImportedRecordHash',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('converter', models.CharField(max_length=50)),
+                ('object_id', models.PositiveIntegerField()),
+                ('hash', models.CharField(max_length=32)),
+            ],
+            options={
+                'unique_together': {('converter', 'object_id')},
+                'index_together': {('converter', 'hash')},
+            },
+        ),
+    ]
@@ -1,11 +1,80 @@
-from django.db import models, connection
-from django.db.models import Max
+import operator
+from functools import reduce
+
+from django.conf import settings
+from django.contrib.postgres.search import SearchVector
+from django.db import models, connection, transaction
+from django.db.models import Max, Min
 from django.urls import resolve
 from django.utils import timezone
 from django.utils.translation import gettext_lazy as _
 
 
-class DataOceanManager(models.Manager):
+class DataOceanQuerySet(models.QuerySet):
+    def soft_delete(self):
+        """
+        Soft-deletes all objects of the queryset with one UPDATE instead of a save() per object.
+        For models with django-simple-history the historical records are inserted
+        by one INSERT ... SELECT, as instance.soft_delete() does.
+        Returns the number of soft-deleted objects.
+        """
+        now = timezone.now()
+        pks = self.filter(deleted_at__isnull=True).order_by().values('pk')
+        with transaction.atomic(using=self.db):
+            if getattr(self.model._meta, 'simple_history_manager_attribute', None):
+                self._insert_soft_delete_history(pks, now)
+            return self.model._base_manager.using(self.db).filter(
+                pk__in=pks
+            ).update(deleted_at=now, updated_at=now)
+
+    def _insert_soft_delete_history(self, pks, now):
+        qn = connection.ops.quote_name
+        history_model = getattr(self.model, self.model._meta.simple_history_manager_attribute).model
+        fields = {field.attname: field for field in self.model._meta.concrete_fields}
+        columns = []
+        values = []
+        params = []
+        for history_field in history_model._meta.concrete_fields:
+            attname = history_field.attname
+            if attname in ('deleted_at', 'updated_at', 'history_date', 'history_type'):
+                values.append('%s')
+                params.append('~' if attname == 'history_type' else now)
+            elif attname in fields:
+                values.append(qn(fields[attname].column))
+            else:
+                continue
+            columns.append(qn(history_field.column))
+        pks_sql, pks_params = pks.query.sql_with_params()
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f'INSERT INTO {qn(history_model._meta.db_table)} ({", ".join(columns)}) '
+                f'SELECT {", ".join(values)} FROM {qn(self.model._meta.db_table)} '
+                f'WHERE {qn(self.model._meta.pk.column)} IN ({pks_sql})',
+                params + list(pks_params)
+            )
+
+    def update_search_vectors(self, batch_size=100000):
+        """
+        Fills the search_vector column from the model's `search_vector_fields` by UPDATEs over
+        ranges of ids, so a full register is not rewritten in one long transaction.
+        Returns the number of updated objects.
+        """
+        vector = reduce(operator.add, (
+            SearchVector(field, weight=weight, config=settings.SEARCH_CONFIG)
+            for field, weight in self.model.search_vector_fields
+        ))
+        bounds = self.aggregate(first_id=Min('pk'), last_id=Max('pk'))
+        if bounds['first_id'] is None:
+            return 0
+        updated = 0
+        for start_id in range(bounds['first_id'], bounds['last_id'] + 1, batch_size):
+            updated += self.filter(
+                pk__gte=start_id, pk__lt=start_id + batch_size
+            ).update(search_vector=vector)
+        return updated
+
+
+class DataOceanManager(models.Manager.from_queryset(DataOceanQuerySet)):
     # exclude soft-deleted objects from queryset
     def get_queryset(self):
         return super().get_queryset().exclude(deleted_at__isnull=False)
@@ -23,7 +92,7 @@ class DataOceanModel(models.Model):
     deleted_at = models.DateTimeField(null=True, blank=True, default=None, editable=False, db_index=True)
 
     objects = DataOceanManager()
-    include_deleted_objects = models.Manager()
+    include_deleted_objects = DataOceanQuerySet.as_manager()
 
     @property
     def is_deleted(self):
@@ -110,6 +179,17 @@ class Register(DataOceanModel):
         verbose_name_plural = _('datasets')
 
 
+class ImportedRecordHash(models.Model):
+    # hashes of source records of the previous import used by delta imports of converters
+    converter = models.CharField(max_length=50)
+    object_id = models.PositiveIntegerField()
+    hash = models.CharField(max_length=32)
+
+    class Meta:
+        unique_together = [('converter', 'object_id')]
+        index_together = [('converter', 'hash')]
+
+
 class Report(DataOceanModel):
     registry_name = models.CharField(max_length=20, db_index=True)
     download_start = models.DateTimeField(auto_now_add=True)
@@ -117,7 +197,8 @@ class Report(DataOceanModel):
     download_status = models.BooleanField(blank=True, default=False)
     download_message = models.CharField(max_length=255, null=True, blank=True)
     download_file_name = models.CharField(max_length=255, null=True, blank=True)
-    download_file_length = models.PositiveIntegerField(blank=True, default=0)
+    download_file_length = models.PositiveBigIntegerField(blank=True, default=0)
+    download_checksum = models.CharField(max_length=64, null=True, blank=True)
 
     unzip_file_name = models.CharField(max_length=255, null=True, blank=True)
     unzip_file_arch_length = models.PositiveIntegerField(blank=True, default=0)
@@ -130,6 +211,7 @@ class Report(DataOceanModel):
     update_status = models.BooleanField(blank=True, default=False)
     update_message = models.CharField(max_length=300, null=True, blank=True)
     long_time_converter = models.BooleanField(blank=True, default=False)
+    converter_stats = models.JSONField(null=True, blank=True)
 
     records_added = models.IntegerField(blank=True, default=0)
     records_changed = models.IntegerField(blank=True, default=0)
@@ -1,3 +1,4 @@
+import json
 import os
 from django.conf import settings
 
@@ -28,3 +29,71 @@ class Savepoint:
 
     def close(self):
         self.file.close()
+
+
+class Checkpoint:
+    """
+    Keeps the position in the source file after every committed chunk of records,
+    so an interrupted import can be continued from the last committed chunk.
+    Every line of the file is a JSON with the source file name and version (e.g. its size and
+    modification time), the offset and the index of the next record and the bookkeeping state of the chunk.
+    """
+
+    def __init__(self, name: str):
+        file_dir = os.path.join(settings.BASE_DIR, 'save_points')
+        os.makedirs(file_dir, exist_ok=True)
+        self.file_path = os.path.join(file_dir, f'{name}.checkpoint')
+        self.file_name = None
+        self.source_version = None
+        self.offset = 0
+        self.index = 0
+        self.states = []
+        if os.path.exists(self.file_path):
+            with open(self.file_path, 'r') as file:
+                for line in file:
+                    try:
+                        point = json.loads(line)
+                    except ValueError:
+                        # the last line was not written completely
+                        break
+                    self.file_name = point['file_name']
+                    self.source_version = point.get('source_version')
+                    self.offset = point['offset']
+                    self.index = point['index']
+                    self.states.append(point['state'])
+        self.file = None
+
+    def is_for(self, file_name, source_version):
+        return (self.file_name is not None and self.file_name == file_name
+                and self.source_version is not None and self.source_version == source_version)
+
+    def add(self, file_name, offset, index, state=None, source_version=None):
+        if not self.file:
+            self.file = open(self.file_path, 'a')
+        self.file.write(json.dumps({
+            'file_name': file_name,
+            'source_version': source_version,
+            'offset': offset,
+            'index': index,
+            'state': state,
+        }) + '\n')
+        self.file.flush()
+        self.file_name = file_name
+        self.source_version = source_version
+        self.offset = offset
+        self.index = index
+
+    def remove(self):
+        self.close()
+        if os.path.exists(self.file_path):
+            os.remove(self.file_path)
+        self.file_name = None
+        self.source_version = None
+        self.offset = 0
+        self.index = 0
+        self.states = []
+
+    def close(self):
+        if self.file:
+            self.file.close()
+            self.file = None
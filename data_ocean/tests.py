@@ -1,5 +1,23 @@
-from django.test import SimpleTestCase
+import base64
+import datetime
+import hashlib
+import json
+import os
+import re
+import tempfile
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
 
+from django.test import SimpleTestCase, TestCase, override_settings
+from rest_framework import generics, serializers
+from rest_framework.exceptions import ValidationError
+from rest_framework.test import APIRequestFactory
+
+from data_converter.pagination import CachedCountPagination
+from data_ocean.converter import BulkCopyManager
+from data_ocean.downloader import FileFetcher
+from data_ocean.models import Authority, Register
+from data_ocean.throttling import RateLimit, SlidingWindowRateLimiter
 from data_ocean.transliteration.utils import transliterate, translate_company_type_in_string,\
     translate_country_in_string, translate_last_position_in_string
 
@@ -150,3 +168,223 @@ class TransliterateTestCase(SimpleTestCase):
         )
         for tested, expected in variants:
             self.assertEqual(transliterate(translate_last_position_in_string(tested)), expected)
+
+
+class RangeRequestHandler(BaseHTTPRequestHandler):
+    content = os.urandom(100 * 1024 + 7)
+    etag = '"v1"'
+    range_headers = []
+
+    def send_content_headers(self):
+        match = re.match(r'bytes=(\d+)-(\d*)$', self.headers.get('Range', ''))
+        if_range = self.headers.get('If-Range')
+        if not match or (if_range and if_range != self.etag):
+            self.send_response(200)
+            self.send_header('Content-Length', str(len(self.content)))
+            self.send_header('Accept-Ranges', 'bytes')
+            self.send_header('ETag', self.etag)
+            self.end_headers()
+            return self.content
+        self.range_headers.append(self.headers['Range'])
+        start = int(match.group(1))
+        end = int(match.group(2)) if match.group(2) else len(self.content) - 1
+        if start >= len(self.content):
+            self.send_response(416)
+            self.send_header('Content-Range', f'bytes */{len(self.content)}')
+            self.end_headers()
+            return b''
+        self.send_response(206)
+        self.send_header('ETag', self.etag)
+        self.send_header('Content-Length', str(end - start + 1))
+        self.send_header('Content-Range', f'bytes {start}-{end}/{len(self.content)}')
+        self.end_headers()
+        return self.content[start:end + 1]
+
+    def do_HEAD(self):
+        self.send_content_headers()
+
+    def do_GET(self):
+        self.wfile.write(self.send_content_headers())
+
+    def log_message(self, format, *args):
+        pass
+
+
+class FileFetcherTestCase(SimpleTestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.server = ThreadingHTTPServer(('127.0.0.1', 0), RangeRequestHandler)
+        threading.Thread(target=cls.server.serve_forever, daemon=True).start()
+        cls.url = f'http://127.0.0.1:{cls.server.server_port}/file.zip'
+        cls.checksum = hashlib.sha256(RangeRequestHandler.content).hexdigest()
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.server.shutdown()
+        cls.server.server_close()
+        super().tearDownClass()
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.file_path = os.path.join(self.directory.name, 'file.zip')
+        RangeRequestHandler.range_headers = []
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def assertFetched(self, fetcher):
+        self.assertEqual(fetcher.fetch(), (len(RangeRequestHandler.content), self.checksum))
+        with open(self.file_path, 'rb') as f:
+            self.assertEqual(f.read(), RangeRequestHandler.content)
+        self.assertEqual(os.listdir(self.directory.name), ['file.zip'])
+
+    def test_fetch(self):
+        self.assertFetched(FileFetcher(self.url, self.file_path, chunk_size=4096))
+        self.assertEqual(RangeRequestHandler.range_headers, [])
+
+    def write_part_file(self, suffix, content, etag=RangeRequestHandler.etag):
+        with open(self.file_path + suffix, 'wb') as f:
+            f.write(content)
+        with open(self.file_path + '.validator', 'w') as f:
+            f.write(etag)
+
+    def test_resume_part_file(self):
+        self.write_part_file('.part', RangeRequestHandler.content[:5000])
+        self.assertFetched(FileFetcher(self.url, self.file_path, chunk_size=4096))
+        self.assertEqual(RangeRequestHandler.range_headers, ['bytes=5000-'])
+
+    def test_complete_part_file(self):
+        self.write_part_file('.part', RangeRequestHandler.content)
+        self.assertFetched(FileFetcher(self.url, self.file_path, chunk_size=4096))
+
+    def test_part_file_of_changed_source(self):
+        self.write_part_file('.part', os.urandom(5000), etag='"v0"')
+        self.assertFetched(FileFetcher(self.url, self.file_path, chunk_size=4096))
+
+    def test_part_file_without_validator(self):
+        with open(self.file_path + '.part', 'wb') as f:
+            f.write(os.urandom(5000))
+        self.assertFetched(FileFetcher(self.url, self.file_path, chunk_size=4096))
+        self.assertEqual(RangeRequestHandler.range_headers, [])
+
+    def test_fetch_ranges(self):
+        self.write_part_file('.part1', RangeRequestHandler.content[25602:26000])
+        self.assertFetched(FileFetcher(self.url, self.file_path, chunk_size=4096, threads=4))
+        self.assertEqual(sorted(RangeRequestHandler.range_headers), [
+            'bytes=0-25601', 'bytes=26000-51203', 'bytes=51204-76805', 'bytes=76806-102406',
+        ])
+
+    def test_fetch_ranges_of_changed_source(self):
+        self.write_part_file('.part1', os.urandom(398), etag='"v0"')
+        self.assertFetched(FileFetcher(self.url, self.file_path, chunk_size=4096, threads=4))
+        self.assertEqual(len(RangeRequestHandler.range_headers), 4)
+
+
+class KeysetCursorTestCase(SimpleTestCase):
+    def setUp(self):
+        self.pagination = CachedCountPagination()
+        self.pagination.ordering = [('updated_at', True), ('id', False)]
+
+    def test_encode_decode_cursor(self):
+        position = [datetime.datetime(2021, 3, 4, 5, 6, 7), 15]
+        cursor = self.pagination.encode_cursor(position)
+        self.assertEqual(self.pagination.decode_cursor(cursor), ['2021-03-04T05:06:07', 15])
+        self.assertIsNone(self.pagination.decode_cursor(''))
+
+    def test_malformed_cursor(self):
+        cursors = (
+            'not a cursor',
+            base64.urlsafe_b64encode(b'{not json').decode(),
+            base64.urlsafe_b64encode(json.dumps({'id': 15}).encode()).decode(),
+            base64.urlsafe_b64encode(json.dumps([15]).encode()).decode(),
+        )
+        for cursor in cursors:
+            with self.subTest(cursor=cursor), self.assertRaises(ValidationError) as cm:
+                self.pagination.decode_cursor(cursor)
+            self.assertEqual(cm.exception.status_code, 400)
+            self.assertEqual(cm.exception.detail, {'cursor': ['Invalid cursor']})
+
+    def test_malformed_cursor_response(self):
+        class RegisterSerializer(serializers.ModelSerializer):
+            class Meta:
+                model = Register
+                fields = ('id',)
+
+        view = generics.ListAPIView.as_view(
+            queryset=Register.objects.all(),
+            serializer_class=RegisterSerializer,
+            pagination_class=CachedCountPagination,
+            permission_classes=(),
+            authentication_classes=(),
+        )
+        response = view(APIRequestFactory().get('/', {'cursor': 'not a cursor'}))
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.data, {'cursor': ['Invalid cursor']})
+
+
+class SlidingWindowRateLimiterTestCase(SimpleTestCase):
+    def test_hit_local(self):
+        limiter = SlidingWindowRateLimiter()
+        self.assertEqual(limiter.hit_local('key', 2, 60, 100.0), RateLimit(True, 1, 0.0))
+        self.assertEqual(limiter.hit_local('key', 2, 60, 110.0), RateLimit(True, 0, 0.0))
+        # waits until the first hit leaves the window
+        self.assertEqual(limiter.hit_local('key', 2, 60, 130.0), RateLimit(False, 0, 30.0))
+        self.assertEqual(limiter.hit_local('key', 2, 60, 159.5), RateLimit(False, 0, 0.5))
+        self.assertEqual(limiter.hit_local('key', 2, 60, 160.0), RateLimit(True, 0, 0.0))
+        self.assertEqual(limiter.hit_local('key', 2, 60, 165.0), RateLimit(False, 0, 5.0))
+        # rejected hits are not counted
+        self.assertEqual(limiter.hit_local('key', 2, 60, 170.0), RateLimit(True, 0, 0.0))
+        self.assertEqual(limiter.hit_local('key', 2, 60, 175.0), RateLimit(False, 0, 45.0))
+        self.assertEqual(limiter.hit_local('other', 2, 60, 170.0), RateLimit(True, 1, 0.0))
+
+    def test_hit_local_zero_limit(self):
+        limiter = SlidingWindowRateLimiter()
+        self.assertEqual(limiter.hit_local('key', 0, 60, 100.0), RateLimit(False, 0, 60))
+
+    @override_settings(CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}})
+    def test_hit_without_redis(self):
+        limiter = SlidingWindowRateLimiter()
+        self.assertTrue(limiter.hit('key', 1, 60).allowed)
+        rate_limit = limiter.hit('key', 1, 60)
+        self.assertFalse(rate_limit.allowed)
+        self.assertTrue(0 < rate_limit.retry_after <= 60)
+
+
+class BulkCopyManagerTestCase(TestCase):
+    def test_insert(self):
+        manager = BulkCopyManager(fields={'data_ocean.Authority': ('name', 'code')})
+        manager.add(Authority, {'name': 'first', 'code': '1'})
+        manager.add(Authority, ('second', None))
+        manager.add(Authority, {'name': 'with "quotes", commas\nand lines'})
+        ids = manager.commit(Authority)
+
+        authorities = Authority.objects.in_bulk(ids)
+        self.assertEqual([(authorities[pk].name, authorities[pk].code) for pk in ids], [
+            ('first', '1'),
+            ('second', None),
+            ('with "quotes", commas\nand lines', None),
+        ])
+        self.assertIsNotNone(authorities[ids[0]].created_at)
+        self.assertIsNone(authorities[ids[0]].deleted_at)
+        self.assertEqual(manager.commit(Authority), [])
+
+    def test_upsert(self):
+        stored = Authority.objects.create(name='stored', code='1')
+        deleted = Authority.objects.create(name='deleted', code='2')
+        deleted.soft_delete()
+        manager = BulkCopyManager()
+        manager.add(Authority, {'name': 'new', 'code': '3'})
+        manager.add(Authority, {'name': 'stored', 'code': '4'})
+        manager.add(Authority, {'name': 'deleted', 'code': '5'})
+        manager.add(Authority, {'name': 'new', 'code': '3'})
+        ids = manager.commit(Authority, key_fields=['name'])
+
+        new = Authority.objects.get(name='new')
+        self.assertEqual(ids, [new.id, stored.id, deleted.id, new.id])
+        self.assertEqual(Authority.include_deleted_objects.count(), 3)
+        stored.refresh_from_db()
+        self.assertEqual(stored.code, '4')
+        deleted.refresh_from_db()
+        self.assertEqual(deleted.code, '5')
+        self.assertIsNotNone(deleted.deleted_at)
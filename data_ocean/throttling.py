@@ -0,0 +1,132 @@
+import logging
+import threading
+import time
+import uuid
+from collections import deque, namedtuple
+
+from django.conf import settings
+from rest_framework.throttling import BaseThrottle
+
+logger = logging.getLogger(__name__)
+
+RateLimit = namedtuple('RateLimit', ('allowed', 'remaining', 'retry_after'))
+
+# removes hits older than the window and adds the hit if the limit is not reached, atomically
+SLIDING_WINDOW_SCRIPT = """
+local now = tonumber(ARGV[1])
+local window = tonumber(ARGV[2])
+local limit = tonumber(ARGV[3])
+redis.call('ZREMRANGEBYSCORE', KEYS[1], '-inf', now - window)
+local count = redis.call('ZCARD', KEYS[1])
+if count < limit then
+    redis.call('ZADD', KEYS[1], now, ARGV[4])
+    redis.call('PEXPIRE', KEYS[1], math.ceil(window * 1000))
+    return {1, limit - count - 1, '0'}
+end
+local oldest = redis.call('ZRANGE', KEYS[1], 0, 0, 'WITHSCORES')
+local retry_after = window
+if oldest[2] then
+    retry_after = tonumber(oldest[2]) + window - now
+end
+return {0, 0, tostring(retry_after)}
+"""
+
+
+class SlidingWindowRateLimiter:
+    """
+    Allows `limit` hits of a key during any `window` seconds. The hits are kept in sorted sets of
+    the Redis 'counts' cache shared by all processes, without it - in the memory of the process.
+    Retry-After of a rejected hit is the time until the oldest hit of the window expires.
+    """
+    def __init__(self):
+        # key -> deque of hit times, used without Redis
+        self.hits = {}
+        self.lock = threading.Lock()
+        self.script = None
+
+    @staticmethod
+    def get_redis():
+        if 'django_redis' not in settings.CACHES.get('counts', {}).get('BACKEND', ''):
+            return None
+        from django_redis import get_redis_connection
+        return get_redis_connection('counts')
+
+    def hit_redis(self, redis, key, limit, window, now):
+        if self.script is None:
+            self.script = redis.register_script(SLIDING_WINDOW_SCRIPT)
+        allowed, remaining, retry_after = self.script(
+            keys=[f'rate_limit:{key}'],
+            args=[now, window, limit, f'{now}:{uuid.uuid4().hex}'],
+        )
+        return RateLimit(bool(allowed), int(remaining), float(retry_after))
+
+    def hit_local(self, key, limit, window, now):
+        with self.lock:
+            hits = self.hits.setdefault(key, deque())
+            while hits and hits[0] <= now - window:
+                hits.popleft()
+            if len(hits) < limit:
+                hits.append(now)
+                return RateLimit(True, limit - len(hits), 0.0)
+            retry_after = hits[0] + window - now if hits else window
+            return RateLimit(False, 0, retry_after)
+
+    def hit(self, key, limit, window=60):
+        """Counts a hit of the key, returns RateLimit(allowed, remaining, retry_after)."""
+        now = time.time()
+        redis = self.get_redis()
+        rate_limit = None
+        if redis is not None:
+            try:
+                rate_limit = self.hit_redis(redis, key, limit, window, now)
+            except Exception:
+                logger.exception(f'Rate limit of {key} was not checked in Redis')
+        if rate_limit is None:
+            rate_limit = self.hit_local(key, limit, window, now)
+        if not rate_limit.allowed:
+            logger.info(f'Rate limit of {key} exceeded: {limit} per {window}s, '
+                        f'retry after {rate_limit.retry_after:.1f}s')
+        return rate_limit
+
+
+rate_limiter = SlidingWindowRateLimiter()
+
+
+class SlidingWindowThrottle(BaseThrottle):
+    """
+    Base throttle of the rate_limiter. Subclasses set `scope` and `window` and return the limit
+    and the key of the request, a limit of None means the request is not throttled.
+    """
+    scope = None
+    window = 60
+
+    def get_limit(self, request, view):
+        raise NotImplementedError('.get_limit() must be overridden')
+
+    def get_key(self, request, view):
+        raise NotImplementedError('.get_key() must be overridden')
+
+    def allow_request(self, request, view):
+        limit = self.get_limit(request, view)
+        if limit is None:
+            self.rate_limit = None
+            return True
+        key = f'{self.scope}:{self.get_key(request, view)}'
+        self.rate_limit = rate_limiter.hit(key, limit, self.window)
+        return self.rate_limit.allowed
+
+    def wait(self):
+        if self.rate_limit is None:
+            return None
+        return self.rate_limit.retry_after
+
+
+class XlsxExportThrottle(SlidingWindowThrottle):
+    scope = 'xlsx_export'
+    window = 60 * 60
+
+    def get_limit(self, request, view):
+        return settings.XLSX_EXPORTS_PER_HOUR
+
+    def get_key(self, request, view):
+        return request.user.id
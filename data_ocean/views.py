@@ -1,7 +1,11 @@
+import itertools
+import re
 from collections import OrderedDict
 
-from django.views.decorators.cache import cache_page
+from django.core.exceptions import FieldDoesNotExist, ValidationError as DjangoValidationError
+from django.http import StreamingHttpResponse
 from django.utils.decorators import method_decorator
+from django.utils.translation import gettext_lazy as _
 from drf_dynamic_fields import DynamicFieldsMixin
 from drf_yasg.generators import OpenAPISchemaGenerator, EndpointEnumerator
 from drf_yasg.inspectors import SwaggerAutoSchema
@@ -9,10 +13,14 @@ from drf_yasg.openapi import Schema, SchemaRef
 from drf_yasg.utils import swagger_auto_schema
 from drf_yasg.views import get_schema_view
 from drf_yasg import openapi
-from rest_framework import permissions, viewsets
+from rest_framework import permissions, serializers, viewsets
+from rest_framework.decorators import action
+from rest_framework.exceptions import PermissionDenied, ValidationError
 from rest_framework.generics import GenericAPIView
+from rest_framework.renderers import JSONRenderer
 from rest_framework.response import Response
 from django.conf import settings
+from data_ocean.cache import cache_by_data_version
 from data_ocean.filters import RegisterFilter
 from data_ocean.models import Register
 from rest_framework.filters import SearchFilter
@@ -25,21 +33,212 @@ import lxml.etree as etree
 
 
 class CachedViewMixin:
-    @method_decorator(cache_page(settings.CACHE_MIDDLEWARE_SECONDS))
+    # registers of the returned data, see data_ocean.cache.cache_by_data_version
+    cache_registers = ()
+
+    @cache_by_data_version
     def get(self, request, *args, **kwargs):
         return super().get(request, *args, **kwargs)
 
 
 class CachedViewSetMixin:
-    @method_decorator(cache_page(settings.CACHE_MIDDLEWARE_SECONDS))
+    # registers of the returned data, see data_ocean.cache.cache_by_data_version
+    cache_registers = ()
+
+    @cache_by_data_version
     def list(self, request, *args, **kwargs):
         return super().list(request, *args, **kwargs)
 
-    @method_decorator(cache_page(settings.CACHE_MIDDLEWARE_SECONDS))
+    @cache_by_data_version
     def retrieve(self, request, *args, **kwargs):
         return super().retrieve(request, *args, **kwargs)
 
 
+class DynamicFieldsQuerysetMixin:
+    """
+    Plans select_related/prefetch_related of the queryset by the fields of a DynamicFieldsMixin
+    serializer, so relations are loaded only for the fields requested with ?fields= or ?omit=,
+    and only their columns are selected. Source paths of the serializer fields are followed
+    through the model, nested serializers included. Method fields and model properties are
+    resolved by `field_dependencies`; with any other unknown field the queryset is kept as is.
+    """
+    # serializer field name -> lookups of the model it reads, e.g. {'is_closed': ['status']}
+    field_dependencies = {}
+    planned_actions = ('list', 'retrieve')
+
+    def get_prefetches(self):
+        """
+        Returns Prefetch objects to use for the planned lookups with the same path,
+        e.g. with querysets filtered by query parameters of the request.
+        """
+        return []
+
+    def get_queryset(self):
+        queryset = super().get_queryset()
+        if getattr(self, 'swagger_fake_view', False) or self.action not in self.planned_actions:
+            return queryset
+        serializer = self.get_serializer()
+        if not isinstance(serializer, DynamicFieldsMixin):
+            return queryset
+        paths = set()
+        for name, field in serializer.fields.items():
+            if name in self.field_dependencies:
+                paths.update(tuple(lookup.split('__')) for lookup in self.field_dependencies[name])
+                continue
+            field_paths = self.get_field_paths(field, queryset.model)
+            if field_paths is None:
+                return queryset
+            paths.update(field_paths)
+        restrict_columns = bool({'fields', 'omit'} & set(self.request.query_params))
+        return self.plan_queryset(queryset, paths, restrict_columns, self.get_prefetches())
+
+    def get_field_paths(self, field, model):
+        """Returns the set of model field paths read by the serializer field or None if unknown."""
+        if field.source == '*':
+            return None
+        path = ()
+        model_field = None
+        for attr in field.source.split('.'):
+            display_method = re.fullmatch(r'get_(\w+)_display', attr)
+            if display_method:
+                attr = display_method.group(1)
+            try:
+                model_field = model._meta.get_field(attr)
+            except FieldDoesNotExist:
+                return None
+            if isinstance(field, serializers.PrimaryKeyRelatedField) and model_field.concrete:
+                # only the foreign key column is read
+                return {path + (model_field.attname,)}
+            path += (attr,)
+            if not model_field.is_relation:
+                return {path}
+            model = model_field.related_model
+        paths = {path}
+        nested = getattr(field, 'child', field)
+        if isinstance(nested, serializers.BaseSerializer):
+            # columns of related objects are not restricted, so unknown nested fields are skipped
+            for nested_field in nested.fields.values():
+                paths.update(path + nested_path for nested_path in self.get_field_paths(nested_field, model) or ())
+        return paths
+
+    @staticmethod
+    def plan_queryset(queryset, paths, restrict_columns, prefetches=()):
+        model = queryset.model
+        columns = {model._meta.pk.name}
+        select_related = set()
+        prefetch_related = set()
+        for path in paths:
+            current_model = model
+            many = False
+            for i, attr in enumerate(path):
+                model_field = current_model._meta.get_field(attr)
+                if i == 0 and model_field.concrete:
+                    columns.add(model_field.name)
+                if not model_field.is_relation or attr == getattr(model_field, 'attname', None) != model_field.name:
+                    break
+                many = many or model_field.one_to_many or model_field.many_to_many
+                lookup = '__'.join(path[:i + 1])
+                (prefetch_related if many else select_related).add(lookup)
+                current_model = model_field.related_model
+
+        # keeping custom Prefetch objects of the queryset and the view for the planned lookups
+        existing_prefetches = {
+            getattr(lookup, 'prefetch_to', lookup): lookup
+            for lookup in (*queryset._prefetch_related_lookups, *prefetches)
+        }
+        queryset = queryset.select_related(None).prefetch_related(None)
+        if select_related:
+            queryset = queryset.select_related(*sorted(select_related))
+        if prefetch_related:
+            queryset = queryset.prefetch_related(*(
+                existing_prefetches.get(lookup, lookup) for lookup in sorted(prefetch_related)
+            ))
+        if restrict_columns:
+            queryset = queryset.only(*columns)
+        return queryset
+
+
+def batch_request_schema(*identifiers):
+    """Request body of BatchLookupMixin.batch for the swagger docs."""
+    return openapi.Schema(
+        type=openapi.TYPE_OBJECT,
+        description=f'One of the identifiers with a list of up to {settings.BATCH_LOOKUP_MAX_SIZE} values',
+        properties={
+            identifier: openapi.Schema(type=openapi.TYPE_ARRAY, items=openapi.Schema(type=openapi.TYPE_STRING))
+            for identifier in identifiers
+        },
+    )
+
+
+class BatchLookupMixin:
+    """
+    Adds POST <list url>/batch/ to get the objects of up to settings.BATCH_LOOKUP_MAX_SIZE
+    identifiers in one request, e.g. {"edrpou": ["00032129", "00032134"]}. Objects are loaded
+    by __in queries in chunks with the prefetch plan of the view queryset, and the JSON list
+    is streamed while the chunks are serialized. Identifiers without an object are skipped.
+    With settings.BATCH_LOOKUP_COUNT_PER_ITEM every identifier of an existing object counts as a request of the project.
+    """
+    # key of the request body -> model field, e.g. {'edrpou': 'edrpou'}
+    batch_lookup_fields = {}
+
+    def get_batch_lookup(self, data, model):
+        if not isinstance(data, dict) or len(data) != 1:
+            raise ValidationError(_('Send one of the identifiers: {}').format(', '.join(self.batch_lookup_fields)))
+        key, values = next(iter(data.items()))
+        if key not in self.batch_lookup_fields:
+            raise ValidationError(_('Send one of the identifiers: {}').format(', '.join(self.batch_lookup_fields)))
+        if not isinstance(values, list) or not all(isinstance(value, (str, int)) for value in values):
+            raise ValidationError({key: _('Send a list of values')})
+        if len(values) > settings.BATCH_LOOKUP_MAX_SIZE:
+            raise ValidationError({
+                key: _('Too many values, the limit is {}').format(settings.BATCH_LOOKUP_MAX_SIZE)
+            })
+        field = self.batch_lookup_fields[key]
+        model_field = model._meta.get_field(field)
+        try:
+            values = list(dict.fromkeys(model_field.to_python(str(value)) for value in values))
+        except DjangoValidationError as e:
+            raise ValidationError({key: e.messages})
+        return field, values
+
+    @action(detail=False, methods=['post'], url_path='batch')
+    def batch(self, request):
+        queryset = self.get_queryset()
+        field, values = self.get_batch_lookup(request.data, queryset.model)
+        if settings.BATCH_LOOKUP_COUNT_PER_ITEM and values:
+            # only identifiers of existing objects are counted
+            found_count = queryset.filter(**{f'{field}__in': values}).order_by().values(field).distinct().count()
+            requests_left = getattr(request, 'requests_left', None)
+            if requests_left is not None and requests_left < found_count:
+                raise PermissionDenied(_('You have {} requests left').format(requests_left))
+            request._request._requests_count = found_count
+        chunks = self.render_batch_chunks(queryset, field, values)
+        # the first chunk is rendered before the response, so its error is returned with a proper status
+        first_chunk = next(chunks, b'')
+        return StreamingHttpResponse(
+            self.stream_batch(first_chunk, chunks),
+            content_type='application/json',
+        )
+
+    def render_batch_chunks(self, queryset, field, values):
+        """Yields the rendered JSON lists of objects of every chunk of values without the brackets."""
+        renderer = JSONRenderer()
+        chunk_size = settings.BATCH_LOOKUP_CHUNK_SIZE
+        for i in range(0, len(values), chunk_size):
+            chunk = queryset.filter(**{f'{field}__in': values[i:i + chunk_size]})
+            yield renderer.render(self.get_serializer(chunk, many=True).data)[1:-1]
+
+    @staticmethod
+    def stream_batch(first_chunk, chunks):
+        yield b'['
+        separator = b''
+        for content in itertools.chain([first_chunk], chunks):
+            if content:
+                yield separator + content
+                separator = b','
+        yield b']'
+
+
 class RegisterViewMixin:
     permission_classes = [AccessFromProjectToken | ServiceTokenPermission]
 
@@ -45,7 +45,7 @@ class DrvConverter(Converter):
         self.outdated_streets_dict = self.put_objects_to_dict('code', 'location_register', 'DrvStreet')
         self.zipcodes_dict = self.put_objects_to_dict('code', 'location_register', 'ZipCode')
         self.outdated_zipcodes_dict = self.put_objects_to_dict('code', 'location_register', 'ZipCode')
-        self.outdated_buildings_list = list(DrvBuilding.objects.values_list('id', flat=True))
+        self.outdated_buildings_set = set(DrvBuilding.objects.values_list('id', flat=True))
 
         super().__init__()
 
@@ -301,7 +301,7 @@ class DrvConverter(Converter):
                 if update_fields:
                     update_fields.append('updated_at')
                     building.save(update_fields=update_fields)
-                self.outdated_buildings_list.remove(building.id)
+                self.outdated_buildings_set.discard(building.id)
             else:
                 building = DrvBuilding.objects.create(
                     region=region,
@@ -315,24 +315,18 @@ class DrvConverter(Converter):
                 )
 
     def delete_outdated(self):
-        if self.outdated_districts_dict:
-            for district in self.outdated_districts_dict.values():
-                district.soft_delete()
-        if self.outdated_councils_dict:
-            for council in self.outdated_councils_dict.values():
-                council.soft_delete()
-        if self.outdated_atos_dict:
-            for ato in self.outdated_atos_dict.values():
-                ato.soft_delete()
-        if self.outdated_streets_dict:
-            for street in self.outdated_streets_dict.values():
-                street.soft_delete()
-        if self.outdated_zipcodes_dict:
-            for zipcode in self.outdated_zipcodes_dict.values():
-                zipcode.soft_delete()
-        if self.outdated_buildings_list:
-            for building_id in self.outdated_buildings_list:
-                DrvBuilding.objects.get(id=building_id).soft_delete()
+        outdated_ids_by_model = (
+            (DrvDistrict, [district.id for district in self.outdated_districts_dict.values()]),
+            (DrvCouncil, [council.id for council in self.outdated_councils_dict.values()]),
+            (DrvAto, [ato.id for ato in self.outdated_atos_dict.values()]),
+            (DrvStreet, [street.id for street in self.outdated_streets_dict.values()]),
+            (ZipCode, [zipcode.id for zipcode in self.outdated_zipcodes_dict.values()]),
+            (DrvBuilding, self.outdated_buildings_set),
+        )
+        for model, outdated_ids in outdated_ids_by_model:
+            if outdated_ids:
+                with self.ids_table(outdated_ids) as outdated_ids_subquery:
+                    model.objects.filter(id__in=outdated_ids_subquery).soft_delete()
 
     def process(self):
         regions_data = self.parse_regions_data()
@@ -1,8 +1,11 @@
 from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
 from django.http import HttpRequest, HttpResponse, JsonResponse
 from django.utils import timezone, translation
 from django.utils.translation import gettext_lazy as _
-from payment_system.models import Project
+from payment_system.models import Project, ProjectSubscription
+from payment_system.quota import requests_counter
 
 
 def permission_denied(message: str):
@@ -13,26 +16,44 @@ class ProjectAuthenticationMiddleware:
     def __init__(self, get_response):
         self.get_response = get_response
 
+    @staticmethod
+    def get_project(token):
+        """
+        Returns (project, active p2s) of the token cached for PROJECT_TOKEN_CACHE_SECONDS,
+        the cache is dropped by changes of the project or of its subscriptions.
+        """
+        key = Project.get_token_cache_key(token)
+        cached = cache.get(key)
+        if cached is not None:
+            return cached
+        try:
+            project = Project.objects.select_related('owner').get(token=token)
+        except Project.DoesNotExist:
+            return None, None
+        current_p2s = project.project_subscriptions.select_related('subscription').get(
+            status=ProjectSubscription.ACTIVE,
+        )
+        current_p2s.project = project
+        cache.set(key, (project, current_p2s), settings.PROJECT_TOKEN_CACHE_SECONDS)
+        return project, current_p2s
+
     def authenticate_project(self, request):
         auth_header = request.headers.get('authorization')
         if not auth_header or type(auth_header) != str:
-            return None, None
+            return None, None, None
         auth_words = auth_header.split()
         if len(auth_words) != 2:
-            return None, None
+            return None, None, None
 
         keyword = auth_words[0]
         token = auth_words[1]
 
         if keyword in (settings.PROJECT_PLATFORM_TOKEN_KEYWORD, settings.PROJECT_TOKEN_KEYWORD):
-            try:
-                project = Project.objects.get(token=token)
-                if project.is_disabled:
-                    return None, None
-                return project, keyword
-            except Project.DoesNotExist:
-                return None, None
-        return None, None
+            project, current_p2s = self.get_project(token)
+            if project is None or project.is_disabled:
+                return None, None, None
+            return project, current_p2s, keyword
+        return None, None, None
 
     def set_locale(self, request, project: Project):
         # checking if the language was already set from the header
@@ -43,42 +64,42 @@ class ProjectAuthenticationMiddleware:
         request.LANGUAGE_CODE = translation.get_language()
 
     def __call__(self, request: HttpRequest):
-        project, keyword = self.authenticate_project(request)
+        project, current_p2s, keyword = self.authenticate_project(request)
         is_project_authenticated = bool(project and isinstance(project, Project))
         if is_project_authenticated:
-            current_p2s = project.active_p2s
+            if current_p2s.expiring_date <= timezone.localdate():
+                # the cached subscription can be behind the counters in the DB
+                requests_counter.flush()
+                with transaction.atomic():
+                    # concurrent requests of the project wait here and skip the expired subscription
+                    p2s = ProjectSubscription.objects.select_for_update().get(pk=current_p2s.pk)
+                    if p2s.status == ProjectSubscription.ACTIVE and p2s.expiring_date <= timezone.localdate():
+                        p2s.expire()
+                project.forget_token()
+                project, current_p2s = self.get_project(project.token)
 
-            if keyword == settings.PROJECT_TOKEN_KEYWORD:
-                if current_p2s.requests_left <= 0:
-                    return permission_denied(_('You have 0 requests left'))
-            elif keyword == settings.PROJECT_PLATFORM_TOKEN_KEYWORD:
-                if current_p2s.platform_requests_left <= 0:
-                    return permission_denied(_('You have 0 views left'))
+            is_platform = keyword == settings.PROJECT_PLATFORM_TOKEN_KEYWORD
+            if is_platform:
+                requests_left = current_p2s.platform_requests_left
             else:
-                return permission_denied(_('You do not have permission to perform this action.'))
+                requests_left = current_p2s.requests_left
+            # requests of the process not written to the subscription yet, see RequestsCounter
+            requests_left -= requests_counter.get_pending(current_p2s.id, is_platform)
 
-            if current_p2s.expiring_date <= timezone.localdate():
-                current_p2s.expire()
+            if requests_left <= 0:
+                if is_platform:
+                    return permission_denied(_('You have 0 views left'))
+                return permission_denied(_('You have 0 requests left'))
 
             request.project = project
             request.current_p2s = current_p2s
+            request.requests_left = requests_left
             self.set_locale(request, project)
             response: HttpResponse = self.get_response(request)
 
             if response.status_code // 100 != 5 and getattr(request, '_decrease_requests_counter', True):
-                if keyword == settings.PROJECT_PLATFORM_TOKEN_KEYWORD:
-                    current_p2s.platform_requests_left -= 1
-                    current_p2s.platform_requests_used += 1
-                    current_p2s.save(update_fields=[
-                        'platform_requests_left',
-                        'platform_requests_used',
-                    ])
-                else:
-                    current_p2s.requests_left -= 1
-                    current_p2s.requests_used += 1
-                    current_p2s.save(update_fields=[
-                        'requests_left',
-                        'requests_used',
-                    ])
+                # a batch lookup can be counted as several requests, see BatchLookupMixin
+                requests_count = getattr(request, '_requests_count', 1)
+                requests_counter.add(project.token, current_p2s.id, is_platform, requests_count)
             return response
         return self.get_response(request)
@@ -0,0 +1,21 @@
+# Generated by Django 3.1.12 on 2026-10-18 21:05
+
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('payment_system', '0050_auto_20210426_1306'),
+    ]
+
+    operations = [
+        migrations.RemoveField(
+            model_name='projectsubscription',
+            name='pep_checks_count_per_minute',
+        ),
+        migrations.RemoveField(
+            model_name='projectsubscription',
+            name='pep_checks_minute',
+        ),
+    ]
@@ -4,6 +4,7 @@ import uuid
 from calendar import monthrange
 
 from django.conf import settings
+from django.core.cache import cache
 from django.core.exceptions import ValidationError
 from django.db import models
 from django.template.loader import render_to_string
@@ -52,6 +53,15 @@ class Project(DataOceanModel):
         if not self.token:
             self.generate_new_token()
         super().save(*args, **kwargs)
+        self.forget_token()
+
+    @staticmethod
+    def get_token_cache_key(token):
+        return f'project_token:{token}'
+
+    def forget_token(self, token=None):
+        """Drops the project cached by ProjectAuthenticationMiddleware for the token."""
+        cache.delete(self.get_token_cache_key(token or self.token))
 
     def generate_new_token(self):
         def get_token_safe():
@@ -176,8 +186,10 @@ class Project(DataOceanModel):
         self.save(update_fields=['disabled_at', 'updated_at'])
 
     def refresh_token(self):
+        old_token = self.token
         self.generate_new_token()
         self.save(update_fields=['token', 'updated_at'])
+        self.forget_token(old_token)
         emails.token_has_been_changed(self)
 
     def has_read_perms(self, user):
@@ -575,9 +587,6 @@ class ProjectSubscription(DataOceanModel):
     periodicity = models.CharField(max_length=5, choices=Subscription.PERIODS)
     grace_period = models.SmallIntegerField(help_text='days')
 
-    pep_checks_count_per_minute = models.PositiveSmallIntegerField(default=0)
-    pep_checks_minute = models.PositiveIntegerField(default=0)
-
     @staticmethod
     def increase_term(date, start_day, period='month'):
         assert 1 <= start_day <= 31
@@ -770,6 +779,7 @@ class ProjectSubscription(DataOceanModel):
             self.renewal_date = self.increase_term(self.start_date, self.start_day, 'month')
         self.validate_unique()
         super().save(*args, **kwargs)
+        self.project.forget_token()
 
     @property
     def latest_invoice(self) -> Invoice:
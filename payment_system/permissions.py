@@ -1,11 +1,10 @@
-import time
-
 from django.utils import timezone
 from rest_framework import permissions
 from rest_framework.permissions import SAFE_METHODS
 from rest_framework.request import Request
 from django.conf import settings
-from rest_framework.exceptions import Throttled
+
+from data_ocean.throttling import SlidingWindowThrottle
 from .models import (
     Project,
     ProjectSubscription,
@@ -69,22 +68,19 @@ class PepChecksPermission(AccessFromProjectToken):
             return False
 
         current_p2s: ProjectSubscription = request.current_p2s
-        if not current_p2s.subscription.pep_checks:
-            return False
+        return current_p2s.subscription.pep_checks
 
-        unix_now = int(time.time())
-        unix_minute_now = unix_now // 60
-        if unix_minute_now > current_p2s.pep_checks_minute:
-            current_p2s.pep_checks_minute = unix_minute_now
-            current_p2s.pep_checks_count_per_minute = 1
-            current_p2s.save(update_fields=[
-                'pep_checks_minute',
-                'pep_checks_count_per_minute',
-            ])
-            return True
-        elif current_p2s.pep_checks_count_per_minute >= current_p2s.subscription.pep_checks_per_minute:
-            raise Throttled(wait=60 - (unix_now - (current_p2s.pep_checks_minute * 60)))
-        else:
-            current_p2s.pep_checks_count_per_minute += 1
-            current_p2s.save(update_fields=['pep_checks_count_per_minute'])
-            return True
+
+class PepChecksThrottle(SlidingWindowThrottle):
+    """Limits PEP checks of a project to pep_checks_per_minute of its subscription."""
+    scope = 'pep_checks'
+    window = 60
+
+    def get_limit(self, request, view):
+        current_p2s = getattr(request, 'current_p2s', None)
+        if current_p2s is None:
+            return None
+        return current_p2s.subscription.pep_checks_per_minute
+
+    def get_key(self, request, view):
+        return request.current_p2s.id
@@ -0,0 +1,66 @@
+import atexit
+import logging
+import threading
+import time
+from collections import defaultdict
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import F
+
+from payment_system.models import Project, ProjectSubscription
+
+logger = logging.getLogger(__name__)
+
+
+class RequestsCounter:
+    """
+    Counts requests of project subscriptions in the process and writes them to ProjectSubscription
+    with atomic F() updates at most once per PROJECT_REQUESTS_FLUSH_SECONDS, so concurrent requests
+    of a project neither lose decrements nor wait for the lock of its row. The counts are flushed by
+    the first request after the interval and when the process exits.
+    """
+    REQUESTS = ('requests_left', 'requests_used')
+    PLATFORM_REQUESTS = ('platform_requests_left', 'platform_requests_used')
+
+    def __init__(self):
+        # (p2s id, is platform) -> requests not written yet
+        self.counts = defaultdict(int)
+        # p2s id -> token of the project, its cached subscription is dropped after the flush
+        self.tokens = {}
+        self.lock = threading.Lock()
+        self.last_flush = time.monotonic()
+        atexit.register(self.flush)
+
+    def add(self, token, p2s_id, is_platform, count=1):
+        with self.lock:
+            self.counts[p2s_id, is_platform] += count
+            self.tokens[p2s_id] = token
+            is_due = time.monotonic() - self.last_flush >= settings.PROJECT_REQUESTS_FLUSH_SECONDS
+        if is_due:
+            self.flush()
+
+    def get_pending(self, p2s_id, is_platform):
+        """Returns requests of the subscription counted in the process but not written yet."""
+        with self.lock:
+            return self.counts.get((p2s_id, is_platform), 0)
+
+    def flush(self):
+        with self.lock:
+            counts, self.counts = self.counts, defaultdict(int)
+            tokens, self.tokens = self.tokens, {}
+            self.last_flush = time.monotonic()
+        for (p2s_id, is_platform), count in counts.items():
+            left, used = self.PLATFORM_REQUESTS if is_platform else self.REQUESTS
+            try:
+                ProjectSubscription.objects.filter(pk=p2s_id).update(**{
+                    left: F(left) - count,
+                    used: F(used) + count,
+                })
+            except Exception:
+                logger.exception(f'{count} requests of the project subscription {p2s_id} were not saved')
+        # the next request reads the written counters
+        cache.delete_many([Project.get_token_cache_key(token) for token in tokens.values()])
+
+
+requests_counter = RequestsCounter()
@@ -0,0 +1,63 @@
+from unittest import mock
+
+from django.db.models import F
+from django.test import SimpleTestCase, override_settings
+
+from payment_system.quota import RequestsCounter
+
+
+@override_settings(PROJECT_REQUESTS_FLUSH_SECONDS=60)
+class RequestsCounterTestCase(SimpleTestCase):
+    def setUp(self):
+        with mock.patch('payment_system.quota.atexit'):
+            self.counter = RequestsCounter()
+
+    def test_add_and_get_pending(self):
+        self.counter.add('token', 1, False)
+        self.counter.add('token', 1, False, count=3)
+        self.counter.add('token', 1, True)
+        self.assertEqual(self.counter.get_pending(1, False), 4)
+        self.assertEqual(self.counter.get_pending(1, True), 1)
+        self.assertEqual(self.counter.get_pending(2, False), 0)
+
+    @mock.patch('payment_system.quota.cache')
+    @mock.patch('payment_system.quota.ProjectSubscription')
+    def test_flush(self, p2s_model, cache):
+        self.counter.add('token', 1, False, count=2)
+        self.counter.add('token', 1, True)
+        self.counter.add('other token', 2, False)
+        self.counter.flush()
+
+        self.assertEqual(p2s_model.objects.filter.call_args_list, [
+            mock.call(pk=1), mock.call(pk=1), mock.call(pk=2),
+        ])
+        self.assertEqual(p2s_model.objects.filter.return_value.update.call_args_list, [
+            mock.call(requests_left=F('requests_left') - 2, requests_used=F('requests_used') + 2),
+            mock.call(
+                platform_requests_left=F('platform_requests_left') - 1,
+                platform_requests_used=F('platform_requests_used') + 1,
+            ),
+            mock.call(requests_left=F('requests_left') - 1, requests_used=F('requests_used') + 1),
+        ])
+        cache.delete_many.assert_called_once_with(['project_token:token', 'project_token:other token'])
+        self.assertEqual(self.counter.get_pending(1, False), 0)
+        self.assertEqual(self.counter.get_pending(1, True), 0)
+
+    @mock.patch('payment_system.quota.cache')
+    @mock.patch('payment_system.quota.ProjectSubscription')
+    def test_failed_update(self, p2s_model, cache):
+        p2s_model.objects.filter.return_value.update.side_effect = [Exception('database is down'), 1]
+        self.counter.add('token', 1, False)
+        self.counter.add('other token', 2, False)
+        with self.assertLogs('payment_system.quota', 'ERROR'):
+            self.counter.flush()
+        self.assertEqual(p2s_model.objects.filter.return_value.update.call_count, 2)
+        cache.delete_many.assert_called_once_with(['project_token:token', 'project_token:other token'])
+
+    @override_settings(PROJECT_REQUESTS_FLUSH_SECONDS=0)
+    @mock.patch('payment_system.quota.cache')
+    @mock.patch('payment_system.quota.ProjectSubscription')
+    def test_add_flushes_after_interval(self, p2s_model, cache):
+        self.counter.add('token', 1, False)
+        p2s_model.objects.filter.assert_called_once_with(pk=1)
+        self.assertEqual(self.counter.get_pending(1, False), 0)
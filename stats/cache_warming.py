@@ -1,9 +1,25 @@
+import logging
+import time
 from abc import abstractmethod, ABC
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+from urllib.parse import urlparse
 
+from django.conf import settings
 from django.core.cache import cache
+from django.db import connection
+from django.db.models import Count, Q
+from django.test import RequestFactory
+from django.urls import Resolver404, resolve
+from django.utils import timezone
 from rest_framework import views
 from rest_framework.response import Response
 
+from data_ocean.views import CachedViewMixin, CachedViewSetMixin
+from stats.models import ApiUsageTracking
+
+logger = logging.getLogger(__name__)
+
 
 class WarmedCacheGetAPIView(views.APIView, ABC):
     cache_timeout = 60 * 60 * 24  # seconds
@@ -35,3 +51,100 @@ class WarmedCacheGetAPIView(views.APIView, ABC):
             self.set_cache_data(data)
         return Response(data, status=200)
 
+
+class CacheWarmer:
+    """
+    Warms cached responses in-process. The views of the paths are resolved and called with a request
+    made like the one of a service client behind the proxy, so the same cache keys are filled without
+    HTTP, middlewares and API usage tracking. The endpoints are followed by the most requested paths
+    under them according to ApiUsageTracking, and everything is rendered concurrently by
+    settings.CACHE_WARMING_WORKERS threads.
+    """
+
+    def __init__(self, workers=None):
+        self.workers = workers or settings.CACHE_WARMING_WORKERS
+        site_url = urlparse(settings.CACHE_WARMING_SITE_URL)
+        self.secure = site_url.scheme == 'https'
+        self.request_factory = RequestFactory(
+            HTTP_HOST=site_url.netloc,
+            HTTP_ACCEPT='*/*',
+            HTTP_AUTHORIZATION=f'Service {settings.SERVICE_TOKEN}',
+        )
+
+    @staticmethod
+    def get_hot_paths(endpoints, limit=None):
+        """Returns paths under the endpoints ordered by the number of requests for the last days."""
+        if limit is None:
+            limit = settings.CACHE_WARMING_HOT_PATHS
+        if not endpoints or not limit:
+            return []
+        paths_filter = Q()
+        for endpoint in endpoints:
+            paths_filter |= Q(pathname__startswith=endpoint)
+        return list(ApiUsageTracking.objects.filter(
+            paths_filter,
+            timestamp__gte=timezone.now() - timedelta(days=settings.CACHE_WARMING_USAGE_DAYS),
+        ).values('pathname').annotate(
+            requests=Count('id'),
+        ).order_by('-requests').values_list('pathname', flat=True)[:limit])
+
+    @staticmethod
+    def is_cached(match):
+        view_class = getattr(match.func, 'cls', None)
+        if view_class is None:
+            return False
+        if issubclass(view_class, CachedViewSetMixin):
+            return getattr(match.func, 'actions', {}).get('get') in ('list', 'retrieve')
+        return issubclass(view_class, CachedViewMixin)
+
+    def warm_path(self, path):
+        try:
+            try:
+                match = resolve(path)
+            except Resolver404:
+                return None
+            if not self.is_cached(match):
+                return None
+            request = self.request_factory.get(path, secure=self.secure)
+            response = match.func(request, *match.args, **match.kwargs)
+            if hasattr(response, 'render'):
+                response.render()
+            return response.status_code
+        finally:
+            connection.close()
+
+    def warm_view(self, view):
+        try:
+            view.warm_up_cache()
+            return 200
+        finally:
+            connection.close()
+
+    def run(self, endpoints=(), views=()):
+        """
+        Warms the endpoints, their hot paths and WarmedCacheGetAPIView views.
+        Returns [(key, status, seconds)], status is None for a failed or not cached key.
+        """
+        paths = list(dict.fromkeys([*endpoints, *self.get_hot_paths(endpoints)]))
+        tasks = [(path, self.warm_path, path) for path in paths]
+        tasks += [(view.get_cache_key(), self.warm_view, view) for view in views]
+
+        def warm(key, function, argument):
+            start_time = time.monotonic()
+            try:
+                status = function(argument)
+            except Exception:
+                logger.exception(f'{key} warming failed')
+                status = None
+            seconds = time.monotonic() - start_time
+            if status is not None and status != 200:
+                logger.error(f'{key} warming failed, status={status}')
+            logger.info(f'{key} warmed up in {seconds:.3f}s, status={status}')
+            return key, status, seconds
+
+        start_time = time.monotonic()
+        with ThreadPoolExecutor(max_workers=self.workers) as executor:
+            results = list(executor.map(lambda task: warm(*task), tasks))
+        logger.info(f'{len(results)} keys warmed up by {self.workers} workers '
+                    f'in {time.monotonic() - start_time:.3f}s')
+        return results
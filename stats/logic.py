@@ -1,26 +1,85 @@
-from datetime import datetime
-from django.db import connection
+from collections import defaultdict
+from datetime import date, datetime
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.db.models import Count, Sum
+from django.db.models.functions import TruncDate
+
+from stats.models import ApiUsageRollup, ApiUsageRollupWatermark, ApiUsageTracking
+
+ROLLUP_SQL = """
+    INSERT INTO stats_api_usage_rollup (user_id, project_id, day, pathname, count)
+    SELECT user_id, project_id, date("timestamp"), pathname, count(*)
+    FROM stats_api_usage_tracking
+    WHERE id > %(id_from)s AND id <= %(id_to)s AND project_id IS {project_condition}
+    GROUP BY user_id, project_id, date("timestamp"), pathname
+    ON CONFLICT ({conflict_fields}) WHERE project_id IS {project_condition}
+    DO UPDATE SET count = stats_api_usage_rollup.count + excluded.count
+"""
+
+
+def rollup_api_usage() -> int:
+    """
+    Adds ApiUsageTracking rows past the watermark to ApiUsageRollup in batches of
+    API_USAGE_ROLLUP_BATCH_SIZE ids, moving the watermark in the same transaction. The watermark
+    row is locked by each batch, so overlapping runs never count the same ids twice.
+    Returns the id of the last counted row.
+    """
+    with transaction.atomic():
+        # waits for inserts in progress, so no row below the max id is committed later
+        with connection.cursor() as c:
+            c.execute('LOCK TABLE stats_api_usage_tracking IN SHARE MODE')
+        max_id = ApiUsageTracking.objects.order_by('-id').values_list('id', flat=True).first() or 0
+
+    ApiUsageRollupWatermark.objects.get_or_create(pk=1)
+    while True:
+        with transaction.atomic(), connection.cursor() as c:
+            # an overlapping run waits for the batch and continues from the moved watermark
+            watermark = ApiUsageRollupWatermark.objects.select_for_update().get(pk=1)
+            if watermark.tracking_id >= max_id:
+                return watermark.tracking_id
+            id_to = min(watermark.tracking_id + settings.API_USAGE_ROLLUP_BATCH_SIZE, max_id)
+            for project_condition, conflict_fields in (
+                    ('NOT NULL', 'user_id, project_id, day, pathname'),
+                    ('NULL', 'user_id, day, pathname'),
+            ):
+                c.execute(ROLLUP_SQL.format(
+                    project_condition=project_condition,
+                    conflict_fields=conflict_fields,
+                ), {'id_from': watermark.tracking_id, 'id_to': id_to})
+            watermark.tracking_id = id_to
+            watermark.save()
+
+
+def get_api_usage_counts(user_id: int, date_from: date = None, date_to: date = None) -> {date: int}:
+    """
+    Returns {day: count} of requests of the user from ApiUsageRollup and of the rows
+    of ApiUsageTracking which are not counted there yet.
+    """
+    rollups = ApiUsageRollup.objects.filter(user_id=user_id)
+    watermark = ApiUsageRollupWatermark.objects.filter(pk=1).values_list('tracking_id', flat=True).first()
+    rows = ApiUsageTracking.objects.filter(user_id=user_id, id__gt=watermark or 0)
+    if date_from:
+        rollups = rollups.filter(day__gte=date_from)
+        rows = rows.filter(timestamp__date__gte=date_from)
+    if date_to:
+        rollups = rollups.filter(day__lte=date_to)
+        rows = rows.filter(timestamp__date__lte=date_to)
+
+    counts = defaultdict(int)
+    for day, count in rollups.values_list('day').annotate(count=Sum('count')).order_by():
+        counts[day] += count
+    for day, count in rows.annotate(day=TruncDate('timestamp')).values_list('day').annotate(
+            count=Count('id')).order_by():
+        counts[day] += count
+    return dict(counts)
 
 
 def get_api_usage_by_day(date_from: datetime, date_to: datetime,
                          user_id: int) -> [dict]:
-    days = []
-    with connection.cursor() as c:
-        c.execute(f"""
-            SELECT date(max("timestamp")), count(*) as count
-            FROM stats_api_usage_tracking
-            WHERE "timestamp" >= %(date_from)s AND "timestamp" <= %(date_to)s
-                AND user_id = %(user_id)s
-            GROUP BY date_part('doy', "timestamp")
-            ORDER BY max("timestamp")
-        """, {
-            'date_from': date_from,
-            'date_to': date_to,
-            'user_id': user_id
-        })
-        for row in c.fetchall():
-            days.append({
-                'timestamp': row[0],
-                'count': row[1],
-            })
-    return days
+    counts = get_api_usage_counts(user_id, date_from.date(), date_to.date())
+    return [{
+        'timestamp': day,
+        'count': counts[day],
+    } for day in sorted(counts)]
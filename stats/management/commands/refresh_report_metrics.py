@@ -0,0 +1,22 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from data_ocean.cache import bump_data_versions
+from stats.report_metrics import ReportMetrics
+
+
+class Command(BaseCommand):
+    help = 'Recounts registrations and KVED counts of the registers for the report builder.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('registers', nargs='*', help='company and/or fop, all registers by default')
+
+    def handle(self, *args, **options):
+        registers = options['registers'] or list(ReportMetrics.registers)
+        for register in registers:
+            if register not in ReportMetrics.registers:
+                raise CommandError(f'Not supported register - {register}')
+        for register in registers:
+            ReportMetrics(register).refresh()
+            self.stdout.write(f'Report metrics of {register} refreshed')
+        # reports cached before the refresh are not served anymore
+        bump_data_versions(*registers)
@@ -1,5 +1,5 @@
 from django.http import HttpRequest, HttpResponse
-from .models import ApiUsageTracking
+from .usage import api_usage_buffer
 from django.conf import settings
 from urllib.parse import urlparse
 
@@ -13,11 +13,9 @@ class ApiUsageMiddleware:
         response: HttpResponse = self.get_response(request)
 
         def create_api_usage_object():
-            ApiUsageTracking.objects.create(
-                user=request.user,
-                pathname=request.path,
-                referer=referer or '',
-            )
+            # saved in batches, see stats.usage.ApiUsageBuffer
+            project = getattr(request, 'project', None)
+            api_usage_buffer.add(request.user.id, request.path, referer or '', project and project.id)
 
         if not request.user.is_anonymous and response.status_code // 100 == 2 \
                 and request.path.startswith('/api/'):
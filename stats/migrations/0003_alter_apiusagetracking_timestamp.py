@@ -0,0 +1,19 @@
+# Generated by Django 3.1.12 on 2026-10-18 20:40
+
+from django.db import migrations, models
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('stats', '0002_auto_20200728_1840'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='apiusagetracking',
+            name='timestamp',
+            field=models.DateTimeField(db_index=True, default=django.utils.timezone.now, verbose_name='мітка часу'),
+        ),
+    ]
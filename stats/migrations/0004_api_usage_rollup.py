@@ -0,0 +1,57 @@
+# Generated by Django 3.1.12 on 2026-10-18 21:40
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('payment_system', '0051_remove_projectsubscription_pep_checks_counters'),
+        ('stats', '0003_alter_apiusagetracking_timestamp'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='apiusagetracking',
+            name='project',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='api_usage', to='payment_system.project', verbose_name='проєкт'),
+        ),
+        migrations.CreateModel(
+            name='ApiUsageRollupWatermark',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('tracking_id', models.BigIntegerField(default=0)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'db_table': 'stats_api_usage_rollup_watermark',
+            },
+        ),
+        migrations.CreateModel(
+            name='ApiUsageRollup',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('day', models.DateField(verbose_name='день')),
+                ('pathname', models.CharField(max_length=250, verbose_name='шлях')),
+                ('count', models.PositiveIntegerField(default=0, verbose_name='кількість')),
+                ('project', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='api_usage_rollups', to='payment_system.project', verbose_name='проєкт')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='api_usage_rollups', to=settings.AUTH_USER_MODEL, verbose_name='користувач')),
+            ],
+            options={
+                'verbose_name': 'використання API за день',
+                'db_table': 'stats_api_usage_rollup',
+                'index_together': {('user', 'day')},
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='apiusagerollup',
+            constraint=models.UniqueConstraint(condition=models.Q(project__isnull=False), fields=('user', 'project', 'day', 'pathname'), name='stats_api_usage_rollup_project_day_path'),
+        ),
+        migrations.AddConstraint(
+            model_name='apiusagerollup',
+            constraint=models.UniqueConstraint(condition=models.Q(project__isnull=True), fields=('user', 'day', 'pathname'), name='stats_api_usage_rollup_day_path'),
+        ),
+    ]
@@ -0,0 +1,70 @@
+# Generated by Django 3.1.12 on 2026-10-18 22:15
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('stats', '0004_api_usage_rollup'),
+        ('business_register', '0155_pepfoundermatch'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='KvedCount',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('register', models.CharField(max_length=10, verbose_name='реєстр')),
+                ('kved_code', models.CharField(max_length=10, verbose_name='код КВЕД')),
+                ('count', models.PositiveIntegerField(default=0, verbose_name='кількість')),
+            ],
+            options={
+                'verbose_name': 'кількість за КВЕД',
+                'db_table': 'stats_kved_count',
+                'unique_together': {('register', 'kved_code')},
+            },
+        ),
+        migrations.CreateModel(
+            name='RegistrationCount',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('register', models.CharField(max_length=10, verbose_name='реєстр')),
+                ('day', models.DateField(verbose_name='день')),
+                ('count', models.PositiveIntegerField(default=0, verbose_name='кількість')),
+            ],
+            options={
+                'verbose_name': 'реєстрації за день',
+                'db_table': 'stats_registration_count',
+                'unique_together': {('register', 'day')},
+            },
+        ),
+        migrations.RunSQL(
+            sql="INSERT INTO stats_registration_count (register, day, count) "
+                "SELECT 'company', registration_date, count(*) FROM business_register_company "
+                "WHERE registration_date IS NOT NULL GROUP BY registration_date;",
+            reverse_sql=migrations.RunSQL.noop,
+        ),
+        migrations.RunSQL(
+            sql="INSERT INTO stats_kved_count (register, kved_code, count) "
+                "SELECT 'company', kved.code, count(*) FROM business_register_companytokved "
+                "JOIN business_register_company r ON business_register_companytokved.company_id = r.id "
+                "JOIN business_register_kved kved ON business_register_companytokved.kved_id = kved.id "
+                "GROUP BY kved.code;",
+            reverse_sql=migrations.RunSQL.noop,
+        ),
+        migrations.RunSQL(
+            sql="INSERT INTO stats_registration_count (register, day, count) "
+                "SELECT 'fop', registration_date, count(*) FROM business_register_fop "
+                "WHERE registration_date IS NOT NULL GROUP BY registration_date;",
+            reverse_sql=migrations.RunSQL.noop,
+        ),
+        migrations.RunSQL(
+            sql="INSERT INTO stats_kved_count (register, kved_code, count) "
+                "SELECT 'fop', kved.code, count(*) FROM business_register_foptokved "
+                "JOIN business_register_fop r ON business_register_foptokved.fop_id = r.id "
+                "JOIN business_register_kved kved ON business_register_foptokved.kved_id = kved.id "
+                "GROUP BY kved.code;",
+            reverse_sql=migrations.RunSQL.noop,
+        ),
+    ]
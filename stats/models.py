@@ -1,4 +1,5 @@
 from django.db import models
+from django.utils import timezone
 from users.models import DataOceanUser
 
 
@@ -7,10 +8,80 @@ class ApiUsageTracking(models.Model):
         DataOceanUser, models.CASCADE, verbose_name='користувач',
         related_name='api_usage', db_index=True,
     )
-    timestamp = models.DateTimeField('мітка часу', auto_now_add=True, db_index=True)
+    # the time of the request, events are saved later in batches
+    timestamp = models.DateTimeField('мітка часу', default=timezone.now, db_index=True)
     pathname = models.CharField('шлях', max_length=250)
     referer = models.CharField('відправник', max_length=250, blank=True, default='')
+    project = models.ForeignKey(
+        'payment_system.Project', models.SET_NULL, verbose_name='проєкт',
+        related_name='api_usage', null=True, blank=True,
+    )
 
     class Meta:
         db_table = 'stats_api_usage_tracking'
         verbose_name = 'використання API'
+
+
+class ApiUsageRollup(models.Model):
+    """Requests of ApiUsageTracking counted per user, project, day and path, see stats.logic.rollup_api_usage."""
+    user = models.ForeignKey(
+        DataOceanUser, models.CASCADE, verbose_name='користувач',
+        related_name='api_usage_rollups',
+    )
+    project = models.ForeignKey(
+        'payment_system.Project', models.SET_NULL, verbose_name='проєкт',
+        related_name='api_usage_rollups', null=True, blank=True,
+    )
+    day = models.DateField('день')
+    pathname = models.CharField('шлях', max_length=250)
+    count = models.PositiveIntegerField('кількість', default=0)
+
+    class Meta:
+        db_table = 'stats_api_usage_rollup'
+        verbose_name = 'використання API за день'
+        index_together = [['user', 'day']]
+        constraints = [
+            models.UniqueConstraint(
+                fields=['user', 'project', 'day', 'pathname'],
+                condition=models.Q(project__isnull=False),
+                name='stats_api_usage_rollup_project_day_path',
+            ),
+            models.UniqueConstraint(
+                fields=['user', 'day', 'pathname'],
+                condition=models.Q(project__isnull=True),
+                name='stats_api_usage_rollup_day_path',
+            ),
+        ]
+
+
+class ApiUsageRollupWatermark(models.Model):
+    """The last ApiUsageTracking id counted in ApiUsageRollup, a single row."""
+    tracking_id = models.BigIntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        db_table = 'stats_api_usage_rollup_watermark'
+
+
+class RegistrationCount(models.Model):
+    """Companies or FOPs registered per day, see stats.report_metrics.ReportMetrics."""
+    register = models.CharField('реєстр', max_length=10)
+    day = models.DateField('день')
+    count = models.PositiveIntegerField('кількість', default=0)
+
+    class Meta:
+        db_table = 'stats_registration_count'
+        verbose_name = 'реєстрації за день'
+        unique_together = [['register', 'day']]
+
+
+class KvedCount(models.Model):
+    """Companies or FOPs per KVED code, see stats.report_metrics.ReportMetrics."""
+    register = models.CharField('реєстр', max_length=10)
+    kved_code = models.CharField('код КВЕД', max_length=10)
+    count = models.PositiveIntegerField('кількість', default=0)
+
+    class Meta:
+        db_table = 'stats_kved_count'
+        verbose_name = 'кількість за КВЕД'
+        unique_together = [['register', 'kved_code']]
@@ -1,8 +1,17 @@
 import abc
-from django.db import connection
+import hashlib
+import json
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.cache import cache
+from django.utils.dateparse import parse_date
 from rest_framework import views
+from rest_framework.exceptions import ValidationError
 from rest_framework.response import Response
-from data_ocean.views import CachedViewMixin
+
+from data_ocean.cache import get_data_version_prefix, get_data_versions
+from stats.models import KvedCount, RegistrationCount
 
 
 class BaseQuery(abc.ABC):
@@ -12,87 +21,83 @@ class BaseQuery(abc.ABC):
 
 
 class RegistrationQuery(BaseQuery):
-    tables = {
-        'fop_registration': 'business_register_fop',
-        'company_registration': 'business_register_company',
+    registers = {
+        'fop_registration': 'fop',
+        'company_registration': 'company',
     }
 
     format_for_group_by = {
-        'day': 'YYYY-MM-DD',
-        'month': 'YYYY-MM',
-        'year': 'YYYY',
-    }
-
-    group_by_sql = {
-        'day': "date_part('year', registration_date), date_part('doy', registration_date)",
-        'month': "date_part('year', registration_date), date_part('month', registration_date)",
-        'year': "date_part('year', registration_date)",
+        'day': '%Y-%m-%d',
+        'month': '%Y-%m',
+        'year': '%Y',
     }
 
     def __init__(self, metric):
-        self.table_name = self.tables[metric]
+        self.register = self.registers[metric]
+
+    @staticmethod
+    def parse_date(value):
+        try:
+            # timestamps are accepted as well
+            date = parse_date(str(value)[:10])
+        except ValueError:
+            date = None
+        if date is None:
+            raise ValidationError({'options': f'Wrong date - {value}'})
+        return date
+
+    @staticmethod
+    def truncate(date, group_by):
+        if group_by == 'year':
+            return date.replace(month=1, day=1)
+        if group_by == 'month':
+            return date.replace(day=1)
+        return date
+
+    @staticmethod
+    def next_period(date, group_by):
+        if group_by == 'year':
+            return date.replace(year=date.year + 1)
+        if group_by == 'month':
+            return (date.replace(day=28) + timedelta(days=4)).replace(day=1)
+        return date + timedelta(days=1)
 
     def get_data(self, options):
-        date_from = options['date_from']
-        date_to = options['date_to']
+        date_from = self.parse_date(options['date_from'])
+        date_to = self.parse_date(options['date_to'])
         group_by = options['group_by']
+        date_format = self.format_for_group_by[group_by]
 
-        with connection.cursor() as cursor:
-            cursor.execute(f"""
-            select to_char(date_trunc('{group_by}', offs), '{self.format_for_group_by[group_by]}') AS date
-            FROM generate_series('{date_from}'::timestamp, '{date_to}', '1 {group_by}') AS offs;
-            """)
-            data = {row[0]: 0 for row in cursor.fetchall()}
-
-            cursor.execute(f'''
-            SELECT to_char(max(registration_date), '{self.format_for_group_by[group_by]}') as date,
-                    count(*) as count
-            FROM {self.table_name}
-            WHERE
-                registration_date >= '{date_from}' AND
-                registration_date <= '{date_to}'
-            GROUP BY {self.group_by_sql[group_by]}
-            ORDER BY max(registration_date)
-            ''')
-
-            for row in cursor.fetchall():
-                data[row[0]] = row[1]
-            return data.items()
+        data = {}
+        period = self.truncate(date_from, group_by)
+        while period <= date_to:
+            data[period.strftime(date_format)] = 0
+            period = self.next_period(period, group_by)
+
+        # daily counts filled by stats.report_metrics.ReportMetrics
+        for day, count in RegistrationCount.objects.filter(
+                register=self.register, day__gte=date_from, day__lte=date_to,
+        ).values_list('day', 'count'):
+            data[day.strftime(date_format)] += count
+        return list(data.items())
 
 
 class KvedQuery(BaseQuery):
     def __init__(self, metric_name):
         if metric_name == 'company_kved':
-            self.rel_table = 'business_register_companytokved'
-            self.table = 'business_register_company'
-            self.count_col = 'company_id'
+            self.register = 'company'
         elif metric_name == 'fop_kved':
-            self.rel_table = 'business_register_foptokved'
-            self.table = 'business_register_fop'
-            self.count_col = 'fop_id'
+            self.register = 'fop'
         else:
             raise ValueError(f'Not supported metric name - {metric_name}')
 
     def get_data(self, options):
-        kveds = options['kveds']
-        kveds_sql: list = [f"'{x}'" for x in kveds]
-
-        kveds = {kved: 0 for kved in kveds}
-
-        with connection.cursor() as cursor:
-            sql = f'''
-            SELECT kved.code, count({self.count_col}) as count
-            FROM {self.rel_table}
-            JOIN {self.table} company on {self.rel_table}.{self.count_col} = company.id
-            JOIN business_register_kved kved on {self.rel_table}.kved_id = kved.id
-            WHERE kved.code IN ({','.join(kveds_sql)})
-            GROUP BY kved.code
-            ORDER BY kved.code
-            '''
-            cursor.execute(sql)
-            for row in cursor.fetchall():
-                kveds[row[0]] = row[1]
-            return kveds.items()
+        kveds = {kved: 0 for kved in options['kveds']}
+        # counts filled by stats.report_metrics.ReportMetrics
+        kveds.update(KvedCount.objects.filter(
+            register=self.register, kved_code__in=kveds,
+        ).values_list('kved_code', 'count'))
+        return list(kveds.items())
 
 
 class ReportBuilder:
@@ -117,7 +122,16 @@ class ReportBuilder:
         return data
 
 
-class ReportBuilderView(CachedViewMixin, views.APIView):
+class ReportBuilderView(views.APIView):
+    cache_registers = ('company', 'fop')
+
     def post(self, request):
-        builder = ReportBuilder(request.data)
-        return Response(builder.data, status=200)
+        # reports are cached by the body and by the data versions bumped after imports
+        body_hash = hashlib.md5(json.dumps(request.data, sort_keys=True, default=str).encode()).hexdigest()
+        versions = get_data_version_prefix(get_data_versions(self.cache_registers))
+        key = f'report_builder:{versions}:{body_hash}'
+        data = cache.get(key)
+        if data is None:
+            data = ReportBuilder(request.data).data
+            cache.set(key, data, settings.CACHE_MIDDLEWARE_SECONDS)
+        return Response(data, status=200)
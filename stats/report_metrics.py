@@ -0,0 +1,53 @@
+import logging
+
+from django.db import connection, transaction
+from django.utils import timezone
+
+logger = logging.getLogger(__name__)
+
+
+class ReportMetrics:
+    """
+    Fills RegistrationCount and KvedCount of a register for ReportBuilder. Both are recounted
+    in full with one GROUP BY each, as changed registration dates and removed relations
+    leave no trace to recount only the changed days or codes.
+    """
+    registers = {
+        'company': ('business_register_company', 'business_register_companytokved', 'company_id'),
+        'fop': ('business_register_fop', 'business_register_foptokved', 'fop_id'),
+    }
+
+    def __init__(self, register):
+        self.register = register
+        self.table, self.rel_table, self.rel_column = self.registers[register]
+
+    def refresh_registrations(self):
+        with connection.cursor() as cursor:
+            cursor.execute('DELETE FROM stats_registration_count WHERE register = %s', [self.register])
+            cursor.execute(f'''
+                INSERT INTO stats_registration_count (register, day, count)
+                SELECT %s, registration_date, count(*)
+                FROM {self.table}
+                WHERE registration_date IS NOT NULL
+                GROUP BY registration_date
+            ''', [self.register])
+
+    def refresh_kveds(self):
+        with connection.cursor() as cursor:
+            cursor.execute('DELETE FROM stats_kved_count WHERE register = %s', [self.register])
+            cursor.execute(f'''
+                INSERT INTO stats_kved_count (register, kved_code, count)
+                SELECT %s, kved.code, count(*)
+                FROM {self.rel_table}
+                JOIN {self.table} r ON {self.rel_table}.{self.rel_column} = r.id
+                JOIN business_register_kved kved ON {self.rel_table}.kved_id = kved.id
+                GROUP BY kved.code
+            ''', [self.register])
+
+    def refresh(self):
+        """Recounts the metrics of the register, called after its import."""
+        start_time = timezone.now()
+        with transaction.atomic():
+            self.refresh_registrations()
+            self.refresh_kveds()
+        logger.info(f'Report metrics of {self.register} refreshed at {timezone.now() - start_time}')
@@ -1,12 +1,12 @@
 from __future__ import absolute_import, unicode_literals
 import logging
 
-import requests
 from celery import shared_task
 from django.conf import settings
-from django.core.cache import caches
 
-from stats import views as stats_views
+from stats import logic, views as stats_views
+from stats.cache_warming import CacheWarmer
+from stats.usage import api_usage_buffer
 
 
 logger = logging.getLogger(__name__)
@@ -34,29 +34,33 @@ warm_endpoints = [
 
 def endpoints_cache_warm_up(endpoints=None):
     if 'counts' not in settings.CACHES:
-        return
+        return []
     if endpoints is None:
         endpoints = warm_endpoints
-    cache = caches['counts']
-    for endpoint in endpoints:
-        cache.delete_pattern(f'{endpoint}*')
-        response = requests.get(f'{settings.BACKEND_SITE_URL}{endpoint}', headers={
-            'Authorization': f'Service {settings.SERVICE_TOKEN}'
-        })
-        if response.status_code != 200:
-            logger.error(f'{endpoint} warming failed, status={response.status_code}, body={response.text}')
+    # cached counts and responses of the changed registers are already unreachable by their data versions
+    return CacheWarmer().run(endpoints=endpoints)
 
 
 def cache_warm_up():
-    endpoints_cache_warm_up()
-
     logger.info('Start cache warming')
-    for view in warm_views:
-        view.warm_up_cache()
-        logger.info(f'{view.get_cache_key()} warmed up successfully')
+    endpoints = warm_endpoints if 'counts' in settings.CACHES else []
+    results = CacheWarmer().run(endpoints=endpoints, views=warm_views)
     logger.info('End cache warming')
+    return results
 
 
 @shared_task
 def cache_warming_up():
     cache_warm_up()
+
+
+@shared_task
+def flush_api_usage():
+    saved = api_usage_buffer.flush()
+    logger.info(f'{saved} API usage events saved')
+
+
+@shared_task
+def rollup_api_usage():
+    tracking_id = logic.rollup_api_usage()
+    logger.info(f'API usage rolled up to {tracking_id}')
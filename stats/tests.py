@@ -0,0 +1,91 @@
+from datetime import date, datetime
+
+from django.test import TestCase, override_settings
+from django.utils import timezone
+
+from stats import logic
+from stats.models import ApiUsageRollup, ApiUsageRollupWatermark, ApiUsageTracking
+from users.models import DataOceanUser
+
+
+class ApiUsageRollupTestCase(TestCase):
+    def setUp(self):
+        self.user = DataOceanUser.objects.create_user(
+            'user@example.com', 'password', first_name='Іван', last_name='Іванов',
+        )
+        self.other_user = DataOceanUser.objects.create_user(
+            'other@example.com', 'password', first_name='Петро', last_name='Петренко',
+        )
+
+    @staticmethod
+    def track(user, day, pathname='/api/company/'):
+        return ApiUsageTracking.objects.create(
+            user=user, pathname=pathname, timestamp=datetime(2021, 5, day, 12, tzinfo=timezone.utc),
+        )
+
+    def test_counts_without_rollup(self):
+        self.track(self.user, 10)
+        self.track(self.user, 10, '/api/fop/')
+        self.track(self.user, 11)
+        self.track(self.other_user, 11)
+        self.assertEqual(logic.get_api_usage_counts(self.user.id), {date(2021, 5, 10): 2, date(2021, 5, 11): 1})
+
+    @override_settings(API_USAGE_ROLLUP_BATCH_SIZE=2)
+    def test_rollup(self):
+        self.track(self.user, 10)
+        self.track(self.user, 10)
+        self.track(self.user, 10, '/api/fop/')
+        self.track(self.user, 11)
+        last = self.track(self.other_user, 11)
+
+        self.assertEqual(logic.rollup_api_usage(), last.id)
+        self.assertEqual(ApiUsageRollupWatermark.objects.get().tracking_id, last.id)
+        self.assertEqual(
+            set(ApiUsageRollup.objects.filter(user=self.user).values_list('day', 'pathname', 'count')),
+            {
+                (date(2021, 5, 10), '/api/company/', 2),
+                (date(2021, 5, 10), '/api/fop/', 1),
+                (date(2021, 5, 11), '/api/company/', 1),
+            },
+        )
+        self.assertEqual(logic.get_api_usage_counts(self.user.id), {date(2021, 5, 10): 3, date(2021, 5, 11): 1})
+
+        # rows past the watermark are counted from ApiUsageTracking until the next rollup
+        last = self.track(self.user, 10)
+        self.assertEqual(logic.get_api_usage_counts(self.user.id), {date(2021, 5, 10): 4, date(2021, 5, 11): 1})
+        self.assertEqual(logic.rollup_api_usage(), last.id)
+        self.assertEqual(
+            ApiUsageRollup.objects.get(user=self.user, day=date(2021, 5, 10), pathname='/api/company/').count, 3,
+        )
+        self.assertEqual(logic.get_api_usage_counts(self.user.id), {date(2021, 5, 10): 4, date(2021, 5, 11): 1})
+
+        # nothing new to count
+        self.assertEqual(logic.rollup_api_usage(), last.id)
+        self.assertEqual(logic.get_api_usage_counts(self.user.id), {date(2021, 5, 10): 4, date(2021, 5, 11): 1})
+
+    def test_counts_by_dates(self):
+        self.track(self.user, 9)
+        self.track(self.user, 10)
+        logic.rollup_api_usage()
+        self.track(self.user, 10)
+        self.track(self.user, 11)
+        self.assertEqual(
+            logic.get_api_usage_counts(self.user.id, date_from=date(2021, 5, 10)),
+            {date(2021, 5, 10): 2, date(2021, 5, 11): 1},
+        )
+        self.assertEqual(
+            logic.get_api_usage_counts(self.user.id, date_to=date(2021, 5, 10)),
+            {date(2021, 5, 9): 1, date(2021, 5, 10): 2},
+        )
+        self.assertEqual(
+            logic.get_api_usage_counts(self.user.id, date(2021, 5, 10), date(2021, 5, 10)),
+            {date(2021, 5, 10): 2},
+        )
+
+    def test_rollup_after_moved_watermark(self):
+        self.track(self.user, 10)
+        last = self.track(self.user, 10)
+        # another run has counted the rows already
+        ApiUsageRollupWatermark.objects.create(pk=1, tracking_id=last.id)
+        self.assertEqual(logic.rollup_api_usage(), last.id)
+        self.assertFalse(ApiUsageRollup.objects.exists())
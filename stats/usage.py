@@ -0,0 +1,125 @@
+import atexit
+import json
+import logging
+import threading
+from collections import deque
+
+from django.conf import settings
+from django.db import connection
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from stats.models import ApiUsageTracking
+
+logger = logging.getLogger(__name__)
+
+
+class ApiUsageBuffer:
+    """
+    Collects API usage events outside of the request path and bulk-inserts them into ApiUsageTracking.
+    With the Redis 'counts' cache events are pushed to a Redis list shared by all processes and
+    inserted by the flush_api_usage task, otherwise they are kept in a list of the process and
+    inserted by its thread every API_USAGE_FLUSH_SECONDS or after API_USAGE_FLUSH_SIZE events.
+    Events that failed to be inserted are returned to the buffer for the next flush.
+    """
+    redis_key = 'api_usage_events'
+
+    def __init__(self):
+        self.events = deque()
+        self.lock = threading.Lock()
+        self.is_full = threading.Event()
+        self.thread = None
+        atexit.register(self.flush)
+
+    @staticmethod
+    def get_redis():
+        if 'django_redis' not in settings.CACHES.get('counts', {}).get('BACKEND', ''):
+            return None
+        from django_redis import get_redis_connection
+        return get_redis_connection('counts')
+
+    def add(self, user_id, pathname, referer='', project_id=None):
+        event = [user_id, pathname[:250], referer[:250], timezone.now().isoformat(), project_id]
+        redis = self.get_redis()
+        if redis is not None:
+            try:
+                redis.rpush(self.redis_key, json.dumps(event))
+                return
+            except Exception:
+                logger.exception('API usage event was not buffered in Redis')
+        with self.lock:
+            self.events.append(event)
+            if len(self.events) >= settings.API_USAGE_FLUSH_SIZE:
+                self.is_full.set()
+            if self.thread is None:
+                self.thread = threading.Thread(target=self.flush_periodically, daemon=True)
+                self.thread.start()
+
+    def flush_periodically(self):
+        while True:
+            self.is_full.wait(settings.API_USAGE_FLUSH_SECONDS)
+            self.is_full.clear()
+            self.flush()
+            # the thread has its own DB connection
+            connection.close()
+
+    def pop_local_events(self):
+        with self.lock:
+            events = list(self.events)
+            self.events.clear()
+        return events
+
+    def pop_redis_events(self):
+        redis = self.get_redis()
+        if redis is None:
+            return []
+        pipeline = redis.pipeline()
+        pipeline.lrange(self.redis_key, 0, -1)
+        pipeline.delete(self.redis_key)
+        return [json.loads(event) for event in pipeline.execute()[0]]
+
+    def return_events(self, local_events, redis_events):
+        with self.lock:
+            self.events.extendleft(reversed(local_events))
+        if redis_events:
+            try:
+                self.get_redis().lpush(self.redis_key, *[json.dumps(event) for event in reversed(redis_events)])
+            except Exception:
+                logger.exception(f'{len(redis_events)} API usage events were not returned to Redis')
+                with self.lock:
+                    self.events.extendleft(reversed(redis_events))
+
+    @staticmethod
+    def save_events(events):
+        ApiUsageTracking.objects.bulk_create([
+            ApiUsageTracking(
+                user_id=user_id,
+                pathname=pathname,
+                referer=referer,
+                timestamp=parse_datetime(timestamp),
+                # events buffered before the project was added have 4 items
+                project_id=project_id[0] if project_id else None,
+            ) for user_id, pathname, referer, timestamp, *project_id in events
+        ], batch_size=settings.API_USAGE_FLUSH_SIZE)
+
+    def flush(self):
+        """Inserts the buffered events, returns their number."""
+        local_events = self.pop_local_events()
+        try:
+            redis_events = self.pop_redis_events()
+        except Exception:
+            logger.exception('API usage events were not read from Redis')
+            redis_events = []
+        events = local_events + redis_events
+        if not events:
+            return 0
+        try:
+            self.save_events(events)
+        except Exception:
+            logger.exception(f'{len(events)} API usage events were not saved, they are kept for the next flush')
+            self.return_events(local_events, redis_events)
+            return 0
+        return len(events)
+
+
+api_usage_buffer = ApiUsageBuffer()
@@ -1,5 +1,5 @@
 import time
-from datetime import timedelta, datetime
+from datetime import timedelta
 
 from django.db.models import Count, Q
 from django.utils import timezone
@@ -13,7 +13,6 @@ from business_register.models.pep_models import Pep, CompanyLinkWithPep, Related
 from data_ocean.models import Register
 from stats import logic
 from stats.serializers import TopKvedSerializer, CompanyTypeCountSerializer
-from .models import ApiUsageTracking
 from .cache_warming import WarmedCacheGetAPIView
 from payment_system.models import UserProject
 
@@ -41,18 +40,12 @@ class ApiUsageMeView(views.APIView):
             user_id=request.user.id
         )
 
-        now = datetime.now()
-        current_month = ApiUsageTracking.objects.filter(
-            user=request.user,
-            timestamp__month=now.month,
-            timestamp__year=now.year,
-        ).count()
-
-        prev_month = ApiUsageTracking.objects.filter(
-            user=request.user,
-            timestamp__month=12 if now.month == 1 else now.month - 1,
-            timestamp__year=now.year - 1 if now.month == 1 else now.year,
-        ).count()
+        today = timezone.localdate()
+        current_month_start = today.replace(day=1)
+        prev_month_start = (current_month_start - timedelta(days=1)).replace(day=1)
+        counts = logic.get_api_usage_counts(request.user.id, date_from=prev_month_start)
+        current_month = sum(count for day, count in counts.items() if day >= current_month_start)
+        prev_month = sum(count for day, count in counts.items() if day < current_month_start)
 
         return Response({
             'days': days,
@@ -63,9 +56,7 @@ class ApiUsageMeView(views.APIView):
 
 class ProfileStatsView(views.APIView):
     def get(self, request):
-        api_requests = ApiUsageTracking.objects.filter(
-            user_id=request.user.id
-        ).count()
+        api_requests = sum(logic.get_api_usage_counts(request.user.id).values())
         endpoints = Register.objects.count()
         return Response({
             "api_requests": api_requests,